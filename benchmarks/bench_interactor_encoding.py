@@ -0,0 +1,78 @@
+# benchmarks/bench_interactor_encoding.py
+"""
+Benchmark: JSON interactor lists vs. the packed encoding, by size and decode speed
+
+Run from the repository root:
+    python -m benchmarks.bench_interactor_encoding --proteins 20000 --interactions 200000
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from benchmarks.bench_semantic_build import populate
+from benchmarks.bench_string_ingest import new_session
+from etl.interactors import decode_interactors, count_interactors
+from etl.load import build_semantic_layer
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34}{elapsed:>8.3f} s")
+    return elapsed, result
+
+def build(session, encoding):
+    # Keep the build's sample table out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_semantic_layer(session, interactors_format=encoding)
+
+def decode_json(payloads):
+    """Parse every list and collect its accessions"""
+    return [[p['accession'] for p in json.loads(payload)] for payload in payloads]
+
+def decode_packed(session, blobs):
+    """Unpack every list and resolve its accessions through the proteins table"""
+    accession_of = dict(session.execute(text("SELECT protein_sk, accession FROM proteins")).fetchall())
+    return [[accession_of[key] for key in decode_interactors(blob)['protein_sk'].tolist()] for blob in blobs]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the interactor list encodings')
+    parser.add_argument('--proteins', type=int, default=20000, help='Linked proteins')
+    parser.add_argument('--associations', type=int, default=100000, help='Datasource associations')
+    parser.add_argument('--interactions', type=int, default=200000, help='Undirected interactions')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        session = new_session(tmp, 'semantic.db')
+        populate(session, args.proteins, args.associations, args.interactions)
+        print(f"{args.proteins:,} proteins, {args.interactions:,} interactions")
+        
+        payloads = {}
+        for encoding, column in (('json', 'interacting_proteins'), ('packed', 'packed_interactors')):
+            timed(f"build ({encoding})", lambda: build(session, encoding))
+            payloads[encoding] = [row[0] for row in session.execute(
+                text(f"SELECT {column} FROM protein_interactors ORDER BY protein_sk")
+            )]
+        
+        edges = sum(count_interactors(blob) for blob in payloads['packed'])
+        for encoding, values in payloads.items():
+            size = sum(len(value) for value in values)
+            print(f"{encoding + ' size':<34}{size / 2 ** 20:>8.1f} MiB {size / max(edges, 1):>8.1f} bytes/interactor")
+        
+        json_time, json_lists = timed("decode json", lambda: decode_json(payloads['json']))
+        packed_time, packed_lists = timed("decode packed + resolve names",
+                                          lambda: decode_packed(session, payloads['packed']))
+        print(f"{'':<34}{json_time / packed_time:>8.1f}x")
+        
+        # Same interactors, in score order rather than key order
+        assert [sorted(a) for a in json_lists] == [sorted(a) for a in packed_lists], "encodings disagree"
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_opentargets_ingest.py
+"""
+Benchmark: OpenTargets staging with one parquet reader thread vs. several
+
+Run from the repository root:
+    python -m benchmarks.bench_opentargets_ingest --files 200 --rows 20000
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from benchmarks.bench_string_ingest import new_session
+from etl.extract import extract_opentargets_data
+
+DATASOURCES = ['chembl', 'europepmc', 'gwas_credible_sets', 'expression_atlas', 'impc']
+
+def write_synthetic_opentargets(root, n_files, rows, seed=0):
+    """
+    Write target, disease and association part files, split over n_files
+    
+    Association files carry extra unused columns, as the real dataset does.
+    """
+    rng = random.Random(seed)
+    paths = {name: os.path.join(root, name) for name in ('target', 'disease', 'association')}
+    for path in paths.values():
+        os.makedirs(path)
+    
+    target_files = disease_files = max(1, n_files // 10)
+    association_files = max(1, n_files - target_files - disease_files)
+    
+    for part in range(target_files):
+        ids = [f'ENSG{part:05d}{i:06d}' for i in range(rows // 10)]
+        pq.write_table(pa.table({
+            'id': ids,
+            'approvedSymbol': [f'G{i}' for i in range(len(ids))],
+            'biotype': ['protein_coding'] * len(ids),
+            'functionDescriptions': ['x' * 200] * len(ids),
+        }), os.path.join(paths['target'], f'part-{part:05d}.parquet'))
+    
+    for part in range(disease_files):
+        ids = [f'EFO_{part:05d}{i:06d}' for i in range(rows // 10)]
+        pq.write_table(pa.table({
+            'id': ids,
+            'name': [f'Disease {i}' for i in range(len(ids))],
+            'description': ['y' * 200] * len(ids),
+        }), os.path.join(paths['disease'], f'part-{part:05d}.parquet'))
+    
+    for part in range(association_files):
+        pq.write_table(pa.table({
+            'datatypeId': [rng.choice(['literature', 'known_drug']) for _ in range(rows)],
+            'datasourceId': [rng.choice(DATASOURCES) for _ in range(rows)],
+            'diseaseId': [f'EFO_{rng.randrange(10**6):011d}' for _ in range(rows)],
+            'targetId': [f'ENSG{rng.randrange(10**6):011d}' for _ in range(rows)],
+            'score': [rng.random() for _ in range(rows)],
+            'evidenceCount': [rng.randrange(1, 50) for _ in range(rows)],
+        }), os.path.join(paths['association'], f'part-{part:05d}.parquet'))
+    
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent OpenTargets parquet reading')
+    parser.add_argument('--files', type=int, default=200, help='Number of synthetic part files')
+    parser.add_argument('--rows', type=int, default=20000, help='Rows per association file')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Reader thread counts to compare')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_synthetic_opentargets(tmp, args.files, args.rows)
+        print(f"{args.files} part files, {len(os.listdir(paths['association']))} of them associations")
+        
+        baseline = None
+        for threads in args.threads:
+            session = new_session(tmp, f'threads-{threads}.db')
+            start = time.perf_counter()
+            extract_opentargets_data(session, paths['target'], paths['disease'], paths['association'],
+                                     readers=threads)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{threads:>2} reader thread(s){elapsed:>10.2f} s {baseline / elapsed:>8.1f}x")
+            session.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# benchmarks/bench_semantic_build.py
+"""
+Benchmark: the per-slice semantic-layer builder vs. the set-based build,
+serial and sharded over worker processes
+
+Run from the repository root:
+    python -m benchmarks.bench_semantic_build --proteins 20000 --associations 100000
+    python -m benchmarks.bench_semantic_build --proteins 200000 --associations 1000000 --workers 1 2 4 8
+"""
+import argparse
+import json
+import logging
+import random
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from benchmarks.bench_string_ingest import new_session
+from config import STRING_SCORE_THRESHOLD
+from etl.bulk import BulkInserter
+from etl.load import build_semantic_layer
+from etl.transform import score_target_disease_associations
+from models.schema import (
+    Protein, ProteinInteraction, Target, Disease, Datasource, TargetDiseaseAssociation,
+    ProteinDiseaseNetwork, ProteinInteractorList
+)
+
+DATASOURCES = ['chembl', 'europepmc', 'gwas_credible_sets', 'expression_atlas', 'impc']
+
+def populate(session, n_proteins, n_associations, n_interactions, seed=0):
+    """Fill the clean layer with linked proteins, interactions and scored associations"""
+    rng = random.Random(seed)
+    n_diseases = max(1, n_proteins // 4)
+    
+    tables = [
+        (Protein, ['protein_sk', 'accession', 'protein_name', 'gene_name', 'species', 'opentargets_id'],
+         ((i, f'P{i:06d}', f'Protein {i}', f'GENE{i}', 'Human', f'ENSG{i:011d}')
+          for i in range(1, n_proteins + 1))),
+        (Target, ['target_sk', 'id', 'approved_symbol', 'protein_sk'],
+         ((i, f'ENSG{i:011d}', f'GENE{i}', i) for i in range(1, n_proteins + 1))),
+        (Disease, ['disease_sk', 'id', 'name'],
+         ((i, f'EFO_{i:07d}', f'Disease {i}') for i in range(1, n_diseases + 1))),
+        (Datasource, ['datasource_sk', 'name'], enumerate(DATASOURCES, 1)),
+        (ProteinInteraction, ['protein1_sk', 'protein2_sk', 'combined_score'],
+         {tuple(sorted(rng.sample(range(1, n_proteins + 1), 2))): rng.randrange(150, 1000)
+          for _ in range(n_interactions)}.items()),
+        (TargetDiseaseAssociation, ['target_sk', 'disease_sk', 'datasource_sk', 'score'],
+         ((rng.randrange(1, n_proteins + 1), rng.randrange(1, n_diseases + 1),
+           rng.randrange(1, len(DATASOURCES) + 1), rng.random()) for _ in range(n_associations))),
+    ]
+    for model, columns, rows in tables:
+        if model is ProteinInteraction:
+            rows = (pair + (score,) for pair, score in rows)
+        with BulkInserter(session, model, columns) as inserter:
+            inserter.insert_many(rows)
+    score_target_disease_associations(session)
+
+def legacy_build(session):
+    """The previous builder: 100-protein slices, IN lists, Python grouping and ORM rows"""
+    session.query(ProteinDiseaseNetwork).delete()
+    session.query(ProteinInteractorList).delete()
+    session.commit()
+    proteins = session.execute(text("SELECT protein_sk FROM proteins WHERE opentargets_id IS NOT NULL")).fetchall()
+    
+    for i in range(0, len(proteins), 100):
+        batch_keys = [p[0] for p in proteins[i:i + 100]]
+        key_list = ', '.join(str(key) for key in batch_keys)
+        
+        disease_map = {}
+        for protein_sk, disease_sk, score, datasource_scores in session.execute(text(f"""
+            SELECT t.protein_sk, s.disease_sk, MAX(s.score), s.datasource_scores
+            FROM target_disease_scores s
+            JOIN targets t ON s.target_sk = t.target_sk
+            WHERE t.protein_sk IN ({key_list})
+            GROUP BY t.protein_sk, s.disease_sk
+        """)):
+            disease_map.setdefault(protein_sk, []).append((disease_sk, score, datasource_scores))
+        
+        interact_map = {}
+        for protein_sk, acc2, p_name, g_name in session.execute(text(f"""
+            SELECT n.protein_sk, p.accession, p.protein_name, p.gene_name
+            FROM protein_neighbor_keys n
+            JOIN proteins p ON n.neighbor_sk = p.protein_sk
+            WHERE n.protein_sk IN ({key_list})
+            AND n.combined_score > {STRING_SCORE_THRESHOLD}
+        """)):
+            interact_map.setdefault(protein_sk, []).append(
+                {'accession': acc2, 'protein_name': p_name, 'gene_name': g_name}
+            )
+        
+        records = []
+        for protein_sk in batch_keys:
+            records.append(ProteinInteractorList(
+                protein_sk=protein_sk, interacting_proteins=json.dumps(interact_map.get(protein_sk, []))
+            ))
+            for disease_sk, score, datasource_scores in disease_map.get(protein_sk, [(None, None, None)]):
+                records.append(ProteinDiseaseNetwork(
+                    protein_sk=protein_sk, disease_sk=disease_sk, association_score=score,
+                    datasource_scores=datasource_scores
+                ))
+        session.add_all(records)
+        session.commit()
+
+def rows_of(session):
+    """Semantic rows with interactor lists parsed and sorted, for comparing builders"""
+    rows = session.execute(text("""
+        SELECT n.protein_sk, n.disease_sk, n.association_score, n.datasource_scores, i.interacting_proteins
+        FROM protein_disease_network n
+        LEFT JOIN protein_interactors i ON i.protein_sk = n.protein_sk
+        ORDER BY n.protein_sk, n.disease_sk
+    """))
+    return [row[:4] + (sorted(p['accession'] for p in json.loads(row[4])),) for row in rows]
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{elapsed:>8.2f} s")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the semantic-layer build')
+    parser.add_argument('--proteins', type=int, default=20000, help='Linked proteins')
+    parser.add_argument('--associations', type=int, default=100000, help='Datasource associations')
+    parser.add_argument('--interactions', type=int, default=200000, help='Undirected interactions')
+    parser.add_argument('--workers', type=int, nargs='+', default=[],
+                        help='Also time sharded builds with these worker counts')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        sessions = {}
+        for name in ('legacy', 'set_based'):
+            sessions[name] = new_session(tmp, f'{name}.db')
+            populate(sessions[name], args.proteins, args.associations, args.interactions)
+        print(f"{args.proteins:,} proteins, {args.associations:,} associations, "
+              f"{args.interactions:,} interactions")
+        
+        before = timed("per-slice builder (legacy)", lambda: legacy_build(sessions['legacy']))
+        after = timed("set-based build", lambda: build_semantic_layer(sessions['set_based']))
+        print(f"{'':<28}{before / after:>8.1f}x")
+        
+        assert rows_of(sessions['legacy']) == rows_of(sessions['set_based']), "builders disagree"
+        print(f"{len(rows_of(sessions['set_based'])):,} identical rows")
+        
+        for workers in args.workers:
+            sharded = timed(f"build with {workers} workers",
+                            lambda: build_semantic_layer(sessions['set_based'], workers=workers))
+            print(f"{'':<28}{after / sharded:>8.1f}x vs. serial")
+            assert rows_of(sessions['set_based']) == rows_of(sessions['legacy']), "sharded build disagrees"
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_string_read.py
+"""
+Benchmark: counting lines before parsing vs. a single pass with byte progress
+
+Run from the repository root:
+    python -m benchmarks.bench_string_read --lines 2000000
+"""
+import argparse
+import gzip
+import os
+import random
+import tempfile
+import time
+
+from tqdm import tqdm
+
+from etl.utils import open_with_progress
+
+def write_synthetic_links(path, n_lines, seed=0):
+    """Write a gzipped STRING-style links file with n_lines interactions"""
+    rng = random.Random(seed)
+    with gzip.open(path, 'wt') as f:
+        f.write("protein1 protein2 combined_score\n")
+        for _ in range(n_lines):
+            f.write(f"9606.ENSP{rng.randrange(20000):011d} 9606.ENSP{rng.randrange(20000):011d} "
+                    f"{rng.randrange(150, 1000)}\n")
+
+def parse(lines):
+    count = 0
+    for line in lines:
+        protein1, protein2, combined_score = line.strip().split()[:3]
+        int(combined_score)
+        count += 1
+    return count
+
+def two_pass(path):
+    """The previous approach: decompress once to count lines, then again to parse"""
+    with gzip.open(path, 'rt') as f:
+        total_lines = sum(1 for _ in f)
+    with gzip.open(path, 'rt') as f:
+        f.readline()
+        return parse(tqdm(f, total=total_lines - 1, disable=True))
+
+def single_pass(path):
+    with open_with_progress(path, "links", mode='rt') as f:
+        f.readline()
+        return parse(f)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark single-pass STRING reading')
+    parser.add_argument('--lines', type=int, default=2000000, help='Number of synthetic interactions')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'links.txt.gz')
+        write_synthetic_links(path, args.lines)
+        print(f"{args.lines:,} lines, {os.path.getsize(path) / 1e6:.1f} MB gzipped")
+
+        start = time.perf_counter()
+        assert two_pass(path) == args.lines
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assert single_pass(path) == args.lines
+        after = time.perf_counter() - start
+
+    print(f"count then parse: {before:.2f} s")
+    print(f"single pass:      {after:.2f} s ({(1 - after / before) * 100:.0f}% less wall time)")
+
+if __name__ == '__main__':
+    main()
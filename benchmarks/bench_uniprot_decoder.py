@@ -0,0 +1,140 @@
+# benchmarks/bench_uniprot_decoder.py
+"""
+Microbenchmark: per-field XPath lookups vs. the single-pass UniProt decoder
+
+Run from the repository root:
+    python -m benchmarks.bench_uniprot_decoder --entries 20000
+"""
+import argparse
+import io
+import random
+import time
+
+from lxml import etree
+
+from etl.extract import UNIPROT_FIELDS, UNIPROT_NS, decode_uniprot_entry
+
+NAMESPACES = {'uniprot': UNIPROT_NS}
+
+# Fields the XPath-based extraction produced, in its output order
+LEGACY_FIELDS = (
+    'accession', 'protein_name', 'gene_name', 'species', 'string_id',
+    'opentargets_id', 'sequence_length', 'sequence_mass', 'sequence'
+)
+
+def synthetic_uniprot_xml(n_entries, seed=0):
+    """Build a UniProt-shaped XML document with n_entries entries"""
+    rng = random.Random(seed)
+    amino_acids = 'ACDEFGHIKLMNPQRSTVWY'
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        f'<uniprot xmlns="{UNIPROT_NS}" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+    ]
+
+    for i in range(n_entries):
+        length = rng.randint(50, 800)
+        sequence = ''.join(rng.choice(amino_acids) for _ in range(length))
+        gene = (f'<name type="primary">GENE{i}</name>' if i % 3
+                else f'<name type="synonym">SYN{i}</name><name type="ordered locus">LOC{i}</name>')
+        species = ('<name type="scientific">Homo sapiens</name><name type="common">Human</name>'
+                   if i % 2 else '<name type="scientific">Mus musculus</name>')
+        parts.append(
+            f'<entry dataset="Swiss-Prot" created="2025-01-01" modified="2025-05-01" version="{i % 7 + 1}">'
+            f'<accession>P{i:05d}</accession><accession>Q{i:05d}</accession>'
+            f'<name>PROT{i}_HUMAN</name>'
+            f'<protein><recommendedName><fullName>Synthetic protein {i}</fullName></recommendedName>'
+            f'<alternativeName><fullName>Alt {i}</fullName></alternativeName></protein>'
+            f'<gene>{gene}</gene>'
+            f'<organism>{species}<dbReference type="NCBI Taxonomy" id="9606"/>'
+            f'<lineage><taxon>Eukaryota</taxon><taxon>Metazoa</taxon><taxon>Chordata</taxon></lineage></organism>'
+            f'<comment type="function"><text>Synthetic function {i}.</text></comment>'
+            f'<dbReference type="PDB" id="1ABC"><property type="method" value="X-ray"/></dbReference>'
+            f'<dbReference type="STRING" id="9606.ENSP{i:011d}"/>'
+            f'<dbReference type="OpenTargets" id="ENSG{i:011d}"/>'
+            f'<proteinExistence type="evidence at protein level"/>'
+            f'<keyword id="KW-0181">Complete proteome</keyword>'
+            f'<feature type="chain" id="PRO_{i:010d}"><location><begin position="1"/>'
+            f'<end position="{length}"/></location></feature>'
+            f'<sequence length="{length}" mass="{length * 110}" checksum="{i:016X}" '
+            f'modified="2025-01-01" version="1">{sequence}</sequence>'
+            '</entry>\n'
+        )
+
+    parts.append('</uniprot>\n')
+    return ''.join(parts).encode('utf-8')
+
+def legacy_decode(entry):
+    """Field extraction as done before the single-pass decoder: one XPath query per lookup"""
+    def first(path):
+        values = entry.xpath(path, namespaces=NAMESPACES)
+        return values[0] if values else None
+
+    accession = entry.xpath('./uniprot:accession[1]/text()', namespaces=NAMESPACES)[0]
+    protein_name = first('./uniprot:protein/uniprot:recommendedName/uniprot:fullName/text()')
+    gene_name = (first('./uniprot:gene/uniprot:name[@type="primary"]/text()')
+                 or first('./uniprot:gene/uniprot:name[@type="ordered locus"]/text()')
+                 or first('./uniprot:gene/uniprot:name/text()'))
+    species = (first('./uniprot:organism/uniprot:name[@type="common"]/text()')
+               or first('./uniprot:organism/uniprot:name[@type="scientific"]/text()'))
+    string_id = first('./uniprot:dbReference[@type="STRING"]/@id')
+    opentargets_id = first('./uniprot:dbReference[@type="OpenTargets"]/@id')
+    seq = entry.xpath('./uniprot:sequence', namespaces=NAMESPACES)
+    sequence_length = int(seq[0].attrib['length']) if seq and 'length' in seq[0].attrib else None
+    seq = entry.xpath('./uniprot:sequence', namespaces=NAMESPACES)
+    sequence_mass = int(seq[0].attrib['mass']) if seq and 'mass' in seq[0].attrib else None
+    sequence = first('./uniprot:sequence/text()')
+
+    return (accession, protein_name, gene_name, species, string_id,
+            opentargets_id, sequence_length, sequence_mass,
+            sequence.strip() if sequence else None)
+
+def time_decoder(entries, decoder, repeat):
+    """Best-of-repeat entries/sec for decoding already-parsed entries"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for entry in entries:
+            decoder(entry)
+        best = min(best, time.perf_counter() - start)
+    return len(entries) / best
+
+def time_iterparse(xml_bytes, decoder):
+    """Entries/sec for iterparse plus decoding, as extract_uniprot_data runs it"""
+    start = time.perf_counter()
+    count = 0
+    for _, elem in etree.iterparse(io.BytesIO(xml_bytes), events=('end',), tag=f'{{{UNIPROT_NS}}}entry'):
+        decoder(elem)
+        count += 1
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark UniProt entry decoding')
+    parser.add_argument('--entries', type=int, default=20000, help='Number of synthetic entries')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions (best is reported)')
+    args = parser.parse_args()
+
+    xml_bytes = synthetic_uniprot_xml(args.entries)
+    entries = list(etree.fromstring(xml_bytes))
+
+    # Both decoders must agree before their speed is worth comparing
+    positions = [UNIPROT_FIELDS.index(field) for field in LEGACY_FIELDS]
+    for entry in entries:
+        row = decode_uniprot_entry(entry)
+        assert legacy_decode(entry) == tuple(row[i] for i in positions)
+
+    print(f"{args.entries} synthetic entries, {len(xml_bytes) / 1e6:.1f} MB")
+    print(f"{'':<22}{'XPath per field':>18}{'single pass':>18}{'speedup':>10}")
+
+    legacy = time_decoder(entries, legacy_decode, args.repeat)
+    single = time_decoder(entries, decode_uniprot_entry, args.repeat)
+    print(f"{'decode only':<22}{legacy:>14,.0f}/s {single:>14,.0f}/s {single / legacy:>9.1f}x")
+
+    legacy = time_iterparse(xml_bytes, legacy_decode)
+    single = time_iterparse(xml_bytes, decode_uniprot_entry)
+    print(f"{'iterparse + decode':<22}{legacy:>14,.0f}/s {single:>14,.0f}/s {single / legacy:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
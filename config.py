@@ -15,6 +15,15 @@ for directory in [DATA_DIR, TEMP_DIR, LOG_DIR]:
 DB_PATH = DATA_DIR / "protein_data.db"
 DB_URI = f"sqlite:///{DB_PATH}"
 
+# Compressed store for full UniProt sequences, kept outside the database
+SEQUENCE_STORE_DIR = DATA_DIR / "sequences"
+
+# CSR index of the interaction graph, rebuilt at the end of the transform stage
+GRAPH_DIR = DATA_DIR / "graph"
+
+# Parquet datasets written by the export stage
+EXPORT_DIR = DATA_DIR / "export"
+
 # Source data files
 UNIPROT_XML_PATH = DATA_DIR / "uniprot_sprot.xml"
 STRING_DATA_PATH = DATA_DIR / "9606.protein.links.v12.0.txt"
@@ -25,5 +34,73 @@ OPENTARGETS_ASSOCIATIONS_PATH = DATA_DIR / "association_by_datasource_direct"
 # Thresholds
 STRING_SCORE_THRESHOLD = 200
 
+# Stage STRING rows at or below the score threshold too (normally dropped while reading)
+STRING_KEEP_ALL = False
+
 # Batch size for processing
-BATCH_SIZE = 1000
\ No newline at end of file
+BATCH_SIZE = 1000
+
+# Rows per transaction for bulk staging loads, and the SQLite page cache used meanwhile
+BULK_COMMIT_ROWS = 500000
+FAST_LOAD_CACHE_KIB = 256 * 1024
+
+# Approximate bytes of UniProt XML handed to each parallel extraction task
+UNIPROT_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Block size for the columnar STRING reader
+STRING_READ_BLOCK_BYTES = 16 * 1024 * 1024
+
+# Rows per record batch when streaming OpenTargets parquet files
+OPENTARGETS_BATCH_ROWS = 65536
+
+# Threads decoding OpenTargets parquet files concurrently, and the decoded
+# batches each may queue ahead of the single SQLite writer
+OPENTARGETS_READ_THREADS = 4
+OPENTARGETS_QUEUE_BATCHES = 4
+
+# Filters pushed down into the OpenTargets association scan: a minimum score,
+# an allow-list of datasource IDs, and whether to keep only targets linked
+# from a staged UniProt entry. None disables the score and datasource filters.
+OPENTARGETS_MIN_SCORE = None
+OPENTARGETS_DATASOURCES = None
+OPENTARGETS_UNIPROT_TARGETS_ONLY = False
+
+# Datasource weights for the harmonic-sum target-disease score, following the
+# OpenTargets Platform defaults; unlisted datasources get the default weight
+OPENTARGETS_DEFAULT_WEIGHT = 1.0
+OPENTARGETS_DATASOURCE_WEIGHTS = {
+    'europepmc': 0.2,
+    'expression_atlas': 0.2,
+    'impc': 0.2,
+    'ot_crispr': 0.5,
+    'ot_crispr_validation': 0.5,
+    'sysbio': 0.5,
+}
+
+# Uncompressed bytes per compressed chunk in the sequence store
+SEQUENCE_CHUNK_BYTES = 64 * 1024
+
+# Bytes hashed from the start, middle and end of each source file when
+# fingerprinting it for the run manifest; None hashes whole files
+MANIFEST_SAMPLE_BYTES = 1024 * 1024
+
+# The incremental semantic build falls back to a full rebuild when more than
+# this fraction of the linked proteins is dirty
+SEMANTIC_FULL_REBUILD_FRACTION = 0.5
+
+# Proteins per batch of the set-based semantic build
+SEMANTIC_BATCH_PROTEINS = 20000
+
+# Format of each protein's interactor list in the semantic layer: 'json'
+# (names in protein_interactors.interacting_proteins) or 'packed' (keys and
+# scores in protein_interactors.packed_interactors, see etl/interactors.py)
+SEMANTIC_INTERACTORS_FORMAT = 'json'
+
+# Processes building accession-hash shards of the semantic layer; 1 builds
+# it in the pipeline's own process
+SEMANTIC_WORKERS = 1
+
+# Rows fetched from SQLite at a time by the Parquet export, and rows per
+# Parquet row group; the export holds about one row group in memory
+EXPORT_CHUNK_ROWS = 10000
+EXPORT_ROW_GROUP_ROWS = 100000
@@ -0,0 +1,114 @@
+# etl/bulk.py
+"""
+Bulk loading helpers for SQLite staging writes
+
+Rows are inserted as plain tuples with prepared executemany statements on the
+raw DBAPI connection, committing in large transactions instead of building
+ORM objects and committing every BATCH_SIZE rows.
+"""
+import logging
+from contextlib import contextmanager
+
+from config import BULK_COMMIT_ROWS, FAST_LOAD_CACHE_KIB
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAs applied for the duration of a bulk load. The rollback journal stays
+# in memory rather than off, so a failed batch can still be rolled back.
+FAST_LOAD_PRAGMAS = {
+    'journal_mode': 'MEMORY',
+    'synchronous': 'OFF',
+    'cache_size': -FAST_LOAD_CACHE_KIB,
+    'temp_store': 'MEMORY',
+}
+
+def dbapi_connection(session):
+    """Return the raw DBAPI connection behind a session"""
+    return session.connection().connection
+
+@contextmanager
+def fast_load(session):
+    """
+    Relax SQLite durability settings for a bulk load, restoring them afterwards
+
+    Args:
+        session: SQLAlchemy session bound to a SQLite database
+    """
+    # journal_mode can't change inside an open transaction
+    session.commit()
+    conn = dbapi_connection(session)
+    cursor = conn.cursor()
+
+    previous = {}
+    for name, value in FAST_LOAD_PRAGMAS.items():
+        previous[name] = cursor.execute(f"PRAGMA {name}").fetchone()[0]
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+    try:
+        yield
+    finally:
+        session.commit()
+        cursor = dbapi_connection(session).cursor()
+        for name, value in previous.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        logger.debug(f"Restored SQLite settings {previous}")
+
+class BulkInserter:
+    """
+    Prepared executemany inserts into one table, committed in large transactions
+
+    Args:
+        session: SQLAlchemy session
+        table: ORM class or Table to insert into
+        columns: Column names, in the order of the tuples passed to insert_many
+        on_conflict: None to fail on a key conflict, 'REPLACE' to overwrite the
+            existing row or 'IGNORE' to keep it
+        commit_rows: Commit once this many rows are pending
+    """
+
+    def __init__(self, session, table, columns, on_conflict=None, commit_rows=BULK_COMMIT_ROWS):
+        table = getattr(table, '__table__', table)
+        verb = f'INSERT OR {on_conflict}' if on_conflict else 'INSERT'
+
+        self.session = session
+        self.sql = (f"{verb} INTO {table.name} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})")
+        self.commit_rows = commit_rows
+        self.count = 0
+        self._pending = 0
+
+    def insert_many(self, rows):
+        """
+        Insert an iterable of tuples with a single executemany
+
+        Returns:
+            Number of rows inserted
+        """
+        cursor = dbapi_connection(self.session).cursor()
+        cursor.executemany(self.sql, rows)
+        inserted = cursor.rowcount
+
+        self.count += inserted
+        self._pending += inserted
+        if self._pending >= self.commit_rows:
+            self.commit()
+        return inserted
+
+    def commit(self):
+        self.session.commit()
+        self._pending = 0
+
+    def rollback(self):
+        """Discard rows inserted since the last commit"""
+        self.session.rollback()
+        self.count -= self._pending
+        self._pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
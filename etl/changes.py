@@ -0,0 +1,46 @@
+# etl/changes.py
+"""
+Change tracking on the clean layer for the incremental semantic build
+
+Triggers declared in models/schema.py add the key of every protein whose
+semantic-layer rows a change affects to dirty_proteins. Bulk loads into
+empty tables would fire them for every row, so they run untracked and mark
+everything dirty once at the end instead.
+"""
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from models.schema import TRIGGERS
+
+logger = logging.getLogger(__name__)
+
+def mark_all_dirty(session):
+    """Mark every protein, and every protein still in the semantic layer, as dirty"""
+    session.execute(text("""
+    INSERT OR IGNORE INTO dirty_proteins (protein_sk)
+    SELECT protein_sk FROM proteins
+    UNION
+    SELECT protein_sk FROM protein_disease_network WHERE protein_sk IS NOT NULL
+    """))
+    session.commit()
+
+@contextmanager
+def untracked(session):
+    """
+    Suspend change tracking for a full reload of clean tables
+    
+    Args:
+        session: SQLAlchemy session
+    """
+    for name in TRIGGERS:
+        session.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    session.commit()
+    try:
+        yield
+    finally:
+        session.commit()
+        for name, body in TRIGGERS.items():
+            session.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+        mark_all_dirty(session)
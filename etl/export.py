@@ -0,0 +1,209 @@
+# etl/export.py
+"""
+Parquet export of the semantic and clean layers
+
+Each table is written as a Parquet dataset partitioned by species in the
+hive layout, one file per partition:
+
+    <output_dir>/<table>/species=<species>/part-0.parquet
+
+Rows are read from SQLite sorted by species and accession in chunks of
+EXPORT_CHUNK_ROWS and written out a row group at a time, so memory stays
+bounded by one row group however large the table. Because each file is
+sorted by accession, the per-row-group min/max statistics let readers skip
+row groups when filtering on accession. String columns are
+dictionary-encoded.
+"""
+import logging
+import os
+import shutil
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from tqdm import tqdm
+
+from config import EXPORT_DIR, EXPORT_CHUNK_ROWS, EXPORT_ROW_GROUP_ROWS
+
+logger = logging.getLogger(__name__)
+
+# Name of the partition holding rows without a species, as pyarrow reads it
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# Exported tables: a query returning species first, sorted by species and
+# accession, and the schema of the remaining columns
+EXPORTS = {
+    'protein_disease_network': ("""
+        SELECT species, accession, protein_name, gene_name, sequence_length, sequence_mass,
+               disease_id, disease_name, association_score, datasource_scores, interacting_proteins,
+               packed_interactors
+        FROM v_protein_disease_network
+        ORDER BY species, accession, disease_id
+    """, pa.schema([
+        ('accession', pa.string()),
+        ('protein_name', pa.string()),
+        ('gene_name', pa.string()),
+        ('sequence_length', pa.int64()),
+        ('sequence_mass', pa.float64()),
+        ('disease_id', pa.string()),
+        ('disease_name', pa.string()),
+        ('association_score', pa.float64()),
+        ('datasource_scores', pa.string()),
+        ('interacting_proteins', pa.string()),
+        ('packed_interactors', pa.binary()),
+    ])),
+    'proteins': ("""
+        SELECT species, accession, protein_name, gene_name, string_id, opentargets_id,
+               sequence_length, sequence_mass
+        FROM proteins
+        ORDER BY species, accession
+    """, pa.schema([
+        ('accession', pa.string()),
+        ('protein_name', pa.string()),
+        ('gene_name', pa.string()),
+        ('string_id', pa.string()),
+        ('opentargets_id', pa.string()),
+        ('sequence_length', pa.int64()),
+        ('sequence_mass', pa.float64()),
+    ])),
+    # Both directions of every interaction, so a filter on accession finds
+    # all of a protein's partners
+    'protein_interactions': ("""
+        SELECT p.species, p.accession, q.accession AS neighbor, n.combined_score
+        FROM protein_neighbor_keys n
+        JOIN proteins p ON p.protein_sk = n.protein_sk
+        JOIN proteins q ON q.protein_sk = n.neighbor_sk
+        ORDER BY p.species, p.accession, q.accession
+    """, pa.schema([
+        ('accession', pa.string()),
+        ('neighbor', pa.string()),
+        ('combined_score', pa.int64()),
+    ])),
+    # Targets without a linked protein land in the null species partition
+    'target_disease_scores': ("""
+        SELECT p.species, p.accession, t.id AS target_id, d.id AS disease_id, s.score, s.datasource_scores
+        FROM target_disease_scores s
+        JOIN targets t ON t.target_sk = s.target_sk
+        JOIN diseases d ON d.disease_sk = s.disease_sk
+        LEFT JOIN proteins p ON p.protein_sk = t.protein_sk
+        ORDER BY p.species, p.accession, t.id, d.id
+    """, pa.schema([
+        ('accession', pa.string()),
+        ('target_id', pa.string()),
+        ('disease_id', pa.string()),
+        ('score', pa.float64()),
+        ('datasource_scores', pa.string()),
+    ])),
+}
+
+def partition_dir(species):
+    """Hive partition directory name of a species"""
+    return 'species=' + (NULL_PARTITION if species is None else quote(species, safe=''))
+
+class _PartitionWriter:
+    """Writes the sorted rows of one table, one Parquet file per species"""
+    
+    def __init__(self, path, schema, row_group_rows):
+        self.path = path
+        self.schema = schema
+        self.row_group_rows = row_group_rows
+        self.species = None
+        self._writer = None
+        # Rows not yet written, converted to Arrow as they arrive
+        self._pending = []
+        self._pending_rows = 0
+    
+    def add(self, species, rows):
+        """Append query rows, species first, that all belong to one species"""
+        if self._writer is None or species != self.species:
+            self.close()
+            self.species = species
+            file_path = self.path / partition_dir(species) / 'part-0.parquet'
+            file_path.parent.mkdir(parents=True)
+            self._writer = pq.ParquetWriter(file_path, self.schema, compression='zstd',
+                                            use_dictionary=True, write_statistics=True)
+        
+        # The species column lives in the partition path
+        columns = list(zip(*rows))[1:]
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)]
+        self._pending.append(pa.Table.from_arrays(arrays, schema=self.schema))
+        self._pending_rows += len(rows)
+        
+        while self._pending_rows >= self.row_group_rows:
+            table = pa.concat_tables(self._pending)
+            self._writer.write_table(table.slice(0, self.row_group_rows), row_group_size=self.row_group_rows)
+            self._pending = [table.slice(self.row_group_rows)]
+            self._pending_rows -= self.row_group_rows
+    
+    def close(self):
+        if self._writer is not None:
+            if self._pending_rows:
+                self._writer.write_table(pa.concat_tables(self._pending), row_group_size=self.row_group_rows)
+            self._pending = []
+            self._pending_rows = 0
+            self._writer.close()
+            self._writer = None
+
+def export_table(session, name, output_dir=EXPORT_DIR, chunk_rows=EXPORT_CHUNK_ROWS,
+                 row_group_rows=EXPORT_ROW_GROUP_ROWS):
+    """
+    Export one table as a species-partitioned Parquet dataset
+    
+    The dataset is written next to the previous export and swapped in once
+    complete.
+    
+    Args:
+        session: SQLAlchemy session
+        name: Key of EXPORTS
+        output_dir: Directory holding one dataset per table
+        chunk_rows: Rows fetched from SQLite at a time
+        row_group_rows: Rows per Parquet row group
+    
+    Returns:
+        Number of rows exported
+    """
+    query, schema = EXPORTS[name]
+    target = Path(output_dir) / name
+    partial = target.with_name(target.name + '.partial')
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+    
+    writer = _PartitionWriter(partial, schema, row_group_rows)
+    count = 0
+    result = session.execute(text(query).execution_options(yield_per=chunk_rows))
+    with tqdm(desc=f"Exporting {name}", unit="row") as progress:
+        try:
+            while True:
+                rows = result.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                for species, run in groupby(rows, key=itemgetter(0)):
+                    writer.add(species, list(run))
+                count += len(rows)
+                progress.update(len(rows))
+        finally:
+            writer.close()
+    
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(partial, target)
+    logger.info(f"Exported {count} rows of {name} to {target}")
+    return count
+
+def export_layers(session, names=None, output_dir=EXPORT_DIR):
+    """
+    Export the semantic and clean tables as Parquet datasets
+    
+    Args:
+        session: SQLAlchemy session
+        names: Keys of EXPORTS to export; None exports all of them
+        output_dir: Directory holding one dataset per table
+    
+    Returns:
+        Dictionary of table name to exported row count
+    """
+    logger.info(f"Exporting to {output_dir}")
+    return {name: export_table(session, name, output_dir) for name in names or EXPORTS}
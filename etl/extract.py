@@ -1,163 +1,407 @@
 # etl/extract.py
 import gzip
+import io
 import logging
-import pandas as pd
-import pyarrow.parquet as pq
+import mmap
+import os
+import shutil
+import queue
+import threading
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from lxml import etree
 from pathlib import Path
 from sqlalchemy.orm import sessionmaker
 from tqdm import tqdm
 
 from models.schema import (
-    StagingUniProt, StagingString, StagingOpenTargetsTarget,
+    StagingUniProt, UniProtEntryIndex, StagingString, StagingOpenTargetsTarget,
     StagingOpenTargetsDisease, StagingOpenTargetsAssociation
 )
 from config import (
     UNIPROT_XML_PATH, STRING_DATA_PATH, OPENTARGETS_TARGETS_PATH,
-    OPENTARGETS_DISEASES_PATH, OPENTARGETS_ASSOCIATIONS_PATH, BATCH_SIZE
+    OPENTARGETS_DISEASES_PATH, OPENTARGETS_ASSOCIATIONS_PATH, BATCH_SIZE,
+    TEMP_DIR, UNIPROT_CHUNK_BYTES, SEQUENCE_STORE_DIR, STRING_SCORE_THRESHOLD,
+    STRING_KEEP_ALL, STRING_READ_BLOCK_BYTES, OPENTARGETS_BATCH_ROWS, OPENTARGETS_MIN_SCORE,
+    OPENTARGETS_DATASOURCES, OPENTARGETS_UNIPROT_TARGETS_ONLY, OPENTARGETS_READ_THREADS,
+    OPENTARGETS_QUEUE_BATCHES
 )
+from etl.bulk import BulkInserter, fast_load
+from etl.sequence_store import SequenceStoreWriter
+from etl.utils import open_with_progress
 
 logger = logging.getLogger(__name__)
 
-def extract_uniprot_data(session, xml_path=UNIPROT_XML_PATH):
+# UniProt XML namespace and the fully-qualified tags the decoder matches on
+UNIPROT_NS = 'https://uniprot.org/uniprot'
+_NS = f'{{{UNIPROT_NS}}}'
+_ENTRY = _NS + 'entry'
+_ACCESSION = _NS + 'accession'
+_PROTEIN = _NS + 'protein'
+_RECOMMENDED_NAME = _NS + 'recommendedName'
+_FULL_NAME = _NS + 'fullName'
+_GENE = _NS + 'gene'
+_ORGANISM = _NS + 'organism'
+_NAME = _NS + 'name'
+_DB_REFERENCE = _NS + 'dbReference'
+_SEQUENCE = _NS + 'sequence'
+
+# Column order of the tuples returned by decode_uniprot_entry
+UNIPROT_FIELDS = (
+    'accession', 'protein_name', 'gene_name', 'species', 'string_id',
+    'opentargets_id', 'sequence_length', 'sequence_mass', 'sequence_checksum',
+    'entry_version', 'entry_modified', 'sequence_version', 'sequence_modified', 'sequence'
+)
+
+# staging_uniprot columns written per decoded row; the sequence becomes a store reference
+STAGING_UNIPROT_COLUMNS = UNIPROT_FIELDS[:-1] + ('sequence_ref',)
+
+# Release metadata compared by refresh_uniprot_data to detect changed entries
+UNIPROT_FINGERPRINT_FIELDS = (
+    'entry_version', 'entry_modified', 'sequence_checksum', 'sequence_version', 'sequence_modified'
+)
+
+def decode_uniprot_entry(entry):
     """
-    Extract data from UniProt XML file and load to staging table
+    Decode a UniProt <entry> element in a single pass over its children
+    
+    Gene names fall back from primary to ordered locus to any name, and
+    species from common to scientific name.
     
     Args:
-        session: SQLAlchemy session
-        xml_path: Path to UniProt XML file
+        entry: lxml element for one <entry>
+    
+    Returns:
+        Tuple of values ordered as UNIPROT_FIELDS
     """
-    logger.info(f"Extracting UniProt data from {xml_path}")
+    accession = protein_name = string_id = opentargets_id = None
+    gene_primary = gene_locus = gene_any = None
+    species_common = species_scientific = None
+    sequence_length = sequence_mass = sequence_checksum = sequence = None
+    sequence_version = sequence_modified = None
+    seen_sequence = False
     
-    # Define namespaces
-    namespaces = {
-        'uniprot': 'https://uniprot.org/uniprot',
-        'xsi': 'http://www.w3.org/2001/XMLSchema-instance'
-    }
+    for child in entry:
+        tag = child.tag
+        
+        if tag == _ACCESSION:
+            if accession is None:
+                accession = child.text
+        
+        elif tag == _PROTEIN:
+            if protein_name is None:
+                for rec_name in child:
+                    if rec_name.tag != _RECOMMENDED_NAME:
+                        continue
+                    for full_name in rec_name:
+                        if full_name.tag == _FULL_NAME and full_name.text is not None:
+                            protein_name = full_name.text
+                            break
+                    if protein_name is not None:
+                        break
+        
+        elif tag == _GENE:
+            for name in child:
+                if name.tag != _NAME or name.text is None:
+                    continue
+                name_type = name.get('type')
+                if name_type == 'primary' and gene_primary is None:
+                    gene_primary = name.text
+                elif name_type == 'ordered locus' and gene_locus is None:
+                    gene_locus = name.text
+                if gene_any is None:
+                    gene_any = name.text
+        
+        elif tag == _ORGANISM:
+            for name in child:
+                if name.tag != _NAME or name.text is None:
+                    continue
+                name_type = name.get('type')
+                if name_type == 'common' and species_common is None:
+                    species_common = name.text
+                elif name_type == 'scientific' and species_scientific is None:
+                    species_scientific = name.text
+        
+        elif tag == _DB_REFERENCE:
+            ref_type = child.get('type')
+            if ref_type == 'STRING':
+                if string_id is None:
+                    string_id = child.get('id')
+            elif ref_type == 'OpenTargets':
+                if opentargets_id is None:
+                    opentargets_id = child.get('id')
+        
+        elif tag == _SEQUENCE:
+            if not seen_sequence:
+                seen_sequence = True
+                length = child.get('length')
+                mass = child.get('mass')
+                if length is not None:
+                    sequence_length = int(length)
+                if mass is not None:
+                    sequence_mass = int(mass)
+                sequence_checksum = child.get('checksum')
+                sequence_modified = child.get('modified')
+                version = child.get('version')
+                if version is not None:
+                    sequence_version = int(version)
+            if sequence is None and child.text is not None:
+                sequence = child.text.strip()
     
-    # Functions to extract data from each entry
-    def get_accession(entry):
-        return entry.xpath('./uniprot:accession[1]/text()', namespaces=namespaces)[0]
+    if accession is None:
+        raise ValueError("entry has no accession")
     
-    def get_protein_name(entry):
-        names = entry.xpath('./uniprot:protein/uniprot:recommendedName/uniprot:fullName/text()', namespaces=namespaces)
-        if names:
-            return names[0]
-        return None
+    if gene_primary is not None:
+        gene_name = gene_primary
+    elif gene_locus is not None:
+        gene_name = gene_locus
+    else:
+        gene_name = gene_any
+    
+    species = species_common if species_common is not None else species_scientific
     
-    def get_gene_name(entry):
-        # Try primary gene name first
-        genes = entry.xpath('./uniprot:gene/uniprot:name[@type="primary"]/text()', namespaces=namespaces)
-        if genes:
-            return genes[0]
+    entry_version = entry.get('version')
+    if entry_version is not None:
+        entry_version = int(entry_version)
+    
+    return (accession, protein_name, gene_name, species, string_id, opentargets_id,
+            sequence_length, sequence_mass, sequence_checksum,
+            entry_version, entry.get('modified'), sequence_version, sequence_modified, sequence)
+
+def _iter_uniprot_rows(source):
+    """
+    Yield decoded rows for every <entry> in a UniProt XML stream
+    
+    Args:
+        source: Binary file-like object holding a complete UniProt XML document
+    """
+    # Use iterparse to process the file in a memory-efficient way
+    context = etree.iterparse(source, events=('end',), tag=_ENTRY)
+    
+    for event, elem in context:
+        try:
+            yield decode_uniprot_entry(elem)
         
-        # If no primary name, try ordered locus name
-        genes = entry.xpath('./uniprot:gene/uniprot:name[@type="ordered locus"]/text()', namespaces=namespaces)
-        if genes:
-            return genes[0]
-            
-        # If still no name, try any gene name
-        genes = entry.xpath('./uniprot:gene/uniprot:name/text()', namespaces=namespaces)
-        if genes:
-            return genes[0]
-            
+        except Exception as e:
+            logger.error(f"Error processing UniProt entry (accession may be {elem.findtext(_ACCESSION) or 'unknown'}): {e}")
+            # Continue processing other entries
+        
+        finally:
+            # Clear memory
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+def _find_entry_start(buffer, pos):
+    """Return the offset of the next '<entry' start tag at or after pos, or -1"""
+    while True:
+        pos = buffer.find(b'<entry', pos)
+        if pos == -1 or buffer[pos + 6:pos + 7] in (b' ', b'>', b'\t', b'\n', b'\r'):
+            return pos
+        pos += 6
+
+def _entry_accession(buffer, start, end):
+    """Return the first <accession> of the entry in buffer[start:end], or None"""
+    # The first <accession> is the primary one, as in decode_uniprot_entry
+    acc_start = buffer.find(b'<accession>', start, end)
+    if acc_start == -1:
         return None
+    acc_start += len(b'<accession>')
+    acc_end = buffer.find(b'</accession>', acc_start, end)
+    return buffer[acc_start:acc_end].decode('utf-8').strip()
+
+def _entry_span(buffer):
+    """Return (first entry start, end of last </entry>) in buffer, or (-1, -1)"""
+    first = _find_entry_start(buffer, 0)
+    if first == -1:
+        return -1, -1
+    return first, buffer.rfind(b'</entry>') + len(b'</entry>')
+
+def find_uniprot_entry_ranges(xml_path, chunk_bytes=UNIPROT_CHUNK_BYTES):
+    """
+    Split an uncompressed UniProt XML file into byte ranges on <entry> boundaries
+    
+    Args:
+        xml_path: Path to an uncompressed UniProt XML file
+        chunk_bytes: Approximate size of each range
     
-    def get_species(entry):
-        # Try common name first
-        species = entry.xpath('./uniprot:organism/uniprot:name[@type="common"]/text()', namespaces=namespaces)
-        if species:
-            return species[0]
+    Returns:
+        Tuple (header, footer, ranges) where header is everything before the
+        first entry, footer everything after the last one, and ranges a list
+        of (start, end) byte offsets that each cover whole entries
+    """
+    if os.path.getsize(xml_path) == 0:
+        return b'', b'', []
+    
+    with open(xml_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        first, last_end = _entry_span(mm)
+        if first == -1:
+            return mm[:], b'', []
         
-        # If no common name, use scientific name
-        species = entry.xpath('./uniprot:organism/uniprot:name[@type="scientific"]/text()', namespaces=namespaces)
-        if species:
-            return species[0]
-            
-        return None
+        boundaries = [first]
+        
+        # Jump roughly chunk_bytes ahead, then move forward to the next entry start
+        pos = first + chunk_bytes
+        while pos < last_end:
+            next_start = _find_entry_start(mm, pos)
+            if next_start == -1 or next_start >= last_end:
+                break
+            boundaries.append(next_start)
+            pos = next_start + chunk_bytes
+        
+        boundaries.append(last_end)
+        return mm[:first], mm[last_end:], list(zip(boundaries[:-1], boundaries[1:]))
+
+def _decode_uniprot_range(task):
+    """
+    Worker: decode the entries in one byte range of a UniProt XML file
     
-    def get_string_id(entry):
-        refs = entry.xpath('./uniprot:dbReference[@type="STRING"]/@id', namespaces=namespaces)
-        if refs:
-            return refs[0]
-        return None
+    Args:
+        task: Tuple (xml_path, start, end, header, footer)
     
-    def get_opentargets_id(entry):
-        refs = entry.xpath('./uniprot:dbReference[@type="OpenTargets"]/@id', namespaces=namespaces)
-        if refs:
-            return refs[0]
-        return None
+    Returns:
+        List of decoded row tuples, in file order
+    """
+    xml_path, start, end, header, footer = task
     
-    def get_sequence_length(entry):
-        seq = entry.xpath('./uniprot:sequence', namespaces=namespaces)
-        if seq and 'length' in seq[0].attrib:
-            return int(seq[0].attrib['length'])
-        return None
+    with open(xml_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
     
-    def get_sequence_mass(entry):
-        seq = entry.xpath('./uniprot:sequence', namespaces=namespaces)
-        if seq and 'mass' in seq[0].attrib:
-            return int(seq[0].attrib['mass'])
-        return None
+    # Wrap the slice in the document's own root element so namespaces resolve
+    return list(_iter_uniprot_rows(io.BytesIO(header + data + footer)))
+
+def _uncompressed_xml_path(xml_path):
+    """
+    Return a path to an uncompressed copy of xml_path
     
-    def get_sequence(entry):
-        seq = entry.xpath('./uniprot:sequence/text()', namespaces=namespaces)
-        if seq:
-            return seq[0].strip()
-        return None
+    Gzipped inputs are decompressed once into TEMP_DIR and reused while the
+    copy is newer than the source.
+    """
+    xml_path = Path(xml_path)
+    if xml_path.suffix != '.gz':
+        return xml_path
     
-    # Process XML file using iterparse to avoid loading the entire file into memory
-    batch = []
+    target = TEMP_DIR / xml_path.stem
+    if target.exists() and target.stat().st_mtime >= xml_path.stat().st_mtime:
+        return target
     
-    # Check if file is gzipped
-    open_func = gzip.open if str(xml_path).endswith('.gz') else open
+    logger.info(f"Decompressing {xml_path} to {target}")
+    partial = target.with_name(target.name + '.partial')
+    with gzip.open(xml_path, 'rb') as src, open(partial, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 16 * 1024 * 1024)
+    os.replace(partial, target)
+    return target
+
+def _iter_uniprot_rows_parallel(xml_path, workers, chunk_bytes):
+    """
+    Yield decoded rows using a process pool over entry-aligned byte ranges
     
-    with open_func(xml_path, 'rb') as f:
-        # Use iterparse to process the file in a memory-efficient way
-        context = etree.iterparse(f, events=('end',), tag=f'{{{namespaces["uniprot"]}}}entry')
+    Rows come back in file order, so the result matches the serial path.
+    """
+    plain_path = _uncompressed_xml_path(xml_path)
+    header, footer, ranges = find_uniprot_entry_ranges(plain_path, chunk_bytes)
+    logger.info(f"Split {plain_path} into {len(ranges)} ranges for {workers} workers")
+    
+    tasks = [(str(plain_path), start, end, header, footer) for start, end in ranges]
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool, \
+            tqdm(total=len(tasks), desc="Processing UniProt ranges") as progress:
+        # Keep a bounded number of ranges in flight so parsed rows don't pile up
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_decode_uniprot_range, task))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+                progress.update(1)
         
-        for event, elem in tqdm(context, desc="Processing UniProt entries"):
-            try:
-                # Extract data
-                accession = get_accession(elem)
-                protein_record = StagingUniProt(
-                    accession=accession,
-                    protein_name=get_protein_name(elem),
-                    gene_name=get_gene_name(elem),
-                    species=get_species(elem),
-                    string_id=get_string_id(elem),
-                    opentargets_id=get_opentargets_id(elem),
-                    sequence_length=get_sequence_length(elem),
-                    sequence_mass=get_sequence_mass(elem),
-                    sequence=get_sequence(elem)
-                )
-                
-                batch.append(protein_record)
-                
-                # Process in batches to conserve memory
-                if len(batch) >= BATCH_SIZE:
-                    session.add_all(batch)
-                    session.commit()
-                    batch = []
-                
-                # Clear memory
-                elem.clear()
-                while elem.getprevious() is not None:
-                    del elem.getparent()[0]
+        while pending:
+            yield from pending.popleft().result()
+            progress.update(1)
+
+def _staging_row(row, sequences):
+    """
+    Replace the trailing sequence of a decoded row with its sequence store reference
+    
+    Args:
+        row: Tuple ordered as UNIPROT_FIELDS
+        sequences: SequenceStoreWriter
+    
+    Returns:
+        Tuple ordered as STAGING_UNIPROT_COLUMNS
+    """
+    sequence = row[-1]
+    ref = sequences.add(row[0], sequence) if sequence is not None else None
+    return row[:-1] + (ref,)
+
+def _stage_uniprot_rows(session, rows, sequences, replace=False):
+    """
+    Bulk load decoded UniProt rows into the staging table
+    
+    Args:
+        session: SQLAlchemy session
+        rows: Iterable of tuples ordered as UNIPROT_FIELDS
+        sequences: SequenceStoreWriter receiving the full sequences
+        replace: Overwrite rows whose accession is already staged
+    
+    Returns:
+        Number of staged rows
+    """
+    on_conflict = 'REPLACE' if replace else None
+    
+    with BulkInserter(session, StagingUniProt, STAGING_UNIPROT_COLUMNS, on_conflict=on_conflict) as inserter:
+        batch = []
+        
+        for row in rows:
+            batch.append(_staging_row(row, sequences))
             
-            except Exception as e:
-                logger.error(f"Error processing UniProt entry (accession may be {get_accession(elem) if 'get_accession' in locals() else 'unknown'}): {e}")
-                # Continue processing other entries
-                continue
+            if len(batch) >= BATCH_SIZE:
+                inserter.insert_many(batch)
+                batch = []
         
-        # Add any remaining records
         if batch:
-            try:
-                session.add_all(batch)
-                session.commit()
-            except Exception as e:
-                logger.error(f"Error committing final batch: {e}")
-                session.rollback()
+            inserter.insert_many(batch)
+    
+    return inserter.count
+
+@contextmanager
+def _uniprot_rows(xml_path, workers, chunk_bytes):
+    """Yield an iterator of decoded rows, parsed serially or by a process pool"""
+    if workers > 1:
+        yield _iter_uniprot_rows_parallel(xml_path, workers, chunk_bytes)
+        return
+    
+    with open_with_progress(xml_path, "Processing UniProt entries") as f:
+        yield _iter_uniprot_rows(f)
+
+def extract_uniprot_data(session, xml_path=UNIPROT_XML_PATH, workers=1,
+                         chunk_bytes=UNIPROT_CHUNK_BYTES, sequence_store_dir=SEQUENCE_STORE_DIR):
+    """
+    Extract data from UniProt XML file and load to staging table
+    
+    The staging table and the sequence store are rebuilt from scratch.
+    
+    Args:
+        session: SQLAlchemy session
+        xml_path: Path to UniProt XML file
+        workers: Number of parsing processes; 1 parses in this process
+        chunk_bytes: Approximate byte range handed to each parallel task
+        sequence_store_dir: Directory of the compressed sequence store
+    """
+    logger.info(f"Extracting UniProt data from {xml_path}")
+    
+    # Staged rows reference sequences by position, so both start empty
+    session.query(StagingUniProt).delete()
+    session.commit()
+    
+    with fast_load(session), SequenceStoreWriter(sequence_store_dir) as sequences, \
+            _uniprot_rows(xml_path, workers, chunk_bytes) as rows:
+        _stage_uniprot_rows(session, rows, sequences)
     
     # Get count of loaded records
     try:
@@ -166,75 +410,435 @@ def extract_uniprot_data(session, xml_path=UNIPROT_XML_PATH):
     except Exception as e:
         logger.error(f"Error counting records: {e}")
 
-def extract_string_data(session, file_path=STRING_DATA_PATH):
+def refresh_uniprot_data(session, xml_path=UNIPROT_XML_PATH, workers=1,
+                         chunk_bytes=UNIPROT_CHUNK_BYTES, sequence_store_dir=SEQUENCE_STORE_DIR):
     """
-    Extract data from STRING file and load to staging table
+    Incrementally bring staging_uniprot in line with a new UniProt release
+    
+    Entries whose version, modification dates and sequence checksum match the
+    staged values are left alone; only new, changed and vanished accessions
+    are written. Changed sequences are appended to the sequence store.
     
     Args:
         session: SQLAlchemy session
-        file_path: Path to STRING data file
+        xml_path: Path to UniProt XML file
+        workers: Number of parsing processes; 1 parses in this process
+        chunk_bytes: Approximate byte range handed to each parallel task
+        sequence_store_dir: Directory of the compressed sequence store
+    
+    Returns:
+        Dict with inserted, updated, deleted and unchanged counts
     """
-    logger.info(f"Extracting STRING data from {file_path}")
+    logger.info(f"Refreshing UniProt staging data from {xml_path}")
     
-    # Process in chunks to conserve memory
-    chunksize = BATCH_SIZE
+    fingerprint_columns = [getattr(StagingUniProt, field) for field in UNIPROT_FINGERPRINT_FIELDS]
+    stored = {
+        accession: tuple(fingerprint)
+        for accession, *fingerprint in session.query(StagingUniProt.accession, *fingerprint_columns)
+    }
+    positions = [UNIPROT_FIELDS.index(field) for field in UNIPROT_FINGERPRINT_FIELDS]
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
     
-    # Check if file is gzipped
-    open_func = gzip.open if str(file_path).endswith('.gz') else open
+    def changed(rows):
+        for row in rows:
+            fingerprint = tuple(row[i] for i in positions)
+            previous = stored.pop(row[0], None)
+            
+            # Entries without any release metadata can't be compared, so rewrite them
+            if previous is not None and previous == fingerprint and any(v is not None for v in fingerprint):
+                counts['unchanged'] += 1
+                continue
+            
+            counts['inserted' if previous is None else 'updated'] += 1
+            yield row
     
-    # Get total number of lines for progress reporting
-    with open_func(file_path, 'rt') as f:
-        total_lines = sum(1 for _ in f)
+    with fast_load(session), SequenceStoreWriter(sequence_store_dir, append=True) as sequences, \
+            _uniprot_rows(xml_path, workers, chunk_bytes) as rows:
+        _stage_uniprot_rows(session, changed(rows), sequences, replace=True)
     
-    # Process file
-    processed_lines = 0
+    # Whatever was staged but not seen in this release has been removed
+    removed = list(stored)
+    for i in range(0, len(removed), BATCH_SIZE):
+        counts['deleted'] += (
+            session.query(StagingUniProt)
+            .filter(StagingUniProt.accession.in_(removed[i:i+BATCH_SIZE]))
+            .delete(synchronize_session=False)
+        )
+    session.commit()
     
-    with open_func(file_path, 'rt') as f:
-        # Skip header
-        header = f.readline()
-        processed_lines += 1
-        
+    logger.info(f"Refreshed UniProt staging: {counts['inserted']} inserted, {counts['updated']} updated, "
+                f"{counts['deleted']} deleted, {counts['unchanged']} unchanged")
+    return counts
+
+def build_uniprot_index(session, xml_path=UNIPROT_XML_PATH):
+    """
+    Record the byte offset and length of every <entry> by accession
+    
+    Offsets refer to the uncompressed XML; gzipped inputs are indexed through
+    their decompressed copy in TEMP_DIR.
+    
+    Args:
+        session: SQLAlchemy session
+        xml_path: Path to UniProt XML file
+    
+    Returns:
+        Number of indexed entries
+    """
+    plain_path = _uncompressed_xml_path(xml_path)
+    logger.info(f"Building UniProt entry index for {plain_path}")
+    
+    session.query(UniProtEntryIndex).delete()
+    session.commit()
+    
+    if os.path.getsize(plain_path) == 0:
+        return 0
+    
+    with open(plain_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+            tqdm(total=len(mm), unit='B', unit_scale=True, desc="Indexing UniProt entries") as progress, \
+            fast_load(session), \
+            BulkInserter(session, UniProtEntryIndex, ('accession', 'offset', 'length')) as inserter:
         batch = []
+        pos = _find_entry_start(mm, 0)
         
-        for line in tqdm(f, total=total_lines-1, desc="Processing STRING interactions"):
-            try:
-                protein1, protein2, combined_score = line.strip().split()[:3]
-                
-                # Convert combined_score to integer
-                combined_score = int(combined_score)
-                
-                interaction = StagingString(
-                    protein1=protein1,
-                    protein2=protein2,
-                    combined_score=combined_score
-                )
-                
-                batch.append(interaction)
-                
-                # Process in batches
-                if len(batch) >= chunksize:
-                    session.add_all(batch)
-                    session.commit()
-                    batch = []
+        while pos != -1:
+            end = mm.find(b'</entry>', pos)
+            if end == -1:
+                break
+            end += len(b'</entry>')
+            
+            accession = _entry_accession(mm, pos, end)
+            if accession is not None:
+                batch.append((accession, pos, end - pos))
             
-            except Exception as e:
-                logger.error(f"Error processing STRING line: {e}")
-                session.rollback()
+            if len(batch) >= BATCH_SIZE:
+                inserter.insert_many(batch)
+                batch = []
             
-            processed_lines += 1
+            progress.update(end - progress.n)
+            pos = _find_entry_start(mm, end)
         
-        # Add any remaining records
         if batch:
-            session.add_all(batch)
-            session.commit()
+            inserter.insert_many(batch)
+    
+    count = inserter.count
+    logger.info(f"Indexed {count} UniProt entries")
+    return count
+
+def fetch_uniprot_entries(session, accessions, xml_path=UNIPROT_XML_PATH):
+    """
+    Decode only the requested entries using the byte-offset index
+    
+    Args:
+        session: SQLAlchemy session
+        accessions: Iterable of UniProt accessions
+        xml_path: Path to the UniProt XML file the index was built from
+    
+    Returns:
+        List of decoded row tuples ordered as UNIPROT_FIELDS, in file order;
+        accessions missing from the index and entries that fail to decode
+        are skipped with a warning
+    
+    Raises:
+        ValueError: If an indexed byte range no longer holds its entry
+    """
+    accessions = list(dict.fromkeys(accessions))
+    locations = []
+    
+    for i in range(0, len(accessions), BATCH_SIZE):
+        locations.extend(
+            session.query(UniProtEntryIndex.accession, UniProtEntryIndex.offset, UniProtEntryIndex.length)
+            .filter(UniProtEntryIndex.accession.in_(accessions[i:i+BATCH_SIZE]))
+            .all()
+        )
+    
+    missing = len(accessions) - len(locations)
+    if missing:
+        logger.warning(f"{missing} requested accessions were not found in the UniProt index")
+    
+    if not locations:
+        return []
+    
+    # Read in file order so the slices are visited sequentially
+    locations.sort(key=lambda loc: loc[1])
+    plain_path = _uncompressed_xml_path(xml_path)
+    
+    with open(plain_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        first, last_end = _entry_span(mm)
+        header, footer = mm[:first], mm[last_end:]
+        fragments = [mm[offset:offset + length] for _, offset, length in locations]
+    
+    # The index is stale when a range no longer holds a whole entry under
+    # its accession; whether the entry decodes is a separate matter
+    for (accession, _, _), frag in zip(locations, fragments):
+        if not (frag.startswith(b'<entry') and frag.endswith(b'</entry>')) \
+                or _entry_accession(frag, 0, len(frag)) != accession:
+            raise ValueError(f"UniProt entry index does not match {plain_path}; "
+                             f"rebuild it with build_uniprot_index")
+    
+    try:
+        rows = list(_iter_uniprot_rows(io.BytesIO(header + b''.join(fragments) + footer)))
+    except etree.XMLSyntaxError:
+        # Parse entry by entry so a malformed one loses only itself
+        rows = []
+        for frag in fragments:
+            try:
+                rows.extend(_iter_uniprot_rows(io.BytesIO(header + frag + footer)))
+            except etree.XMLSyntaxError:
+                pass
+    
+    decoded = {row[0] for row in rows}
+    undecodable = [loc[0] for loc in locations if loc[0] not in decoded]
+    if undecodable:
+        logger.warning(f"Could not decode {len(undecodable)} UniProt entries: "
+                       f"{', '.join(undecodable[:10])}{' ...' if len(undecodable) > 10 else ''}")
+    
+    return rows
+
+def extract_uniprot_subset(session, accessions, xml_path=UNIPROT_XML_PATH,
+                           sequence_store_dir=SEQUENCE_STORE_DIR):
+    """
+    Re-extract selected UniProt accessions into staging without a full pass
+    
+    Builds the entry index on first use and rebuilds it once if it turns
+    out to be stale.
+    
+    Args:
+        session: SQLAlchemy session
+        accessions: Iterable of UniProt accessions
+        xml_path: Path to UniProt XML file
+        sequence_store_dir: Directory of the compressed sequence store
+    
+    Returns:
+        Number of staged entries
+    """
+    accessions = list(dict.fromkeys(accessions))
+    logger.info(f"Extracting {len(accessions)} UniProt accessions from {xml_path}")
+    
+    if session.query(UniProtEntryIndex).first() is None:
+        build_uniprot_index(session, xml_path)
+    
+    try:
+        rows = fetch_uniprot_entries(session, accessions, xml_path)
+    except ValueError as e:
+        logger.warning(f"{e}; rebuilding")
+        build_uniprot_index(session, xml_path)
+        rows = fetch_uniprot_entries(session, accessions, xml_path)
+    
+    with SequenceStoreWriter(sequence_store_dir, append=True) as sequences:
+        _stage_uniprot_rows(session, rows, sequences, replace=True)
+    
+    logger.info(f"Staged {len(rows)} UniProt entries")
+    return len(rows)
+
+def _batch_rows(batch, columns):
+    """Return the rows of an Arrow record batch as tuples of the given columns"""
+    return zip(*(batch.column(name).to_pylist() for name in columns))
+
+def _canonical_pairs(batch):
+    """Order each STRING pair so protein1 <= protein2"""
+    protein1, protein2 = batch.column('protein1'), batch.column('protein2')
+    swap = pc.less(protein2, protein1)
+    return pa.RecordBatch.from_arrays(
+        [pc.if_else(swap, protein2, protein1), pc.if_else(swap, protein1, protein2),
+         batch.column('combined_score')],
+        names=['protein1', 'protein2', 'combined_score']
+    )
+
+def extract_string_data(session, file_path=STRING_DATA_PATH, keep_all=STRING_KEEP_ALL):
+    """
+    Extract data from STRING file and load to staging table
+    
+    The file is read in large blocks by pyarrow's CSV reader. Unless keep_all
+    is set, rows at or below STRING_SCORE_THRESHOLD are dropped at read time,
+    matching the filter applied later in transform_string_to_interactions.
+    
+    STRING lists every edge in both directions; pairs are stored once, as
+    (min, max), and the repeated direction is ignored.
+    
+    Args:
+        session: SQLAlchemy session
+        file_path: Path to STRING data file
+        keep_all: Stage every interaction regardless of combined_score
+    """
+    logger.info(f"Extracting STRING data from {file_path}")
+    
+    # Replace the previous extract rather than merging into it
+    session.query(StagingString).delete()
+    session.commit()
+    
+    def skip_invalid_row(row):
+        logger.error(f"Error processing STRING line {row.number}: {row.text!r}")
+        return 'skip'
+    
+    columns = ('protein1', 'protein2', 'combined_score')
+    read_options = pa_csv.ReadOptions(block_size=STRING_READ_BLOCK_BYTES)
+    parse_options = pa_csv.ParseOptions(delimiter=' ', invalid_row_handler=skip_invalid_row)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=list(columns),
+        column_types={'protein1': pa.string(), 'protein2': pa.string(), 'combined_score': pa.int32()}
+    )
+    
+    read_rows = 0
+    
+    # Read the file once; progress comes from bytes consumed on disk
+    with open_with_progress(file_path, "Processing STRING interactions") as f, fast_load(session), \
+            BulkInserter(session, StagingString, columns, on_conflict='IGNORE') as inserter:
+        reader = pa_csv.open_csv(f, read_options=read_options, parse_options=parse_options,
+                                 convert_options=convert_options)
+        
+        for batch in reader:
+            read_rows += batch.num_rows
+            
+            if not keep_all:
+                batch = batch.filter(pc.greater(batch.column('combined_score'), STRING_SCORE_THRESHOLD))
+            
+            # One executemany per block, straight from the Arrow columns
+            inserter.insert_many(_batch_rows(_canonical_pairs(batch), columns))
     
     # Get count of loaded records
     count = session.query(StagingString).count()
-    logger.info(f"Loaded {count} STRING records to staging")
+    logger.info(f"Read {read_rows} STRING rows; {count} undirected STRING records in staging")
+
+# One OpenTargets dataset: a directory of parquet files and where its rows go
+ParquetSource = namedtuple('ParquetSource', ['path', 'table', 'columns', 'kind', 'row_filter'])
+
+# Marks the end of a file's batches in its queue
+_END_OF_FILE = object()
+
+def _read_parquet_file(file, source, batch_rows, batches, cancel):
+    """
+    Decode one parquet file into a bounded queue of record batches
+    
+    Runs in a reader thread; pyarrow releases the GIL while decoding. The last
+    item put is _END_OF_FILE, or the exception that stopped the read. Setting
+    cancel makes the reader give up, even while it waits on a full queue.
+    """
+    def put(item):
+        while not cancel.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    try:
+        dataset = ds.dataset(file, format='parquet')
+        available = set(dataset.schema.names)
+        read_columns = [name for name in source.columns if name in available]
+        
+        for batch in dataset.to_batches(columns=read_columns, filter=source.row_filter,
+                                        batch_size=batch_rows):
+            # Missing columns become NULL
+            arrays = [batch.column(name) if name in available else pa.nulls(batch.num_rows)
+                      for name in source.columns]
+            if not put(arrays):
+                return
+        put(_END_OF_FILE)
+    
+    except Exception as e:
+        put(e)
+
+def _stage_parquet_sources(session, sources, readers=OPENTARGETS_READ_THREADS,
+                           batch_rows=OPENTARGETS_BATCH_ROWS, queue_batches=OPENTARGETS_QUEUE_BATCHES):
+    """
+    Bulk load the parquet files of several datasets into their staging tables
+    
+    Up to readers files, from any of the datasets, are decoded at once by a
+    thread pool. Only the mapped columns are decoded, and each source's
+    row_filter is pushed down to the parquet scan. The calling thread is the
+    single SQLite writer: it drains the files' batches in order and commits
+    each file on its own, so a bad file is logged and skipped without losing
+    the others. Memory is bounded by queue_batches record batches of at most
+    batch_rows per file being read.
+    
+    Args:
+        session: SQLAlchemy session
+        sources: ParquetSource for each dataset
+        readers: Reader threads
+        batch_rows: Rows per record batch
+        queue_batches: Decoded batches a reader may hold ahead of the writer
+    """
+    tasks = []
+    for source in sources:
+        logger.info(f"Extracting OpenTargets {source.kind} data from {source.path}")
+        path = Path(source.path)
+        if path.is_dir():
+            # Load all parquet files in directory
+            tasks.extend((file, source) for file in sorted(path.glob("*.parquet")))
+    
+    inserters = {
+        source.kind: BulkInserter(session, source.table, list(source.columns.values()))
+        for source in sources
+    }
+    with ThreadPoolExecutor(max_workers=max(1, readers)) as pool:
+        try:
+            # Tasks start in submission order, so the file the writer is
+            # waiting on is always being read
+            # Each file's reader has its own cancel event, so giving up on one
+            # file frees its pool slot for the files after it
+            queues = []
+            cancels = []
+            for file, source in tasks:
+                batches = queue.Queue(maxsize=queue_batches)
+                cancel = threading.Event()
+                pool.submit(_read_parquet_file, file, source, batch_rows, batches, cancel)
+                queues.append(batches)
+                cancels.append(cancel)
+            
+            for (file, source), batches, cancel in tqdm(zip(tasks, queues, cancels), total=len(tasks),
+                                                        desc="Processing OpenTargets files"):
+                inserter = inserters[source.kind]
+                try:
+                    while (arrays := batches.get()) is not _END_OF_FILE:
+                        if isinstance(arrays, Exception):
+                            raise arrays
+                        inserter.insert_many(zip(*(array.to_pylist() for array in arrays)))
+                    
+                    inserter.commit()
+                
+                except Exception as e:
+                    logger.error(f"Error processing {source.kind} file {file}: {e}")
+                    inserter.rollback()
+                    cancel.set()
+        
+        finally:
+            # Release readers still blocked on a full queue and drop unstarted ones
+            for cancel in cancels:
+                cancel.set()
+            pool.shutdown(cancel_futures=True)
+
+def _association_filter(min_score=None, datasources=None, target_ids=None):
+    """
+    Build the pushdown filter for association files
+    
+    Args:
+        min_score: Keep associations scoring at least this
+        datasources: Keep only these datasourceId values
+        target_ids: Keep only these targetId values
+    
+    Returns:
+        pyarrow dataset expression, or None to keep every row
+    """
+    conditions = []
+    if min_score is not None:
+        conditions.append(ds.field('score') >= min_score)
+    if datasources is not None:
+        conditions.append(ds.field('datasourceId').isin(list(datasources)))
+    if target_ids is not None:
+        conditions.append(ds.field('targetId').isin(list(target_ids)))
+    
+    row_filter = None
+    for condition in conditions:
+        row_filter = condition if row_filter is None else row_filter & condition
+    return row_filter
 
 def extract_opentargets_data(session, targets_path=OPENTARGETS_TARGETS_PATH, 
                             diseases_path=OPENTARGETS_DISEASES_PATH,
-                            associations_path=OPENTARGETS_ASSOCIATIONS_PATH):
+                            associations_path=OPENTARGETS_ASSOCIATIONS_PATH,
+                            min_score=OPENTARGETS_MIN_SCORE, datasources=OPENTARGETS_DATASOURCES,
+                            uniprot_targets_only=OPENTARGETS_UNIPROT_TARGETS_ONLY,
+                            readers=OPENTARGETS_READ_THREADS):
     """
     Extract data from OpenTargets parquet files and load to staging tables
     
@@ -243,102 +847,41 @@ def extract_opentargets_data(session, targets_path=OPENTARGETS_TARGETS_PATH,
         targets_path: Path to OpenTargets targets parquet files
         diseases_path: Path to OpenTargets diseases parquet files
         associations_path: Path to OpenTargets associations parquet files
+        min_score: Skip associations scoring below this
+        datasources: Stage only associations from these datasource IDs
+        uniprot_targets_only: Stage only associations whose target is linked
+            from a staged UniProt entry
+        readers: Threads decoding parquet files concurrently
     """
-    # Extract targets data
-    logger.info(f"Extracting OpenTargets targets data from {targets_path}")
-    targets_path = Path(targets_path)
+    target_ids = None
+    if uniprot_targets_only:
+        target_ids = [target_id for (target_id,) in session.query(StagingUniProt.opentargets_id)
+                      .filter(StagingUniProt.opentargets_id.isnot(None)).distinct()]
+        logger.info(f"Restricting associations to {len(target_ids)} UniProt-linked targets")
     
-    if targets_path.is_dir():
-        # Load all parquet files in directory
-        parquet_files = list(targets_path.glob("*.parquet"))
-        
-        for file in tqdm(parquet_files, desc="Processing target files"):
-            try:
-                df = pd.read_parquet(file, columns=['id', 'approvedSymbol', 'biotype'])
-                
-                # Convert to records and load in batches
-                records = df.to_dict(orient='records')
-                
-                for i in range(0, len(records), BATCH_SIZE):
-                    batch = [
-                        StagingOpenTargetsTarget(
-                            id=record['id'],
-                            approved_symbol=record.get('approvedSymbol'),
-                            biotype=record.get('biotype')
-                        )
-                        for record in records[i:i+BATCH_SIZE]
-                    ]
-                    
-                    session.add_all(batch)
-                    session.commit()
-            
-            except Exception as e:
-                logger.error(f"Error processing targets file {file}: {e}")
-                session.rollback()
-    
-    # Extract diseases data
-    logger.info(f"Extracting OpenTargets diseases data from {diseases_path}")
-    diseases_path = Path(diseases_path)
+    association_filter = _association_filter(min_score, datasources, target_ids)
+    if association_filter is not None:
+        logger.info(f"Filtering associations on {association_filter}")
     
-    if diseases_path.is_dir():
-        # Load all parquet files in directory
-        parquet_files = list(diseases_path.glob("*.parquet"))
-        
-        for file in tqdm(parquet_files, desc="Processing disease files"):
-            try:
-                df = pd.read_parquet(file, columns=['id', 'name'])
-                
-                # Convert to records and load in batches
-                records = df.to_dict(orient='records')
-                
-                for i in range(0, len(records), BATCH_SIZE):
-                    batch = [
-                        StagingOpenTargetsDisease(
-                            id=record['id'],
-                            name=record.get('name')
-                        )
-                        for record in records[i:i+BATCH_SIZE]
-                    ]
-                    
-                    session.add_all(batch)
-                    session.commit()
-            
-            except Exception as e:
-                logger.error(f"Error processing diseases file {file}: {e}")
-                session.rollback()
+    sources = [
+        ParquetSource(targets_path, StagingOpenTargetsTarget,
+                      {'id': 'id', 'approvedSymbol': 'approved_symbol', 'biotype': 'biotype'},
+                      'targets', None),
+        ParquetSource(diseases_path, StagingOpenTargetsDisease,
+                      {'id': 'id', 'name': 'name'}, 'diseases', None),
+        ParquetSource(associations_path, StagingOpenTargetsAssociation,
+                      {'targetId': 'target_id', 'diseaseId': 'disease_id', 'score': 'score',
+                       'datasourceId': 'datasource'},
+                      'associations', association_filter),
+    ]
     
-    # Extract associations data
-    logger.info(f"Extracting OpenTargets associations data from {associations_path}")
-    associations_path = Path(associations_path)
+    # Replace the previous extract rather than merging into it
+    for source in sources:
+        session.query(source.table).delete()
+    session.commit()
     
-    if associations_path.is_dir():
-        # Load all parquet files in directory
-        parquet_files = list(associations_path.glob("*.parquet"))
-        
-        for file in tqdm(parquet_files, desc="Processing association files"):
-            try:
-                df = pd.read_parquet(file)
-                
-                # Convert to records and load in batches
-                records = df.to_dict(orient='records')
-                
-                for i in range(0, len(records), BATCH_SIZE):
-                    batch = [
-                        StagingOpenTargetsAssociation(
-                            target_id=record.get('targetId'),
-                            disease_id=record.get('diseaseId'),
-                            score=record.get('score'),
-                            datasource=record.get('datasourceId')
-                        )
-                        for record in records[i:i+BATCH_SIZE]
-                    ]
-                    
-                    session.add_all(batch)
-                    session.commit()
-            
-            except Exception as e:
-                logger.error(f"Error processing associations file {file}: {e}")
-                session.rollback()
+    with fast_load(session):
+        _stage_parquet_sources(session, sources, readers=readers)
     
     # Get counts of loaded records
     targets_count = session.query(StagingOpenTargetsTarget).count()
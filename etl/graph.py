@@ -0,0 +1,166 @@
+# etl/graph.py
+"""
+Compressed sparse row (CSR) index of the protein interaction graph
+
+A graph is a directory holding:
+
+    nodes.npy       accessions sorted, the position is the node ID
+    offsets.npy     start of each node's neighbors (plus the end), by node ID
+    neighbors.npy   neighbor node IDs, each node's slice by descending score
+    scores.npy      combined_score of each entry in neighbors.npy
+
+Every undirected interaction appears in the slices of both its proteins.
+Because slices are score-sorted, the neighbors above a threshold are a
+prefix found by binary search.
+"""
+import logging
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+
+from config import GRAPH_DIR
+from etl.utils import fetch_column_arrays, save_npy
+
+logger = logging.getLogger(__name__)
+
+ACCESSION_DTYPE = 'S16'
+
+def build_interaction_graph(session, path=GRAPH_DIR):
+    """
+    Build the CSR index from the proteins and protein_interactions tables
+    
+    Args:
+        session: SQLAlchemy session
+        path: Output directory
+    
+    Returns:
+        Tuple of (node count, directed edge count)
+    """
+    logger.info("Building interaction graph index")
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    
+    keys, nodes = fetch_column_arrays(session, "SELECT protein_sk, accession FROM proteins",
+                                      ['<i8', ACCESSION_DTYPE])
+    order = np.argsort(nodes)
+    keys, nodes = keys[order], nodes[order]
+    protein1, protein2, scores = fetch_column_arrays(
+        session,
+        "SELECT protein1_sk, protein2_sk, combined_score FROM protein_interactions",
+        ['<i8', '<i8', '<i4']
+    )
+    
+    # Protein key to node ID, -1 for keys without a protein
+    size = max(keys.max(initial=-1), protein1.max(initial=-1), protein2.max(initial=-1)) + 1
+    node_of_key = np.full(size, -1, dtype='<i4')
+    node_of_key[keys] = np.arange(len(keys))
+    
+    # Drop edges to withdrawn proteins
+    id1 = node_of_key[protein1]
+    id2 = node_of_key[protein2]
+    mapped = (id1 >= 0) & (id2 >= 0)
+    if not mapped.all():
+        logger.warning(f"Skipped {np.count_nonzero(~mapped)} interactions with a protein key not in proteins")
+        id1, id2, scores = id1[mapped], id2[mapped], scores[mapped]
+    
+    # Both directions of every edge; a self-interaction is listed once
+    loop = id1 == id2
+    sources = np.concatenate([id1, id2[~loop]])
+    targets = np.concatenate([id2, id1[~loop]])
+    scores = np.concatenate([scores, scores[~loop]])
+    
+    # Group by source, then descending score, ties broken by neighbor ID
+    order = np.lexsort((targets, -scores, sources))
+    sources, targets, scores = sources[order], targets[order], scores[order]
+    
+    offsets = np.zeros(len(nodes) + 1, dtype='<i8')
+    np.cumsum(np.bincount(sources, minlength=len(nodes)), out=offsets[1:])
+    
+    save_npy(path / 'nodes.npy', nodes)
+    save_npy(path / 'offsets.npy', offsets)
+    save_npy(path / 'neighbors.npy', targets)
+    save_npy(path / 'scores.npy', scores)
+    
+    logger.info(f"Built interaction graph with {len(nodes)} proteins and {len(targets)} directed edges")
+    return len(nodes), len(targets)
+
+class InteractionGraph:
+    """
+    Read-only, memory-mapped access to an interaction graph index
+    
+    Args:
+        path: Graph directory
+    """
+    
+    def __init__(self, path=GRAPH_DIR):
+        self.path = Path(path)
+        self._nodes = np.load(self.path / 'nodes.npy', mmap_mode='r')
+        self._offsets = np.load(self.path / 'offsets.npy', mmap_mode='r')
+        self._neighbors = np.load(self.path / 'neighbors.npy', mmap_mode='r')
+        self._scores = np.load(self.path / 'scores.npy', mmap_mode='r')
+    
+    def __len__(self):
+        return len(self._nodes)
+    
+    def __contains__(self, accession):
+        return self._find(accession) is not None
+    
+    def _find(self, accession):
+        key = accession.encode('ascii')
+        pos = int(np.searchsorted(self._nodes, key))
+        if pos < len(self._nodes) and self._nodes[pos] == key:
+            return pos
+        return None
+    
+    def node_id(self, accession):
+        """Return the integer node ID of an accession, raising KeyError if absent"""
+        node = self._find(accession)
+        if node is None:
+            raise KeyError(accession)
+        return node
+    
+    def accession(self, node):
+        """Return the accession of a node ID"""
+        return self._nodes[node].decode('ascii')
+    
+    def _slice(self, accession):
+        node = self.node_id(accession)
+        return int(self._offsets[node]), int(self._offsets[node + 1])
+    
+    def degree(self, accession, threshold=None):
+        """
+        Count the neighbors of a protein
+        
+        Args:
+            accession: UniProt accession
+            threshold: Only count interactions scoring above this
+        """
+        start, end = self._slice(accession)
+        if threshold is not None:
+            # Scores descend within the slice, so search on their negation
+            end = bisect_left(self._scores, -threshold, start, end, key=lambda score: -score)
+        return end - start
+    
+    def neighbors(self, accession, threshold=None):
+        """
+        List the neighbors of a protein, highest score first
+        
+        Args:
+            accession: UniProt accession
+            threshold: Only return interactions scoring above this
+        
+        Returns:
+            List of (accession, combined_score) tuples
+        """
+        start, _ = self._slice(accession)
+        return self._entries(start, start + self.degree(accession, threshold))
+    
+    def top_k(self, accession, k):
+        """Return the k highest-scoring neighbors of a protein as (accession, score) tuples"""
+        start, end = self._slice(accession)
+        return self._entries(start, min(end, start + k))
+    
+    def _entries(self, start, end):
+        nodes = self._nodes[self._neighbors[start:end]]
+        return [(node.decode('ascii'), int(score)) for node, score in zip(nodes, self._scores[start:end])]
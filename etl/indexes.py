@@ -0,0 +1,75 @@
+# etl/indexes.py
+"""
+Lifecycle of the secondary indexes declared in models/schema.py
+
+Bulk loads into an indexed table pay for index maintenance on every row.
+deferred_indexes drops a table's declared indexes for the duration of a
+load, rebuilds them afterwards in one pass each and refreshes the planner
+statistics with ANALYZE. Indexes backing primary keys and unique
+constraints are part of the table and are left alone.
+"""
+import logging
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+def _tables(models):
+    return [getattr(model, '__table__', model) for model in models]
+
+def drop_indexes(session, *models):
+    """
+    Drop the declared secondary indexes of the given tables
+    
+    Args:
+        session: SQLAlchemy session
+        *models: ORM classes or Tables
+    """
+    for table in _tables(models):
+        for index in table.indexes:
+            session.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    session.commit()
+
+def create_indexes(session, *models, analyze=True):
+    """
+    Create any missing declared secondary indexes of the given tables
+    
+    Args:
+        session: SQLAlchemy session
+        *models: ORM classes or Tables
+        analyze: Refresh the planner statistics of the tables afterwards
+    """
+    connection = session.connection()
+    for table in _tables(models):
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+        if analyze:
+            session.execute(text(f"ANALYZE {table.name}"))
+    session.commit()
+
+@contextmanager
+def deferred_indexes(session, *models):
+    """
+    Drop the tables' declared indexes for a bulk load and rebuild them after
+    
+    The load is committed if it completes and rolled back if it raises.
+    
+    Args:
+        session: SQLAlchemy session
+        *models: ORM classes or Tables about to be bulk loaded
+    """
+    names = ', '.join(table.name for table in _tables(models))
+    logger.info(f"Deferring indexes on {names}")
+    drop_indexes(session, *models)
+    try:
+        yield
+    except BaseException:
+        # Don't commit a half-done load
+        session.rollback()
+        raise
+    else:
+        session.commit()
+    finally:
+        create_indexes(session, *models)
+        logger.info(f"Rebuilt and analyzed indexes on {names}")
@@ -0,0 +1,105 @@
+# etl/interactors.py
+"""
+Packed encoding of a protein's interactors
+
+With SEMANTIC_INTERACTORS_FORMAT = 'packed' the semantic build stores each
+protein's interactors in protein_interactors.packed_interactors instead of
+a JSON list of names. The blob is an array of little-endian records,
+
+    protein_sk      uint32  key of the interacting protein in `proteins`
+    combined_score  uint16  STRING combined score of the interaction
+
+ordered by descending score, then by key. Names are not repeated in every
+payload; resolve_interactors looks them up in the proteins table.
+"""
+import numpy as np
+from sqlalchemy import text
+
+INTERACTOR_DTYPE = np.dtype([('protein_sk', '<u4'), ('combined_score', '<u2')])
+
+def encode_interactors(protein_sks, scores):
+    """
+    Pack interactor keys and scores, strongest interaction first
+    
+    Args:
+        protein_sks: Keys of the interacting proteins
+        scores: Combined score of each interaction
+    
+    Returns:
+        bytes
+    """
+    records = np.empty(len(protein_sks), dtype=INTERACTOR_DTYPE)
+    records['protein_sk'] = protein_sks
+    records['combined_score'] = scores
+    order = np.lexsort((records['protein_sk'], -records['combined_score'].astype(np.int32)))
+    return records[order].tobytes()
+
+def decode_interactors(blob):
+    """
+    Unpack an encoded interactor list without copying it
+    
+    Args:
+        blob: bytes from encode_interactors, or None
+    
+    Returns:
+        Structured array with fields protein_sk and combined_score
+    """
+    return np.frombuffer(blob or b'', dtype=INTERACTOR_DTYPE)
+
+def count_interactors(blob):
+    """Number of interactors in an encoded list"""
+    return len(blob or b'') // INTERACTOR_DTYPE.itemsize
+
+def resolve_interactors(session, blob):
+    """
+    Decode an interactor list into the shape of the JSON format, plus scores
+    
+    Args:
+        session: SQLAlchemy session
+        blob: bytes from encode_interactors, or None
+    
+    Returns:
+        List of dicts with accession, protein_name, gene_name and
+        combined_score, strongest interaction first
+    """
+    records = decode_interactors(blob)
+    keys = [int(key) for key in records['protein_sk']]
+    names = {}
+    # Stay below SQLite's bound parameter limit
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        params = {f'k{i}': key for i, key in enumerate(batch)}
+        rows = session.execute(text(f"""
+            SELECT protein_sk, accession, protein_name, gene_name FROM proteins
+            WHERE protein_sk IN ({', '.join(':' + name for name in params)})
+        """), params)
+        names.update((row.protein_sk, row) for row in rows)
+    return [
+        {
+            'accession': names[key].accession,
+            'protein_name': names[key].protein_name,
+            'gene_name': names[key].gene_name,
+            'combined_score': int(score),
+        }
+        for key, score in zip(keys, records['combined_score']) if key in names
+    ]
+
+class InteractorPacker:
+    """SQLite aggregate pack_interactors(protein_sk, combined_score) over encode_interactors"""
+    
+    def __init__(self):
+        self.keys = []
+        self.scores = []
+    
+    def step(self, protein_sk, combined_score):
+        # A protein without interactors comes through a LEFT JOIN as NULLs
+        if protein_sk is not None:
+            self.keys.append(protein_sk)
+            self.scores.append(combined_score)
+    
+    def finalize(self):
+        return encode_interactors(self.keys, self.scores)
+
+def register_interactor_functions(connection):
+    """Make pack_interactors available on a DBAPI sqlite3 connection"""
+    connection.create_aggregate('pack_interactors', 2, InteractorPacker)
@@ -1,161 +1,390 @@
 # etl/load.py
 import json
 import logging
-from sqlalchemy import text
+import sqlite3
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
 from tqdm import tqdm
 from tabulate import tabulate  # NEW import for tabular display
 
-from models.schema import ProteinDiseaseNetwork
-from config import BATCH_SIZE, STRING_SCORE_THRESHOLD
+from models.schema import Protein, ProteinDiseaseNetwork, ProteinInteractorList, DirtyProtein
+from config import (
+    BATCH_SIZE, TEMP_DIR, STRING_SCORE_THRESHOLD, SEMANTIC_FULL_REBUILD_FRACTION, SEMANTIC_BATCH_PROTEINS,
+    SEMANTIC_INTERACTORS_FORMAT
+)
+from etl.bulk import fast_load, dbapi_connection
+from etl.changes import mark_all_dirty
+from etl.interactors import register_interactor_functions, count_interactors
+from etl.indexes import deferred_indexes
 
 logger = logging.getLogger(__name__)
 
-def build_semantic_layer(session):
+# The semantic layer is built per batch of protein keys staged in
+# temp.semantic_proteins. Joins start from the batch (CROSS JOIN fixes the
+# order in SQLite), so each statement only touches the batch's rows.
+
+# Interacting proteins above the score threshold as comma-separated JSON
+# objects, one statement per direction of the stored pairs. Each groups in
+# the order of the index it walks, so no sort is needed;
+# PROTEIN_INTERACTORS_QUERY joins the two halves into one array.
+INTERACTORS_QUERY = """
+INSERT INTO temp.semantic_interactors (protein_sk, {half})
+SELECT k.protein_sk,
+       group_concat(json_object('accession', p.accession, 'protein_name', p.protein_name,
+                                'gene_name', p.gene_name))
+FROM temp.semantic_proteins k
+CROSS JOIN protein_interactions i ON i.{own} = k.protein_sk
+CROSS JOIN proteins p ON p.protein_sk = i.{other}
+WHERE i.combined_score > :threshold
+AND i.protein1_sk {loops} i.protein2_sk
+GROUP BY k.protein_sk
+ON CONFLICT (protein_sk) DO UPDATE SET {half} = excluded.{half}
+"""
+
+# Self-interactions are listed once, with the first half
+INTERACTOR_HALVES = [
+    {'half': 'listed_first', 'own': 'protein1_sk', 'other': 'protein2_sk', 'loops': '<='},
+    {'half': 'listed_second', 'own': 'protein2_sk', 'other': 'protein1_sk', 'loops': '<'},
+]
+
+# One row per protein-disease pair: the overall score, taken from the
+# best-scoring target when several map to the same protein
+DISEASES_QUERY = """
+INSERT INTO temp.semantic_diseases (protein_sk, disease_sk, score, datasource_scores)
+SELECT t.protein_sk, s.disease_sk, MAX(s.score), s.datasource_scores
+FROM temp.semantic_proteins k
+CROSS JOIN targets t ON t.protein_sk = k.protein_sk
+CROSS JOIN target_disease_scores s ON s.target_sk = t.target_sk
+GROUP BY t.protein_sk, s.disease_sk
+"""
+
+# Proteins without disease associations still get one row
+NETWORK_QUERY = """
+INSERT INTO protein_disease_network (protein_sk, disease_sk, association_score, datasource_scores)
+SELECT k.protein_sk, d.disease_sk, d.score, d.datasource_scores
+FROM temp.semantic_proteins k
+LEFT JOIN temp.semantic_diseases d ON d.protein_sk = k.protein_sk
+"""
+
+# One interactor list per protein, joining the two halves; proteins without
+# partners get an empty list
+PROTEIN_INTERACTORS_QUERY = """
+INSERT INTO protein_interactors (protein_sk, interacting_proteins)
+SELECT k.protein_sk,
+       '[' || COALESCE(i.listed_first || ',' || i.listed_second, i.listed_first, i.listed_second, '') || ']'
+FROM temp.semantic_proteins k
+LEFT JOIN temp.semantic_interactors i ON i.protein_sk = k.protein_sk
+"""
+
+# Packed format: both directions of each edge above the threshold, then one
+# encoded list per protein (etl/interactors.py)
+EDGES_QUERY = """
+INSERT INTO temp.semantic_edges (protein_sk, neighbor_sk, combined_score)
+SELECT k.protein_sk, i.{other}, i.combined_score
+FROM temp.semantic_proteins k
+CROSS JOIN protein_interactions i ON i.{own} = k.protein_sk
+WHERE i.combined_score > :threshold
+AND i.protein1_sk {loops} i.protein2_sk
+"""
+
+PACKED_INTERACTORS_QUERY = """
+INSERT INTO protein_interactors (protein_sk, packed_interactors)
+SELECT k.protein_sk, pack_interactors(e.neighbor_sk, e.combined_score)
+FROM temp.semantic_proteins k
+LEFT JOIN temp.semantic_edges e ON e.protein_sk = k.protein_sk
+GROUP BY k.protein_sk
+"""
+
+SEMANTIC_TEMP_TABLES = {
+    'semantic_queue': "protein_sk INTEGER PRIMARY KEY",
+    'semantic_proteins': "protein_sk INTEGER PRIMARY KEY",
+    'semantic_interactors': "protein_sk INTEGER PRIMARY KEY, listed_first TEXT, listed_second TEXT",
+    'semantic_edges': """protein_sk INTEGER, neighbor_sk INTEGER, combined_score INTEGER,
+                         PRIMARY KEY (protein_sk, neighbor_sk)""",
+    'semantic_diseases': """protein_sk INTEGER, disease_sk INTEGER, score REAL, datasource_scores TEXT,
+                            PRIMARY KEY (protein_sk, disease_sk)""",
+}
+
+def create_semantic_temp_tables(session):
+    """(Re)create the empty temporary tables the semantic build works in"""
+    for name, columns in SEMANTIC_TEMP_TABLES.items():
+        session.execute(text(f"DROP TABLE IF EXISTS temp.{name}"))
+        session.execute(text(f"CREATE TEMP TABLE {name} ({columns})"))
+
+def _drop_semantic_temp_tables(session):
+    for name in SEMANTIC_TEMP_TABLES:
+        session.execute(text(f"DROP TABLE IF EXISTS temp.{name}"))
+
+def _affected_proteins(session, interactors_format):
     """
-    Build the semantic layer by combining data from the clean tables.
-    Optimized for performance when dealing with large datasets.
+    Collect the dirty proteins and their interaction neighbors into
+    temp.affected_proteins
     
-    Args:
-        session: SQLAlchemy session
+    Returns:
+        Number of affected proteins, or None if a full rebuild is due
     """
-    logger.info("Building semantic layer")
+    if session.query(ProteinDiseaseNetwork).first() is None:
+        logger.info("Semantic layer is empty; rebuilding it in full")
+        return None
     
-    # Clear existing data
-    session.query(ProteinDiseaseNetwork).delete()
-    session.commit()
+    # Every interactor list has to be in one format
+    other_format = ProteinInteractorList.interacting_proteins if interactors_format == 'packed' \
+        else ProteinInteractorList.packed_interactors
+    if session.query(ProteinInteractorList).filter(other_format.isnot(None)).first() is not None:
+        logger.info(f"Interactors switch to the {interactors_format} format; rebuilding the semantic layer in full")
+        return None
+    
+    dirty = session.query(DirtyProtein).count()
+    linked = session.query(Protein).filter(Protein.opentargets_id.isnot(None)).count()
+    if dirty > SEMANTIC_FULL_REBUILD_FRACTION * linked:
+        logger.info(f"{dirty} dirty proteins against {linked} linked ones; rebuilding the semantic layer in full")
+        return None
     
-    # Get all proteins with OpenTargets links
+    # A neighbor's interactor list names the dirty protein
+    session.execute(text("DROP TABLE IF EXISTS temp.affected_proteins"))
+    session.execute(text("CREATE TEMP TABLE affected_proteins (protein_sk INTEGER PRIMARY KEY)"))
+    session.execute(text("""
+    INSERT INTO temp.affected_proteins (protein_sk)
+    SELECT protein_sk FROM dirty_proteins
+    UNION
+    SELECT i.protein2_sk
+    FROM dirty_proteins d
+    CROSS JOIN protein_interactions i ON i.protein1_sk = d.protein_sk
+    WHERE i.combined_score > :threshold
+    UNION
+    SELECT i.protein1_sk
+    FROM dirty_proteins d
+    CROSS JOIN protein_interactions i ON i.protein2_sk = d.protein_sk
+    WHERE i.combined_score > :threshold
+    """), {'threshold': STRING_SCORE_THRESHOLD})
+    
+    affected = session.execute(text("SELECT COUNT(*) FROM temp.affected_proteins")).scalar()
+    logger.info(f"{dirty} proteins changed, {affected} with their neighbors")
+    return affected
+
+def _queue_proteins(session, incremental, interactors_format):
+    """
+    Queue the proteins to build in temp.semantic_queue and delete their old rows
+    
+    Returns:
+        Tuple (number of queued proteins, whether this is a full build)
+    """
+    affected = _affected_proteins(session, interactors_format) if incremental else None
+    
+    # Queue all proteins with OpenTargets links
     logger.info("Gathering proteins with OpenTargets links")
-    protein_query = """
-    SELECT p.accession, p.protein_name, p.gene_name, p.species,
-           p.sequence_length, p.sequence_mass, p.opentargets_id
+    queue_query = """
+    INSERT INTO temp.semantic_queue (protein_sk)
+    SELECT p.protein_sk
     FROM proteins p
     WHERE p.opentargets_id IS NOT NULL
     """
     
-    proteins = session.execute(text(protein_query)).fetchall()
-    logger.info(f"Found {len(proteins)} proteins with OpenTargets links")
+    if affected is None:
+        # Mark every protein dirty until _finish_build, so a full build that
+        # dies partway is redone by the next incremental run
+        mark_all_dirty(session)
+        
+        # Clear existing data
+        session.query(ProteinDiseaseNetwork).delete()
+        session.query(ProteinInteractorList).delete()
+    else:
+        for table in ('protein_disease_network', 'protein_interactors'):
+            session.execute(text(f"""
+            DELETE FROM {table}
+            WHERE protein_sk IN (SELECT protein_sk FROM temp.affected_proteins)
+            """))
+        queue_query += "AND p.protein_sk IN (SELECT protein_sk FROM temp.affected_proteins)"
+    total = session.execute(text(queue_query)).rowcount
+    session.commit()
+    logger.info(f"Found {total} proteins with OpenTargets links")
+    return total, affected is None
+
+def _build_queued(session, total, interactors_format, show_progress=True):
+    """Fill protein_disease_network and protein_interactors for the queued proteins, batch by batch"""
+    if interactors_format == 'packed':
+        register_interactor_functions(dbapi_connection(session))
     
-    # Process proteins in batches
-    batch_size = 100
-    total_proteins = len(proteins)
-    processed = 0
+    batch_query = """
+    INSERT INTO temp.semantic_proteins (protein_sk)
+    SELECT protein_sk FROM temp.semantic_queue
+    WHERE protein_sk > :last
+    ORDER BY protein_sk
+    LIMIT :batch_size
+    """
     
-    for i in range(0, total_proteins, batch_size):
-        batch_proteins = proteins[i:i+batch_size]
-        batch_records = []
-        
-        # Prepare a list of all protein accessions in this batch
-        batch_accessions = [p[0] for p in batch_proteins]
-        accession_list = "', '".join(batch_accessions)
-        
-        # Get disease associations for all proteins in batch
-        if batch_accessions:
-            disease_query = f"""
-            SELECT t.uniprot_accession, d.id, d.name, a.score
-            FROM target_disease_associations a
-            JOIN diseases d ON a.disease_id = d.id
-            JOIN targets t ON a.target_id = t.id
-            WHERE t.uniprot_accession IN ('{accession_list}')
-            """
-            
-            disease_assocs = session.execute(text(disease_query)).fetchall()
+    with tqdm(total=total, desc="Building semantic layer", unit="protein", disable=not show_progress) as progress:
+        last = -1
+        while True:
+            for name in ('semantic_proteins', 'semantic_interactors', 'semantic_edges', 'semantic_diseases'):
+                session.execute(text(f"DELETE FROM temp.{name}"))
             
-            # Group by protein accession
-            disease_map = {}
-            for acc, d_id, d_name, score in disease_assocs:
-                if acc not in disease_map:
-                    disease_map[acc] = []
-                disease_map[acc].append((d_id, d_name, score))
-            
-            # Get interacting proteins for all proteins in batch
-            interact_query = f"""
-            WITH combined_interactions AS (
-                SELECT protein1 as acc1, protein2 as acc2
-                FROM protein_interactions
-                WHERE protein1 IN ('{accession_list}')
-                AND combined_score > {STRING_SCORE_THRESHOLD}
-                UNION
-                SELECT protein2 as acc1, protein1 as acc2
-                FROM protein_interactions
-                WHERE protein2 IN ('{accession_list}')
-                AND combined_score > {STRING_SCORE_THRESHOLD}
-            )
-            SELECT ci.acc1, p.accession, p.protein_name, p.gene_name
-            FROM combined_interactions ci
-            JOIN proteins p ON ci.acc2 = p.accession
-            """
-            
-            interactions = session.execute(text(interact_query)).fetchall()
-            
-            # Group by protein accession
-            interact_map = {}
-            for acc1, acc2, p_name, g_name in interactions:
-                if acc1 not in interact_map:
-                    interact_map[acc1] = []
-                interact_map[acc1].append({
-                    'accession': acc2,
-                    'protein_name': p_name,
-                    'gene_name': g_name
-                })
-        
-        # Process each protein in the batch
-        for protein in batch_proteins:
-            accession, protein_name, gene_name, species, seq_length, seq_mass, opentargets_id = protein
+            params = {'last': last, 'batch_size': SEMANTIC_BATCH_PROTEINS}
+            batch = session.execute(text(batch_query), params).rowcount
+            if not batch:
+                break
+            last = session.execute(text("SELECT MAX(protein_sk) FROM temp.semantic_proteins")).scalar()
             
-            # Get disease associations
-            protein_diseases = disease_map.get(accession, [])
-            
-            # Get interacting proteins
-            protein_interactions = interact_map.get(accession, [])
-            interacting_proteins_json = json.dumps(protein_interactions)
-            
-            # Create records
-            if protein_diseases:
-                for disease_id, disease_name, score in protein_diseases:
-                    network_entry = ProteinDiseaseNetwork(
-                        accession=accession,
-                        protein_name=protein_name,
-                        gene_name=gene_name,
-                        species=species,
-                        sequence_length=seq_length,
-                        sequence_mass=seq_mass,
-                        disease_id=disease_id,
-                        disease_name=disease_name,
-                        association_score=score,
-                        interacting_proteins=interacting_proteins_json
-                    )
-                    batch_records.append(network_entry)
+            if interactors_format == 'packed':
+                for half in INTERACTOR_HALVES:
+                    session.execute(text(EDGES_QUERY.format(**half)), {'threshold': STRING_SCORE_THRESHOLD})
+                session.execute(text(PACKED_INTERACTORS_QUERY))
             else:
-                # No disease associations
-                network_entry = ProteinDiseaseNetwork(
-                    accession=accession,
-                    protein_name=protein_name,
-                    gene_name=gene_name,
-                    species=species,
-                    sequence_length=seq_length,
-                    sequence_mass=seq_mass,
-                    disease_id=None,
-                    disease_name=None,
-                    association_score=None,
-                    interacting_proteins=interacting_proteins_json
-                )
-                batch_records.append(network_entry)
-        
-        # Insert the batch
-        if batch_records:
-            session.add_all(batch_records)
+                for half in INTERACTOR_HALVES:
+                    session.execute(text(INTERACTORS_QUERY.format(**half)), {'threshold': STRING_SCORE_THRESHOLD})
+                session.execute(text(PROTEIN_INTERACTORS_QUERY))
+            session.execute(text(DISEASES_QUERY))
+            session.execute(text(NETWORK_QUERY))
             session.commit()
+            progress.update(batch)
+
+def _finish_build(session):
+    # All changes so far are reflected, including an interrupted full build
+    session.query(DirtyProtein).delete()
+    _drop_semantic_temp_tables(session)
+    session.execute(text("DROP TABLE IF EXISTS temp.affected_proteins"))
+    session.commit()
+
+def _build_network_rows(session, incremental, interactors_format):
+    """Replace the semantic rows of all or of the affected proteins"""
+    create_semantic_temp_tables(session)
+    total, full = _queue_proteins(session, incremental, interactors_format)
+    
+    # Indexes are only worth deferring for a full build
+    with deferred_indexes(session, ProteinDiseaseNetwork) if full else nullcontext():
+        _build_queued(session, total, interactors_format)
+    _finish_build(session)
+
+# Sharded build
+#
+# The queued proteins are split by a hash of their accession. Each worker
+# process opens its own shard database, attaches the main database read-only
+# as `source` and runs the serial batch loop: unqualified clean-layer tables
+# resolve to the source, the output tables to the shard. The shards are then
+# merged into the main database with ATTACH and INSERT ... SELECT.
+SEMANTIC_OUTPUT_COLUMNS = {
+    'protein_disease_network': "protein_sk, disease_sk, association_score, datasource_scores",
+    'protein_interactors': "protein_sk, interacting_proteins, packed_interactors",
+}
+
+def shard_of(accession, shards):
+    """Shard number of a protein, stable across runs and processes"""
+    return zlib.crc32(accession.encode()) % shards
+
+def _shard_connection(db_path, shard_path):
+    # URI filenames let the attached source open read-only
+    connection = sqlite3.connect(shard_path, uri=True)
+    connection.execute("ATTACH DATABASE ? AS source", (f"{Path(db_path).resolve().as_uri()}?mode=ro",))
+    return connection
+
+def _build_shard(task):
+    """
+    Worker: build the semantic rows of one shard of proteins into its own database
+    
+    Args:
+        task: Tuple (db_path, shard_path, protein keys, interactors format)
+    
+    Returns:
+        Number of proteins built
+    """
+    db_path, shard_path, keys, interactors_format = task
+    engine = create_engine("sqlite://", creator=lambda: _shard_connection(db_path, shard_path))
+    session = sessionmaker(bind=engine)()
+    try:
+        for table in (ProteinDiseaseNetwork, ProteinInteractorList):
+            session.execute(CreateTable(table.__table__))
+        with fast_load(session):
+            create_semantic_temp_tables(session)
+            if keys:
+                session.execute(text("INSERT INTO temp.semantic_queue (protein_sk) VALUES (:protein_sk)"),
+                                [{'protein_sk': key} for key in keys])
+            _build_queued(session, len(keys), interactors_format, show_progress=False)
+        return len(keys)
+    finally:
+        session.close()
+        engine.dispose()
+
+def _build_network_rows_sharded(session, incremental, interactors_format, workers, db_path):
+    """Replace the semantic rows of all or of the affected proteins with a process pool"""
+    create_semantic_temp_tables(session)
+    total, full = _queue_proteins(session, incremental, interactors_format)
+    
+    shards = [[] for _ in range(workers)]
+    for protein_sk, accession in session.execute(text("""
+        SELECT q.protein_sk, p.accession
+        FROM temp.semantic_queue q
+        CROSS JOIN proteins p ON p.protein_sk = q.protein_sk
+    """)):
+        shards[shard_of(accession, workers)].append(protein_sk)
+    session.commit()
+    
+    with tempfile.TemporaryDirectory(dir=TEMP_DIR) as shard_dir:
+        tasks = [(db_path, str(Path(shard_dir) / f"shard_{i}.db"), keys, interactors_format)
+                 for i, keys in enumerate(shards)]
+        logger.info(f"Building {total} proteins in {workers} shards")
+        with ProcessPoolExecutor(max_workers=workers) as pool, \
+                tqdm(total=total, desc="Building semantic layer", unit="protein") as progress:
+            for built in pool.map(_build_shard, tasks):
+                progress.update(built)
         
-        processed += len(batch_proteins)
-        logger.info(f"Processed {processed}/{total_proteins} proteins")
+        # Indexes are only worth deferring for a full build
+        with deferred_indexes(session, ProteinDiseaseNetwork) if full else nullcontext():
+            for _, shard_path, _, _ in tasks:
+                # ATTACH can't run inside a transaction
+                session.commit()
+                session.execute(text("ATTACH DATABASE :path AS shard"), {'path': shard_path})
+                for table, columns in SEMANTIC_OUTPUT_COLUMNS.items():
+                    session.execute(text(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM shard.{table}"))
+                session.commit()
+                session.execute(text("DETACH DATABASE shard"))
+    _finish_build(session)
+
+def build_semantic_layer(session, incremental=False, workers=1, interactors_format=SEMANTIC_INTERACTORS_FORMAT):
+    """
+    Build the semantic layer by combining data from the clean tables.
+    
+    Proteins are processed in batches of SEMANTIC_BATCH_PROTEINS keys with
+    a few set-based statements each: one JSON array of interactors per
+    protein into protein_interactors, best disease scores per protein, and
+    one protein_disease_network row per protein-disease pair.
+    
+    Args:
+        session: SQLAlchemy session
+        incremental: Only replace the rows of proteins marked in
+            dirty_proteins and of their interaction neighbors. Falls back
+            to a full rebuild when the semantic layer is empty or more than
+            SEMANTIC_FULL_REBUILD_FRACTION of the proteins changed.
+        workers: Number of shard-building processes; 1 builds in this
+            process. Needs a file database.
+        interactors_format: 'json' for interacting_proteins lists of names,
+            'packed' for packed_interactors blobs (etl/interactors.py)
+    """
+    logger.info("Building semantic layer")
+    
+    db_path = session.get_bind().url.database
+    if workers > 1 and db_path in (None, '', ':memory:'):
+        logger.warning("A sharded build needs a file database; building in this process")
+        workers = 1
+    
+    # temp_store can only change before the build's temp tables exist
+    with fast_load(session):
+        if workers > 1:
+            _build_network_rows_sharded(session, incremental, interactors_format, workers, db_path)
+        else:
+            _build_network_rows(session, incremental, interactors_format)
     
     # Get count of semantic layer records
     count = session.query(ProteinDiseaseNetwork).count()
     logger.info(f"Built semantic layer with {count} protein-disease network entries")
-
+    
     # Display sample records as a table
-    sample_records = session.query(ProteinDiseaseNetwork).limit(5).all()
+    sample_records = session.execute(text("SELECT * FROM v_protein_disease_network LIMIT 5")).fetchall()
     table_data = [
         [
             r.accession,
@@ -166,7 +395,8 @@ def build_semantic_layer(session):
             r.sequence_mass,
             r.disease_name,
             r.association_score,
-            len(json.loads(r.interacting_proteins)) if r.interacting_proteins else 0
+            (len(json.loads(r.interacting_proteins)) if r.interacting_proteins
+             else count_interactors(r.packed_interactors))
         ]
         for r in sample_records
     ]
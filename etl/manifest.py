@@ -0,0 +1,224 @@
+# etl/manifest.py
+"""
+Run manifest: skip extract and transform for sources that have not changed
+
+Each source's input files are fingerprinted by path, size, modification
+time and a content hash, together with the options that shape its staged
+rows. Extract is skipped when the fingerprint matches the one recorded at
+the last successful extract. Transform is skipped unless the source was
+re-extracted since its last transform, or the proteins that its clean
+tables are keyed on were rebuilt.
+"""
+import hashlib
+import json
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from tabulate import tabulate
+
+from models.schema import (
+    RunManifest, StagingUniProt, StagingString, StagingOpenTargetsTarget, StagingOpenTargetsDisease,
+    StagingOpenTargetsAssociation, Protein, ProteinInteraction, Target, Disease,
+    TargetDiseaseAssociation, TargetDiseaseScore
+)
+from config import MANIFEST_SAMPLE_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Staging and clean tables counted for each source
+SOURCE_TABLES = {
+    'uniprot': ([StagingUniProt], [Protein]),
+    'string': ([StagingString], [ProteinInteraction]),
+    'opentargets': (
+        [StagingOpenTargetsTarget, StagingOpenTargetsDisease, StagingOpenTargetsAssociation],
+        [Target, Disease, TargetDiseaseAssociation, TargetDiseaseScore]
+    ),
+}
+
+# Clean tables keyed on proteins must be rebuilt whenever the proteins are
+TRANSFORM_DEPENDS = {'string': ['uniprot'], 'opentargets': ['uniprot']}
+
+def _file_hash(path, sample_bytes):
+    digest = hashlib.blake2b(digest_size=16)
+    size = path.stat().st_size
+    with open(path, 'rb') as f:
+        if sample_bytes is None or size <= 3 * sample_bytes:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        else:
+            for offset in (0, (size - sample_bytes) // 2, size - sample_bytes):
+                f.seek(offset)
+                digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+def fingerprint_files(paths, sample_bytes=MANIFEST_SAMPLE_BYTES):
+    """
+    Describe source files by path, size, modification time and content hash
+    
+    Args:
+        paths: Files, or directories whose files are all included
+        sample_bytes: Bytes hashed from the start, middle and end of each
+            file; None hashes whole files
+    
+    Returns:
+        List of dicts in path order, or None if a path does not exist
+    """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.is_file()))
+        elif path.exists():
+            files.append(path)
+        else:
+            return None
+    
+    entries = []
+    for path in files:
+        stat = path.stat()
+        entries.append({
+            'path': str(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'hash': _file_hash(path, sample_bytes)
+        })
+    return entries
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+def _row_counts(session, models):
+    return {model.__tablename__: session.query(model).count() for model in models}
+
+def _entry(session, source):
+    return session.get(RunManifest, source)
+
+def extract_fingerprint(session, source):
+    """Return the fingerprint recorded at the last extract of a source, or None"""
+    entry = _entry(session, source)
+    return entry.fingerprint if entry else None
+
+def _transform_inputs(session, source, settings):
+    staged = extract_fingerprint(session, source)
+    return _digest(staged, settings) if staged is not None else None
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+@contextmanager
+def _running(session, source, stage):
+    """
+    Mark a stage's record stale while it runs, so an interrupted run is
+    never mistaken for a complete one, and time the stage
+    """
+    entry = _entry(session, source)
+    if entry is None:
+        entry = RunManifest(source=source)
+        session.add(entry)
+    # Re-staged rows make the source's clean tables stale too
+    if stage == 'extract':
+        entry.fingerprint = None
+    entry.transform_fingerprint = None
+    if stage == 'transform':
+        for name, upstream in TRANSFORM_DEPENDS.items():
+            dependent = _entry(session, name) if source in upstream else None
+            if dependent is not None:
+                dependent.transform_fingerprint = None
+    session.commit()
+    
+    timer = {'start': time.perf_counter()}
+    yield timer
+    timer['seconds'] = round(time.perf_counter() - timer['start'], 3)
+
+def extract_source(session, source, paths, extract, settings=None, force=False):
+    """
+    Run a source's extract unless its files and settings are unchanged
+    
+    Args:
+        session: SQLAlchemy session
+        source: 'uniprot', 'string' or 'opentargets'
+        paths: Input files or directories of the source
+        extract: Callable that stages the source
+        settings: JSON-serializable options that shape the staged rows
+        force: Extract even if nothing changed
+    
+    Returns:
+        True if the extract ran, False if it was skipped
+    """
+    files = fingerprint_files(paths)
+    fingerprint = _digest(files, settings) if files is not None else None
+    if not force and fingerprint is not None and fingerprint == extract_fingerprint(session, source):
+        logger.info(f"Skipping {source} extract: sources unchanged since the last run")
+        return False
+    
+    with _running(session, source, 'extract') as timer:
+        extract()
+    
+    entry = _entry(session, source)
+    entry.files = json.dumps(files)
+    entry.settings = json.dumps(settings)
+    entry.fingerprint = fingerprint
+    entry.extract_rows = json.dumps(_row_counts(session, SOURCE_TABLES[source][0]))
+    entry.extract_seconds = timer['seconds']
+    entry.extracted_at = _now()
+    session.commit()
+    return True
+
+def transform_source(session, source, transform, settings=None, force=False):
+    """
+    Run a source's transform unless the clean tables are already up to date
+    
+    Args:
+        session: SQLAlchemy session
+        source: 'uniprot', 'string' or 'opentargets'
+        transform: Callable that builds the source's clean tables
+        settings: JSON-serializable options that shape the clean tables
+        force: Transform even if nothing changed
+    
+    Returns:
+        True if the transform ran, False if it was skipped
+    """
+    inputs = _transform_inputs(session, source, settings)
+    if not force and inputs is not None and _entry(session, source).transform_fingerprint == inputs:
+        logger.info(f"Skipping {source} transform: staged data unchanged since the last run")
+        return False
+    
+    with _running(session, source, 'transform') as timer:
+        transform()
+    
+    entry = _entry(session, source)
+    entry.transform_fingerprint = inputs
+    entry.transform_rows = json.dumps(_row_counts(session, SOURCE_TABLES[source][1]))
+    entry.transform_seconds = timer['seconds']
+    entry.transformed_at = _now()
+    session.commit()
+    return True
+
+def manifest_status(session):
+    """Return the run manifest formatted as a table"""
+    def counts(value):
+        return '\n'.join(f"{table}: {n}" for table, n in json.loads(value).items()) if value else ''
+    
+    rows = []
+    for entry in session.query(RunManifest).order_by(RunManifest.source):
+        files = json.loads(entry.files) if entry.files else []
+        rows.append([
+            entry.source,
+            '\n'.join(f['path'] for f in files[:3]) + (f"\n(+{len(files) - 3} more)" if len(files) > 3 else ''),
+            sum(f['size'] for f in files),
+            (entry.fingerprint or 'stale')[:12],
+            entry.extracted_at,
+            counts(entry.extract_rows),
+            entry.extract_seconds,
+            (entry.transform_fingerprint or 'stale')[:12],
+            entry.transformed_at,
+            counts(entry.transform_rows),
+            entry.transform_seconds,
+        ])
+    headers = [
+        "Source", "Files", "Bytes", "Fingerprint", "Extracted", "Staged Rows", "Extract s",
+        "Transform Inputs", "Transformed", "Clean Rows", "Transform s"
+    ]
+    return tabulate(rows, headers=headers, tablefmt="grid")
@@ -0,0 +1,187 @@
+# etl/sequence_store.py
+"""
+Compressed, chunked store for full amino-acid sequences
+
+A store is a directory holding:
+
+    sequences.bin   zlib-compressed chunks of concatenated sequences
+    chunks.npy      byte offset of every chunk in sequences.bin (plus the end)
+    records.npy     (chunk, start, length) of each sequence, indexed by ref
+    index.npy       (accession, ref) pairs sorted by accession
+
+All files are memory-mapped by the reader, so opening a store is cheap and a
+lookup only decompresses the one chunk that holds the sequence.
+"""
+import mmap
+import os
+import zlib
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from config import SEQUENCE_CHUNK_BYTES
+from etl.utils import save_npy
+
+RECORD_DTYPE = np.dtype([('chunk', '<u4'), ('start', '<u4'), ('length', '<u4')])
+INDEX_DTYPE = np.dtype([('accession', 'S16'), ('ref', '<i8')])
+
+class SequenceStoreWriter:
+    """
+    Append sequences to a store and return their integer references
+
+    Args:
+        path: Store directory
+        append: Keep existing sequences; a re-added accession points at its newest copy
+        chunk_bytes: Uncompressed size at which a chunk is compressed and flushed
+    """
+
+    def __init__(self, path, append=False, chunk_bytes=SEQUENCE_CHUNK_BYTES):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.chunk_bytes = chunk_bytes
+
+        existing = append and (self.path / 'index.npy').exists()
+        if existing:
+            self._chunk_offsets = array('q', np.load(self.path / 'chunks.npy'))
+            self._records = np.load(self.path / 'records.npy')
+            self._old_index = np.load(self.path / 'index.npy')
+            # Drop any bytes past the last recorded chunk, e.g. from an interrupted write
+            with open(self.path / 'sequences.bin', 'r+b') as f:
+                f.truncate(self._chunk_offsets[-1])
+        else:
+            self._chunk_offsets = array('q', [0])
+            self._records = np.empty(0, dtype=RECORD_DTYPE)
+            self._old_index = np.empty(0, dtype=INDEX_DTYPE)
+
+        self._blob = open(self.path / 'sequences.bin', 'ab' if existing else 'wb')
+        self._chunk = bytearray()
+        self._new_chunks = array('I')
+        self._new_starts = array('I')
+        self._new_lengths = array('I')
+        self._new_accessions = []
+
+    def add(self, accession, sequence):
+        """
+        Store one sequence
+
+        Args:
+            accession: UniProt accession
+            sequence: Amino-acid sequence
+
+        Returns:
+            Integer reference for SequenceStore.get_ref
+        """
+        data = sequence.encode('ascii')
+        ref = len(self._records) + len(self._new_accessions)
+
+        self._new_chunks.append(len(self._chunk_offsets) - 1)
+        self._new_starts.append(len(self._chunk))
+        self._new_lengths.append(len(data))
+        self._new_accessions.append(accession.encode('ascii'))
+        self._chunk += data
+
+        if len(self._chunk) >= self.chunk_bytes:
+            self._flush_chunk()
+
+        return ref
+
+    def _flush_chunk(self):
+        if not self._chunk:
+            return
+        self._blob.write(zlib.compress(bytes(self._chunk), 6))
+        self._chunk_offsets.append(self._blob.tell())
+        self._chunk = bytearray()
+
+    def close(self):
+        """Flush the last chunk and write the offset tables and accession index"""
+        self._flush_chunk()
+        self._blob.close()
+
+        new_records = np.empty(len(self._new_accessions), dtype=RECORD_DTYPE)
+        new_records['chunk'] = np.frombuffer(self._new_chunks, dtype='<u4')
+        new_records['start'] = np.frombuffer(self._new_starts, dtype='<u4')
+        new_records['length'] = np.frombuffer(self._new_lengths, dtype='<u4')
+        records = np.concatenate([self._records, new_records])
+
+        new_index = np.empty(len(self._new_accessions), dtype=INDEX_DTYPE)
+        new_index['accession'] = self._new_accessions
+        new_index['ref'] = np.arange(len(self._records), len(records))
+        index = np.concatenate([self._old_index, new_index])
+
+        # Sort by accession then ref and keep the newest ref of each accession
+        order = np.lexsort((index['ref'], index['accession']))
+        index = index[order]
+        keep = np.ones(len(index), dtype=bool)
+        keep[:-1] = index['accession'][1:] != index['accession'][:-1]
+
+        save_npy(self.path / 'chunks.npy', np.frombuffer(self._chunk_offsets, dtype='<i8'))
+        save_npy(self.path / 'records.npy', records)
+        save_npy(self.path / 'index.npy', index[keep])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class SequenceStore:
+    """
+    Read-only, memory-mapped access to a sequence store
+
+    Args:
+        path: Store directory
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._chunk_offsets = np.load(self.path / 'chunks.npy', mmap_mode='r')
+        self._records = np.load(self.path / 'records.npy', mmap_mode='r')
+        self._index = np.load(self.path / 'index.npy', mmap_mode='r')
+        self._accessions = self._index['accession']
+
+        self._file = open(self.path / 'sequences.bin', 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._cached_chunk = (None, b'')
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, accession):
+        return self._find(accession) is not None
+
+    def _find(self, accession):
+        key = accession.encode('ascii')
+        pos = np.searchsorted(self._accessions, key)
+        if pos < len(self._accessions) and self._accessions[pos] == key:
+            return int(self._index['ref'][pos])
+        return None
+
+    def _chunk(self, number):
+        # Sequences are usually read in bursts from the same chunk
+        if self._cached_chunk[0] != number:
+            start, end = self._chunk_offsets[number], self._chunk_offsets[number + 1]
+            self._cached_chunk = (number, zlib.decompress(self._blob[start:end]))
+        return self._cached_chunk[1]
+
+    def get_ref(self, ref):
+        """Return the sequence stored under an integer reference"""
+        chunk, start, length = self._records[ref]
+        return self._chunk(int(chunk))[start:start + length].decode('ascii')
+
+    def get(self, accession):
+        """Return the sequence for an accession, or None if it is not stored"""
+        ref = self._find(accession)
+        return None if ref is None else self.get_ref(ref)
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,186 +1,559 @@
 # etl/transform.py
 import json
 import logging
+import math
+from contextlib import nullcontext
+
+import numpy as np
 from sqlalchemy import text
-from tqdm import tqdm
 
 from models.schema import (
-    Protein, ProteinInteraction, Target, Disease, TargetDiseaseAssociation
+    Protein, ProteinInteraction, Target, Disease, Datasource, TargetDiseaseAssociation, TargetDiseaseScore
 )
-from config import BATCH_SIZE, STRING_SCORE_THRESHOLD
+from config import STRING_SCORE_THRESHOLD, OPENTARGETS_DATASOURCE_WEIGHTS, OPENTARGETS_DEFAULT_WEIGHT
+from etl.bulk import BulkInserter, dbapi_connection
+from etl.changes import untracked
+from etl.indexes import create_indexes, deferred_indexes
+from etl.utils import fetch_column_arrays
 
 logger = logging.getLogger(__name__)
 
-def transform_uniprot_to_proteins(session):
+# Columns copied from staging_uniprot into proteins
+PROTEIN_COLUMNS = (
+    'protein_name', 'gene_name', 'species', 'string_id',
+    'opentargets_id', 'sequence_length', 'sequence_mass'
+)
+
+# Harmonic sum of an unbounded run of perfect scores, used to scale
+# target-disease scores into [0, 1] as OpenTargets does
+HARMONIC_SUM_MAX = math.pi ** 2 / 6
+
+# Map STRING edges to protein keys. Key order can differ from STRING ID
+# order, so each pair is re-ordered and kept once per undirected edge.
+STRING_INTERACTIONS_QUERY = """
+INSERT INTO temp.string_interactions (protein1_sk, protein2_sk, combined_score)
+SELECT MIN(p1.protein_sk, p2.protein_sk), MAX(p1.protein_sk, p2.protein_sk), MAX(s.combined_score)
+FROM staging_string s
+JOIN proteins p1 ON p1.string_id = s.protein1
+JOIN proteins p2 ON p2.string_id = s.protein2
+WHERE s.combined_score > :threshold
+GROUP BY 1, 2
+"""
+
+# One protein per Ensembl gene. When a gene maps to several accessions,
+# SQLite takes protein_sk from the row holding MIN(accession), so the
+# choice does not depend on load order.
+TARGET_PROTEIN_MAP_QUERY = """
+INSERT INTO temp.target_protein_map (opentargets_id, protein_sk, accession, candidates)
+SELECT opentargets_id, protein_sk, MIN(accession), COUNT(*)
+FROM proteins
+WHERE opentargets_id IS NOT NULL
+GROUP BY opentargets_id
+"""
+
+# Link targets to UniProt proteins in one pass over the mapping, touching
+# only the targets whose link changes
+LINK_TARGETS_QUERY = """
+UPDATE targets
+SET protein_sk = m.protein_sk
+FROM temp.target_protein_map m
+WHERE m.opentargets_id = targets.id
+AND targets.protein_sk IS NOT m.protein_sk
+"""
+
+UNLINK_TARGETS_QUERY = """
+UPDATE targets
+SET protein_sk = NULL
+WHERE protein_sk IS NOT NULL
+AND id NOT IN (SELECT opentargets_id FROM temp.target_protein_map)
+"""
+
+# Upsert targets and diseases on their OpenTargets IDs, so their keys are
+# kept across runs. IDs that only appear in associations get bare rows.
+TARGETS_UPSERT_QUERY = """
+INSERT INTO targets (id, approved_symbol, biotype)
+SELECT * FROM (
+    SELECT id, approved_symbol, biotype FROM staging_opentargets_target
+    UNION
+    SELECT DISTINCT target_id, NULL, NULL FROM staging_opentargets_association
+    WHERE target_id IS NOT NULL
+    AND target_id NOT IN (SELECT id FROM staging_opentargets_target)
+) WHERE true
+ON CONFLICT (id) DO UPDATE
+SET approved_symbol = excluded.approved_symbol, biotype = excluded.biotype
+WHERE targets.approved_symbol IS NOT excluded.approved_symbol OR targets.biotype IS NOT excluded.biotype
+"""
+
+DISEASES_UPSERT_QUERY = """
+INSERT INTO diseases (id, name)
+SELECT * FROM (
+    SELECT id, name FROM staging_opentargets_disease
+    UNION
+    SELECT DISTINCT disease_id, NULL FROM staging_opentargets_association
+    WHERE disease_id IS NOT NULL
+    AND disease_id NOT IN (SELECT id FROM staging_opentargets_disease)
+) WHERE true
+ON CONFLICT (id) DO UPDATE
+SET name = excluded.name
+WHERE diseases.name IS NOT excluded.name
+"""
+
+# Store associations against target, disease and datasource keys
+ASSOCIATIONS_QUERY = """
+INSERT INTO target_disease_associations (target_sk, disease_sk, datasource_sk, score)
+SELECT t.target_sk, d.disease_sk, s.datasource_sk, a.score
+FROM staging_opentargets_association a
+JOIN targets t ON t.id = a.target_id
+JOIN diseases d ON d.id = a.disease_id
+LEFT JOIN datasources s ON s.name = a.datasource
+"""
+
+def transform_uniprot_to_proteins(session, incremental=False):
     """
     Transform data from staging_uniprot to proteins table
     
+    Proteins are matched to staging on accession and only the ones that
+    differ are inserted, updated or deleted, so a protein keeps its
+    protein_sk across runs and the tables keyed on it stay valid. An empty
+    table is bulk loaded instead.
+    
     Args:
         session: SQLAlchemy session
+        incremental: Apply the differences even to an empty table, with
+            change tracking, instead of bulk loading it
+    
+    Returns:
+        Dict with inserted, updated and deleted counts, or None after a
+        bulk load
     """
     logger.info("Transforming UniProt data to proteins table")
     
-    # Clear existing data
-    session.query(Protein).delete()
-    session.commit()
-    
-    # Transfer data from staging to clean layer
-    query = """
-    INSERT INTO proteins (accession, protein_name, gene_name, species, string_id, 
-                         opentargets_id, sequence_length, sequence_mass)
-    SELECT accession, protein_name, gene_name, species, string_id, 
-           opentargets_id, sequence_length, sequence_mass
-    FROM staging_uniprot
-    """
+    if incremental or session.query(Protein).first() is not None:
+        return _sync_proteins_with_staging(session)
     
-    session.execute(text(query))
-    session.commit()
+    with untracked(session), deferred_indexes(session, Protein):
+        # Transfer data from staging to clean layer
+        query = """
+        INSERT INTO proteins (accession, protein_name, gene_name, species, string_id, 
+                             opentargets_id, sequence_length, sequence_mass)
+        SELECT accession, protein_name, gene_name, species, string_id, 
+               opentargets_id, sequence_length, sequence_mass
+        FROM staging_uniprot
+        """
+        
+        session.execute(text(query))
+        session.commit()
     
     # Get count of transformed records
     count = session.query(Protein).count()
     logger.info(f"Transformed {count} protein records")
 
+def _sync_proteins_with_staging(session):
+    """Apply the difference between staging_uniprot and proteins with set-based statements"""
+    columns = ', '.join(PROTEIN_COLUMNS)
+    assignments = ', '.join(f"{c} = s.{c}" for c in PROTEIN_COLUMNS)
+    differs = ' OR '.join(f"proteins.{c} IS NOT s.{c}" for c in PROTEIN_COLUMNS)
+    
+    delete_query = """
+    DELETE FROM proteins
+    WHERE NOT EXISTS (
+        SELECT 1 FROM staging_uniprot s WHERE s.accession = proteins.accession
+    )
+    """
+    
+    update_query = f"""
+    UPDATE proteins
+    SET {assignments}
+    FROM staging_uniprot s
+    WHERE s.accession = proteins.accession
+    AND ({differs})
+    """
+    
+    insert_query = f"""
+    INSERT INTO proteins (accession, {columns})
+    SELECT s.accession, {', '.join(f's.{c}' for c in PROTEIN_COLUMNS)}
+    FROM staging_uniprot s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM proteins p WHERE p.accession = s.accession
+    )
+    """
+    
+    counts = {
+        'deleted': session.execute(text(delete_query)).rowcount,
+        'updated': session.execute(text(update_query)).rowcount,
+        'inserted': session.execute(text(insert_query)).rowcount,
+    }
+    if counts['deleted']:
+        # Drop what pointed at withdrawn proteins
+        session.execute(text("""
+        DELETE FROM protein_interactions
+        WHERE protein1_sk NOT IN (SELECT protein_sk FROM proteins)
+        OR protein2_sk NOT IN (SELECT protein_sk FROM proteins)
+        """))
+        session.execute(text("""
+        UPDATE targets SET protein_sk = NULL
+        WHERE protein_sk NOT IN (SELECT protein_sk FROM proteins)
+        """))
+    session.commit()
+    
+    logger.info(f"Synchronised proteins: {counts['inserted']} inserted, {counts['updated']} updated, "
+                f"{counts['deleted']} deleted")
+    return counts
+
 def transform_string_to_interactions(session):
     """
     Transform data from staging_string to protein_interactions table
     
+    STRING IDs are mapped to protein keys with a join inside the database,
+    so memory use does not grow with the number of edges.
+    
     Args:
         session: SQLAlchemy session
+    
+    Returns:
+        Dict with counts of mapped and unmapped STRING edges above the threshold
     """
     logger.info("Transforming STRING data to protein_interactions table")
     
-    # Clear existing data
-    session.query(ProteinInteraction).delete()
-    session.commit()
+    # The join looks proteins up by STRING ID; databases created before the
+    # index was declared get it here
+    create_indexes(session, Protein)
     
-    # Get all protein accessions and their STRING IDs
-    protein_string_ids = dict(session.query(Protein.accession, Protein.string_id)
-                             .filter(Protein.string_id.isnot(None))
-                             .all())
+    count_query = """
+    SELECT COUNT(*),
+           COALESCE(SUM(EXISTS (SELECT 1 FROM proteins p WHERE p.string_id = s.protein1)
+                    AND EXISTS (SELECT 1 FROM proteins p WHERE p.string_id = s.protein2)), 0)
+    FROM staging_string s
+    WHERE s.combined_score > :threshold
+    """
     
-    # Create mapping from STRING ID to UniProt accession
-    string_to_uniprot = {v: k for k, v in protein_string_ids.items() if v}
+    params = {'threshold': STRING_SCORE_THRESHOLD}
+    session.execute(text("DROP TABLE IF EXISTS temp.string_interactions"))
+    session.execute(text("""
+    CREATE TEMP TABLE string_interactions (
+        protein1_sk INTEGER,
+        protein2_sk INTEGER,
+        combined_score INTEGER,
+        PRIMARY KEY (protein1_sk, protein2_sk)
+    )
+    """))
+    count = session.execute(text(STRING_INTERACTIONS_QUERY), params).rowcount
     
-    # Get STRING interactions above threshold
-    interactions_query = f"""
-    SELECT protein1, protein2, combined_score
-    FROM staging_string
-    WHERE combined_score > {STRING_SCORE_THRESHOLD}
+    if session.query(ProteinInteraction).first() is None:
+        with untracked(session), deferred_indexes(session, ProteinInteraction):
+            session.execute(text("""
+            INSERT INTO protein_interactions (protein1_sk, protein2_sk, combined_score)
+            SELECT protein1_sk, protein2_sk, combined_score FROM temp.string_interactions
+            """))
+    else:
+        # Apply only the difference, so change tracking sees the edges that changed
+        _apply_interaction_changes(session)
+    session.execute(text("DROP TABLE temp.string_interactions"))
+    session.commit()
+    
+    total, mapped = session.execute(text(count_query), params).one()
+    
+    counts = {'mapped': mapped, 'unmapped': total - mapped}
+    logger.info(f"Found {total} STRING interactions above threshold: {counts['mapped']} mapped, "
+                f"{counts['unmapped']} unmapped")
+    logger.info(f"Transformed {count} protein interaction records")
+    return counts
+
+def _apply_interaction_changes(session):
+    """Bring protein_interactions in line with temp.string_interactions"""
+    same_pair = """
+        s.protein1_sk = protein_interactions.protein1_sk
+        AND s.protein2_sk = protein_interactions.protein2_sk
     """
     
-    interactions = session.execute(text(interactions_query)).fetchall()
-    logger.info(f"Found {len(interactions)} STRING interactions above threshold")
+    delete_query = f"""
+    DELETE FROM protein_interactions
+    WHERE NOT EXISTS (
+        SELECT 1 FROM temp.string_interactions s WHERE {same_pair}
+    )
+    """
     
-    # Process in batches
-    batch = []
+    update_query = f"""
+    UPDATE protein_interactions
+    SET combined_score = s.combined_score
+    FROM temp.string_interactions s
+    WHERE {same_pair}
+    AND protein_interactions.combined_score IS NOT s.combined_score
+    """
     
-    for protein1, protein2, score in tqdm(interactions, desc="Processing interactions"):
-        # Convert STRING IDs to UniProt accessions
-        uniprot1 = string_to_uniprot.get(protein1)
-        uniprot2 = string_to_uniprot.get(protein2)
-        
-        # Only include interactions where both proteins are in UniProt
-        if uniprot1 and uniprot2:
-            interaction = ProteinInteraction(
-                protein1=uniprot1,
-                protein2=uniprot2,
-                combined_score=score
-            )
-            
-            batch.append(interaction)
-            
-            # Process in batches
-            if len(batch) >= BATCH_SIZE:
-                session.add_all(batch)
-                session.commit()
-                batch = []
-    
-    # Add any remaining records
-    if batch:
-        session.add_all(batch)
-        session.commit()
+    insert_query = """
+    INSERT INTO protein_interactions (protein1_sk, protein2_sk, combined_score)
+    SELECT s.protein1_sk, s.protein2_sk, s.combined_score
+    FROM temp.string_interactions s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM protein_interactions p
+        WHERE p.protein1_sk = s.protein1_sk AND p.protein2_sk = s.protein2_sk
+    )
+    """
     
-    # Get count of transformed records
-    count = session.query(ProteinInteraction).count()
-    logger.info(f"Transformed {count} protein interaction records")
+    deleted = session.execute(text(delete_query)).rowcount
+    updated = session.execute(text(update_query)).rowcount
+    inserted = session.execute(text(insert_query)).rowcount
+    logger.info(f"Applied interaction changes: {inserted} inserted, {updated} updated, {deleted} deleted")
 
 def transform_opentargets_data(session):
     """
     Transform data from OpenTargets staging tables to clean tables
     
+    Targets, diseases and datasources get integer keys, kept across runs by
+    upserting on their OpenTargets IDs, and associations are stored against
+    those keys. Targets and diseases that left staging are deleted.
+    
     Args:
         session: SQLAlchemy session
+    
+    Returns:
+        Dict with the numbers of 'linked' and 'ambiguous' targets
     """
     logger.info("Transforming OpenTargets data")
     
-    # Clear existing data
-    session.query(TargetDiseaseAssociation).delete()
-    session.query(Disease).delete()
-    session.query(Target).delete()
-    session.commit()
+    # Targets and diseases keep their keys, so change tracking only sees the
+    # targets, links and scores that actually changed
+    first_load = session.query(Target).first() is None
     
     # Transform targets
     logger.info("Transforming targets")
     
-    # Copy targets to clean table
-    target_query = """
-    INSERT INTO targets (id, approved_symbol, biotype)
-    SELECT id, approved_symbol, biotype
-    FROM staging_opentargets_target
-    """
-    
-    session.execute(text(target_query))
-    session.commit()
-    
-    # Link targets to UniProt proteins
-    link_query = """
-    UPDATE targets
-    SET uniprot_accession = (
-        SELECT accession
-        FROM proteins
-        WHERE proteins.opentargets_id = targets.id
-    )
-    WHERE EXISTS (
-        SELECT 1
-        FROM proteins
-        WHERE proteins.opentargets_id = targets.id
-    )
-    """
-    
-    session.execute(text(link_query))
-    session.commit()
+    with deferred_indexes(session, Target) if first_load else nullcontext():
+        session.execute(text(TARGETS_UPSERT_QUERY))
+        session.commit()
+        
+        links = link_targets_to_proteins(session)
     
     # Transform diseases
     logger.info("Transforming diseases")
     
-    # Copy diseases to clean table
-    disease_query = """
-    INSERT INTO diseases (id, name)
-    SELECT id, name
-    FROM staging_opentargets_disease
-    """
-    
-    session.execute(text(disease_query))
+    session.execute(text(DISEASES_UPSERT_QUERY))
     session.commit()
     
     # Transform associations
     logger.info("Transforming target-disease associations")
     
-    # Copy associations to clean table
-    assoc_query = """
-    INSERT INTO target_disease_associations (target_id, disease_id, score, datasource)
-    SELECT target_id, disease_id, score, datasource
-    FROM staging_opentargets_association
-    """
+    # Datasource keys are kept across runs
+    session.execute(text("""
+    INSERT OR IGNORE INTO datasources (name)
+    SELECT DISTINCT datasource FROM staging_opentargets_association WHERE datasource IS NOT NULL
+    """))
     
-    session.execute(text(assoc_query))
+    # Associations have no dependents and are reloaded
+    session.query(TargetDiseaseAssociation).delete()
+    session.commit()
+    with deferred_indexes(session, TargetDiseaseAssociation):
+        session.execute(text(ASSOCIATIONS_QUERY))
+        session.commit()
+    
+    # Score before deleting withdrawn targets, so the triggers can still
+    # trace their dropped scores to proteins
+    score_target_disease_associations(session)
+    
+    # Drop targets and diseases no longer in staging
+    session.execute(text("""
+    DELETE FROM targets
+    WHERE id NOT IN (SELECT id FROM staging_opentargets_target)
+    AND id NOT IN (SELECT target_id FROM staging_opentargets_association WHERE target_id IS NOT NULL)
+    """))
+    session.execute(text("""
+    DELETE FROM diseases
+    WHERE id NOT IN (SELECT id FROM staging_opentargets_disease)
+    AND id NOT IN (SELECT disease_id FROM staging_opentargets_association WHERE disease_id IS NOT NULL)
+    """))
     session.commit()
     
     # Get counts of transformed records
     targets_count = session.query(Target).count()
     diseases_count = session.query(Disease).count()
     associations_count = session.query(TargetDiseaseAssociation).count()
-    linked_targets_count = session.query(Target).filter(Target.uniprot_accession.isnot(None)).count()
+    linked_targets_count = session.query(Target).filter(Target.protein_sk.isnot(None)).count()
     
     logger.info(f"Transformed {targets_count} targets ({linked_targets_count} linked to UniProt), "
-               f"{diseases_count} diseases, and {associations_count} associations")
\ No newline at end of file
+               f"{diseases_count} diseases, and {associations_count} associations")
+    
+    return links
+
+def link_targets_to_proteins(session, report_limit=10):
+    """
+    Set targets.protein_sk from the proteins' OpenTargets gene IDs
+    
+    The gene-to-protein mapping is built once into a temporary table and
+    applied with a single UPDATE ... FROM that touches only the targets
+    whose link changes. A gene mapping to several UniProt
+    accessions is linked to the lowest accession and reported.
+    
+    Args:
+        session: SQLAlchemy session
+        report_limit: Number of ambiguous genes to list in the log
+    
+    Returns:
+        Dict with the numbers of 'linked' and 'ambiguous' targets
+    """
+    session.execute(text("DROP TABLE IF EXISTS temp.target_protein_map"))
+    session.execute(text("""
+    CREATE TEMP TABLE target_protein_map (
+        opentargets_id TEXT PRIMARY KEY,
+        protein_sk INTEGER NOT NULL,
+        accession TEXT NOT NULL,
+        candidates INTEGER NOT NULL
+    )
+    """))
+    session.execute(text(TARGET_PROTEIN_MAP_QUERY))
+    # With the map's size known the link scans the map and probes targets
+    # by ID, rather than scanning targets
+    session.execute(text("ANALYZE temp.target_protein_map"))
+    
+    session.execute(text(LINK_TARGETS_QUERY))
+    session.execute(text(UNLINK_TARGETS_QUERY))
+    linked = session.query(Target).filter(Target.protein_sk.isnot(None)).count()
+    
+    ambiguous_query = """
+    SELECT m.opentargets_id, m.accession, group_concat(p.accession, ', ')
+    FROM temp.target_protein_map m
+    JOIN targets t ON t.id = m.opentargets_id
+    JOIN proteins p ON p.opentargets_id = m.opentargets_id
+    WHERE m.candidates > 1
+    GROUP BY m.opentargets_id
+    ORDER BY m.opentargets_id
+    """
+    ambiguous = session.execute(text(ambiguous_query)).fetchall()
+    session.execute(text("DROP TABLE temp.target_protein_map"))
+    session.commit()
+    
+    if ambiguous:
+        logger.warning(f"{len(ambiguous)} targets map to several UniProt accessions; "
+                       f"linked each to the lowest accession")
+        for target_id, accession, accessions in ambiguous[:report_limit]:
+            logger.warning(f"  {target_id} -> {accession} (candidates: {accessions})")
+    
+    logger.info(f"Linked {linked} targets to UniProt proteins")
+    return {'linked': linked, 'ambiguous': len(ambiguous)}
+
+def score_target_disease_associations(session, weights=OPENTARGETS_DATASOURCE_WEIGHTS,
+                                      default_weight=OPENTARGETS_DEFAULT_WEIGHT):
+    """
+    Aggregate datasource-level associations into one score per target-disease pair
+    
+    Follows the OpenTargets harmonic sum: each pair's weighted datasource
+    scores are sorted in descending order, the i-th is divided by i squared,
+    and the sum is scaled by HARMONIC_SUM_MAX. The ranking and sums are done
+    with numpy over the whole table rather than per pair.
+    
+    Args:
+        session: SQLAlchemy session
+        weights: Mapping of datasource ID to weight
+        default_weight: Weight of datasources missing from weights
+    
+    Returns:
+        Number of target-disease pairs scored
+    """
+    logger.info("Scoring target-disease pairs")
+    
+    # One score per datasource, rows grouped by pair; datasource key 0 is unknown
+    query = """
+    SELECT target_sk, disease_sk, COALESCE(datasource_sk, 0), MAX(score)
+    FROM target_disease_associations
+    WHERE score IS NOT NULL
+    GROUP BY target_sk, disease_sk, datasource_sk
+    ORDER BY target_sk, disease_sk
+    """
+    targets, diseases, datasources, scores = fetch_column_arrays(
+        session, query, ['i8', 'i8', 'i8', 'f8']
+    )
+    if not len(scores):
+        session.query(TargetDiseaseScore).delete()
+        session.commit()
+        return 0
+    
+    # Datasource key to name and weight
+    names = np.full(datasources.max() + 1, 'unknown', dtype=object)
+    for datasource_sk, name in session.query(Datasource.datasource_sk, Datasource.name):
+        if datasource_sk < len(names):
+            names[datasource_sk] = name
+    source_weights = np.array([weights.get(name, default_weight) for name in names])
+    weighted = scores * source_weights[datasources]
+    
+    # Number each pair, then sort by descending weighted score within it
+    new_pair = np.ones(len(scores), dtype=bool)
+    new_pair[1:] = (targets[1:] != targets[:-1]) | (diseases[1:] != diseases[:-1])
+    pair = np.cumsum(new_pair) - 1
+    starts = np.flatnonzero(new_pair)
+    
+    order = np.lexsort((-weighted, pair))
+    datasources, scores, weighted = datasources[order], scores[order], weighted[order]
+    rank = np.arange(len(scores)) - starts[pair] + 1
+    overall = np.add.reduceat(weighted / rank ** 2, starts) / HARMONIC_SUM_MAX
+    
+    ends = np.append(starts[1:], len(scores))
+    datasource_names = names[datasources]
+    rows = (
+        (int(targets[start]), int(diseases[start]), float(total),
+         json.dumps(dict(zip(datasource_names[start:end], scores[start:end].tolist()))))
+        for start, end, total in zip(starts, ends, overall)
+    )
+    columns = ['target_sk', 'disease_sk', 'score', 'datasource_scores']
+    
+    if session.query(TargetDiseaseScore).first() is None:
+        with untracked(session), BulkInserter(session, TargetDiseaseScore, columns) as inserter:
+            inserter.insert_many(rows)
+        count = inserter.count
+    else:
+        # Apply only the difference, so change tracking sees the scores that changed
+        count = _apply_score_changes(session, rows)
+    
+    logger.info(f"Scored {count} target-disease pairs from {len(scores)} datasource associations")
+    return count
+
+def _apply_score_changes(session, rows):
+    """
+    Bring target_disease_scores in line with freshly computed scores
+    
+    Returns:
+        Number of scored pairs
+    """
+    session.execute(text("DROP TABLE IF EXISTS temp.scored_pairs"))
+    session.execute(text("""
+    CREATE TEMP TABLE scored_pairs (
+        target_sk INTEGER,
+        disease_sk INTEGER,
+        score REAL,
+        datasource_scores TEXT,
+        PRIMARY KEY (target_sk, disease_sk)
+    )
+    """))
+    cursor = dbapi_connection(session).cursor()
+    cursor.executemany("INSERT INTO temp.scored_pairs VALUES (?, ?, ?, ?)", rows)
+    count = cursor.rowcount
+    
+    same_pair = """
+        s.target_sk = target_disease_scores.target_sk
+        AND s.disease_sk = target_disease_scores.disease_sk
+    """
+    deleted = session.execute(text(f"""
+    DELETE FROM target_disease_scores
+    WHERE NOT EXISTS (SELECT 1 FROM temp.scored_pairs s WHERE {same_pair})
+    """)).rowcount
+    updated = session.execute(text(f"""
+    UPDATE target_disease_scores
+    SET score = s.score, datasource_scores = s.datasource_scores
+    FROM temp.scored_pairs s
+    WHERE {same_pair}
+    AND (target_disease_scores.score IS NOT s.score
+         OR target_disease_scores.datasource_scores IS NOT s.datasource_scores)
+    """)).rowcount
+    inserted = session.execute(text("""
+    INSERT INTO target_disease_scores (target_sk, disease_sk, score, datasource_scores)
+    SELECT s.target_sk, s.disease_sk, s.score, s.datasource_scores
+    FROM temp.scored_pairs s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM target_disease_scores t
+        WHERE t.target_sk = s.target_sk AND t.disease_sk = s.disease_sk
+    )
+    """)).rowcount
+    session.execute(text("DROP TABLE temp.scored_pairs"))
+    session.commit()
+    
+    logger.info(f"Applied score changes: {inserted} inserted, {updated} updated, {deleted} deleted")
+    return count
@@ -1,7 +1,14 @@
 # etl/utils.py
+import gzip
+import io
 import logging
-from sqlalchemy import create_engine
+import os
+from contextlib import contextmanager
+
+import numpy as np
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
+from tqdm import tqdm
 
 from models.schema import init_db
 from config import DB_URI, LOG_DIR
@@ -23,4 +30,76 @@ def get_session():
     """Create and return a database session"""
     engine = init_db(DB_URI)
     Session = sessionmaker(bind=engine)
-    return Session()
\ No newline at end of file
+    return Session()
+
+class _ProgressReader(io.RawIOBase):
+    """Raw reader that reports every byte it reads to a tqdm bar"""
+    
+    def __init__(self, raw, progress):
+        self._raw = raw
+        self._progress = progress
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        n = self._raw.readinto(buffer)
+        if n:
+            self._progress.update(n)
+        return n
+
+@contextmanager
+def open_with_progress(path, desc, mode='rb'):
+    """
+    Open a plain or gzipped file in one pass, with progress in bytes read from disk
+    
+    Progress is measured on the file as stored, so gzipped inputs need no
+    separate pass to count their decompressed size.
+    
+    Args:
+        path: File to open; a '.gz' suffix selects gzip decompression
+        desc: Progress bar description
+        mode: 'rb' for a binary stream or 'rt' for text
+    """
+    size = os.path.getsize(path)
+    
+    with open(path, 'rb', buffering=0) as raw, \
+            tqdm(total=size, unit='B', unit_scale=True, desc=desc) as progress:
+        stream = io.BufferedReader(_ProgressReader(raw, progress), buffer_size=1024 * 1024)
+        
+        if str(path).endswith('.gz'):
+            stream = gzip.GzipFile(fileobj=stream, mode='rb')
+        
+        if 't' in mode:
+            stream = io.TextIOWrapper(stream)
+        
+        yield stream
+
+def save_npy(path, array):
+    """Write an .npy file atomically, so readers never see a partial array"""
+    partial = path.with_name(path.name + '.partial')
+    with open(partial, 'wb') as f:
+        np.save(f, array)
+    os.replace(partial, path)
+
+def fetch_column_arrays(session, query, dtypes, params=None, fetch_rows=100000):
+    """
+    Run a query and return its result as one numpy array per column
+    
+    Args:
+        session: SQLAlchemy session
+        query: SQL text
+        dtypes: numpy dtype of each result column
+        params: Bound parameters for the query
+        fetch_rows: Rows fetched from the cursor at a time
+    """
+    result = session.execute(text(query), params or {})
+    parts = [[] for _ in dtypes]
+    while True:
+        rows = result.fetchmany(fetch_rows)
+        if not rows:
+            break
+        for part, column, dtype in zip(parts, zip(*rows), dtypes):
+            part.append(np.array(column, dtype=dtype))
+    return [np.concatenate(part) if part else np.empty(0, dtype=dtype)
+            for part, dtype in zip(parts, dtypes)]
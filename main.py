@@ -4,22 +4,52 @@ import logging
 import time
 from pathlib import Path
 
-from etl.extract import extract_uniprot_data, extract_string_data, extract_opentargets_data
+from etl.extract import (
+    extract_uniprot_data, extract_uniprot_subset, refresh_uniprot_data,
+    extract_string_data, extract_opentargets_data
+)
 from etl.transform import transform_uniprot_to_proteins, transform_string_to_interactions, transform_opentargets_data
 from etl.load import build_semantic_layer
+from etl.graph import build_interaction_graph
+from etl.export import export_layers
+from etl.manifest import extract_source, transform_source, extract_fingerprint, manifest_status
 from etl.utils import setup_logging, get_session
-from config import DB_URI
+from config import (
+    DB_URI, GRAPH_DIR, UNIPROT_XML_PATH, STRING_DATA_PATH, STRING_KEEP_ALL, STRING_SCORE_THRESHOLD,
+    OPENTARGETS_TARGETS_PATH, OPENTARGETS_DISEASES_PATH, OPENTARGETS_ASSOCIATIONS_PATH,
+    OPENTARGETS_READ_THREADS, OPENTARGETS_MIN_SCORE, OPENTARGETS_DATASOURCES,
+    OPENTARGETS_UNIPROT_TARGETS_ONLY, OPENTARGETS_DATASOURCE_WEIGHTS, OPENTARGETS_DEFAULT_WEIGHT,
+    SEMANTIC_WORKERS
+)
 
 def parse_args():
     parser = argparse.ArgumentParser(description='ETL pipeline for protein data integration')
-    parser.add_argument('--stage', choices=['extract', 'transform', 'load', 'all'], default='all',
-                        help='ETL stage to run (default: all)')
+    parser.add_argument('--stage', choices=['extract', 'transform', 'load', 'export', 'all'], default='all',
+                        help='ETL stage to run; all runs extract, transform and load (default: all)')
     parser.add_argument('--uniprot-only', action='store_true', 
                         help='Process only UniProt data')
     parser.add_argument('--string-only', action='store_true', 
                         help='Process only STRING data')
     parser.add_argument('--opentargets-only', action='store_true', 
                         help='Process only OpenTargets data')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for UniProt extraction (default: 1)')
+    parser.add_argument('--opentargets-threads', type=int, default=OPENTARGETS_READ_THREADS,
+                        help=f'Threads reading OpenTargets parquet files (default: {OPENTARGETS_READ_THREADS})')
+    parser.add_argument('--accessions', type=Path,
+                        help='Re-extract only the UniProt accessions listed in this file (one per line)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only apply UniProt entries that changed since the last run')
+    parser.add_argument('--string-keep-all', action='store_true',
+                        help='Stage STRING interactions at or below the score threshold too')
+    parser.add_argument('--force', action='store_true',
+                        help='Extract and transform even if the sources are unchanged since the last run')
+    parser.add_argument('--semantic-workers', type=int, default=SEMANTIC_WORKERS,
+                        help=f'Processes building shards of the semantic layer (default: {SEMANTIC_WORKERS})')
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help='Rebuild the whole semantic layer instead of only the changed proteins')
+    parser.add_argument('--status', action='store_true',
+                        help='Print the run manifest and exit')
     return parser.parse_args()
 
 def main():
@@ -34,19 +64,49 @@ def main():
     session = get_session()
     
     try:
+        if args.status:
+            print(manifest_status(session))
+            return
+        
         # Extract stage
         if args.stage in ['extract', 'all']:
             logger.info("Starting data extraction")
             start_time = time.time()
             
             if not (args.string_only or args.opentargets_only):
-                extract_uniprot_data(session)
+                if args.accessions:
+                    # Recorded with the accession list, so the next full run re-extracts
+                    accessions = args.accessions.read_text().split()
+                    extract_source(session, 'uniprot', [UNIPROT_XML_PATH, args.accessions],
+                                   lambda: extract_uniprot_subset(session, accessions),
+                                   settings={'subset': True}, force=True)
+                elif args.incremental:
+                    extract_source(session, 'uniprot', [UNIPROT_XML_PATH],
+                                   lambda: refresh_uniprot_data(session, workers=args.workers),
+                                   settings={'subset': False}, force=args.force)
+                else:
+                    extract_source(session, 'uniprot', [UNIPROT_XML_PATH],
+                                   lambda: extract_uniprot_data(session, workers=args.workers),
+                                   settings={'subset': False}, force=args.force)
             
             if not (args.uniprot_only or args.opentargets_only):
-                extract_string_data(session)
+                keep_all = args.string_keep_all or STRING_KEEP_ALL
+                extract_source(session, 'string', [STRING_DATA_PATH],
+                               lambda: extract_string_data(session, keep_all=keep_all),
+                               settings={'keep_all': keep_all, 'threshold': STRING_SCORE_THRESHOLD},
+                               force=args.force)
             
             if not (args.uniprot_only or args.string_only):
-                extract_opentargets_data(session)
+                settings = {
+                    'min_score': OPENTARGETS_MIN_SCORE,
+                    'datasources': OPENTARGETS_DATASOURCES,
+                    # The target filter reads the staged UniProt entries
+                    'uniprot': extract_fingerprint(session, 'uniprot') if OPENTARGETS_UNIPROT_TARGETS_ONLY else None
+                }
+                extract_source(session, 'opentargets',
+                               [OPENTARGETS_TARGETS_PATH, OPENTARGETS_DISEASES_PATH, OPENTARGETS_ASSOCIATIONS_PATH],
+                               lambda: extract_opentargets_data(session, readers=args.opentargets_threads),
+                               settings=settings, force=args.force)
             
             logger.info(f"Data extraction completed in {time.time() - start_time:.2f} seconds")
         
@@ -55,14 +115,30 @@ def main():
             logger.info("Starting data transformation")
             start_time = time.time()
             
+            graph_stale = not (GRAPH_DIR / 'nodes.npy').exists()
+            
             if not (args.string_only or args.opentargets_only):
-                transform_uniprot_to_proteins(session)
+                graph_stale |= transform_source(
+                    session, 'uniprot',
+                    lambda: transform_uniprot_to_proteins(session, incremental=args.incremental),
+                    force=args.force
+                )
             
             if not (args.uniprot_only or args.opentargets_only):
-                transform_string_to_interactions(session)
+                graph_stale |= transform_source(
+                    session, 'string', lambda: transform_string_to_interactions(session),
+                    settings={'threshold': STRING_SCORE_THRESHOLD}, force=args.force
+                )
             
             if not (args.uniprot_only or args.string_only):
-                transform_opentargets_data(session)
+                transform_source(
+                    session, 'opentargets', lambda: transform_opentargets_data(session),
+                    settings={'weights': OPENTARGETS_DATASOURCE_WEIGHTS, 'default_weight': OPENTARGETS_DEFAULT_WEIGHT},
+                    force=args.force
+                )
+            
+            if not args.opentargets_only and (graph_stale or args.force):
+                build_interaction_graph(session)
             
             logger.info(f"Data transformation completed in {time.time() - start_time:.2f} seconds")
         
@@ -71,10 +147,19 @@ def main():
             logger.info("Starting semantic layer build")
             start_time = time.time()
             
-            build_semantic_layer(session)
+            build_semantic_layer(session, incremental=not args.full_rebuild, workers=args.semantic_workers)
             
             logger.info(f"Semantic layer build completed in {time.time() - start_time:.2f} seconds")
         
+        # Export stage, only on request
+        if args.stage == 'export':
+            logger.info("Starting Parquet export")
+            start_time = time.time()
+            
+            export_layers(session)
+            
+            logger.info(f"Parquet export completed in {time.time() - start_time:.2f} seconds")
+        
         logger.info("ETL pipeline completed successfully")
     
     except Exception as e:
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, Table, Text, create_engine
+from sqlalchemy import (
+    DDL, Column, String, Integer, Float, ForeignKey, Index, LargeBinary, Table, Text, UniqueConstraint,
+    create_engine, event
+)
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -15,10 +18,24 @@ class StagingUniProt(Base):
     opentargets_id = Column(String(50))
     sequence_length = Column(Integer)
     sequence_mass = Column(Float)
-    sequence = Column(Text)
+    sequence_ref = Column(Integer)  # Reference into the sequence store (etl/sequence_store.py)
+    sequence_checksum = Column(String(16))  # UniProt CRC64 checksum of the sequence
+    sequence_version = Column(Integer)
+    sequence_modified = Column(String(10))
+    entry_version = Column(Integer)
+    entry_modified = Column(String(10))
+
+class UniProtEntryIndex(Base):
+    __tablename__ = 'uniprot_entry_index'
+    
+    accession = Column(String(20), primary_key=True)
+    offset = Column(Integer)  # Byte offset of <entry> in the uncompressed XML
+    length = Column(Integer)  # Byte length up to and including </entry>
 
 class StagingString(Base):
     __tablename__ = 'staging_string'
+    # Undirected: each pair is stored once with protein1 <= protein2
+    __table_args__ = (UniqueConstraint('protein1', 'protein2'),)
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     protein1 = Column(String(50))
@@ -48,64 +65,208 @@ class StagingOpenTargetsAssociation(Base):
     datasource = Column(String(50))
 
 # Intermediate layer
+#
+# Dimension tables give every protein, target, disease and datasource an
+# integer surrogate key (*_sk). Fact tables hold only those keys, and the
+# views at the end of this module join the identifiers back in. Transforms
+# upsert on the natural identifiers, so a row keeps its key across runs, and
+# keys use AUTOINCREMENT so a withdrawn row's key is never reused.
+#
+# Secondary indexes declared here are dropped and rebuilt around bulk loads
+# by etl.indexes.
 class Protein(Base):
     __tablename__ = 'proteins'
+    __table_args__ = {'sqlite_autoincrement': True}
     
-    accession = Column(String(20), primary_key=True)
+    protein_sk = Column(Integer, primary_key=True)
+    accession = Column(String(20), unique=True, nullable=False)
     protein_name = Column(String(255))
     gene_name = Column(String(50))
     species = Column(String(100))
-    string_id = Column(String(50))
-    opentargets_id = Column(String(50))
+    string_id = Column(String(50), index=True)
+    opentargets_id = Column(String(50), index=True)
     sequence_length = Column(Integer)
     sequence_mass = Column(Float)
 
 class ProteinInteraction(Base):
     __tablename__ = 'protein_interactions'
+    # Undirected: each pair is stored once with protein1_sk <= protein2_sk
+    __table_args__ = (UniqueConstraint('protein1_sk', 'protein2_sk'),)
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    protein1 = Column(String(20), ForeignKey('proteins.accession'))
-    protein2 = Column(String(20), ForeignKey('proteins.accession'))
+    protein1_sk = Column(Integer, ForeignKey('proteins.protein_sk'))
+    # protein1_sk lookups use the unique constraint's index
+    protein2_sk = Column(Integer, ForeignKey('proteins.protein_sk'), index=True)
     combined_score = Column(Integer)
 
 class Target(Base):
     __tablename__ = 'targets'
+    __table_args__ = {'sqlite_autoincrement': True}
     
-    id = Column(String(50), primary_key=True)
+    target_sk = Column(Integer, primary_key=True)
+    id = Column(String(50), unique=True, nullable=False)
     approved_symbol = Column(String(50))
     biotype = Column(String(50))
-    uniprot_accession = Column(String(20), ForeignKey('proteins.accession'), nullable=True)
+    protein_sk = Column(Integer, ForeignKey('proteins.protein_sk'), nullable=True, index=True)
 
 class Disease(Base):
     __tablename__ = 'diseases'
+    __table_args__ = {'sqlite_autoincrement': True}
     
-    id = Column(String(50), primary_key=True)
+    disease_sk = Column(Integer, primary_key=True)
+    id = Column(String(50), unique=True, nullable=False)
     name = Column(String(255))
 
+class Datasource(Base):
+    __tablename__ = 'datasources'
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    datasource_sk = Column(Integer, primary_key=True)
+    name = Column(String(50), unique=True, nullable=False)
+
 class TargetDiseaseAssociation(Base):
     __tablename__ = 'target_disease_associations'
+    # Rows come back grouped by pair and datasource for scoring
+    __table_args__ = (
+        Index('ix_target_disease_associations_pair', 'target_sk', 'disease_sk', 'datasource_sk'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    target_id = Column(String(50), ForeignKey('targets.id'))
-    disease_id = Column(String(50), ForeignKey('diseases.id'))
+    target_sk = Column(Integer, ForeignKey('targets.target_sk'))
+    disease_sk = Column(Integer, ForeignKey('diseases.disease_sk'), index=True)
+    datasource_sk = Column(Integer, ForeignKey('datasources.datasource_sk'))
     score = Column(Float)
-    datasource = Column(String(50))
+
+class TargetDiseaseScore(Base):
+    __tablename__ = 'target_disease_scores'
+    
+    target_sk = Column(Integer, ForeignKey('targets.target_sk'), primary_key=True)
+    disease_sk = Column(Integer, ForeignKey('diseases.disease_sk'), primary_key=True)
+    score = Column(Float)  # Harmonic sum over datasources
+    datasource_scores = Column(Text)  # JSON object of datasource ID to score, strongest first
 
 # Semantic layer
 class ProteinDiseaseNetwork(Base):
     __tablename__ = 'protein_disease_network'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    accession = Column(String(20))
-    protein_name = Column(String(255))
-    gene_name = Column(String(50))
-    species = Column(String(100))
-    sequence_length = Column(Integer)
-    sequence_mass = Column(Float)
-    disease_id = Column(String(50))
-    disease_name = Column(String(255))
+    protein_sk = Column(Integer, ForeignKey('proteins.protein_sk'), index=True)
+    disease_sk = Column(Integer, ForeignKey('diseases.disease_sk'), nullable=True)
     association_score = Column(Float)
+    datasource_scores = Column(Text)  # JSON object of datasource ID to score
+
+# Interactors are stored once per protein rather than on each of its disease
+# rows; v_protein_disease_network joins them back in
+class ProteinInteractorList(Base):
+    __tablename__ = 'protein_interactors'
+    
+    protein_sk = Column(Integer, ForeignKey('proteins.protein_sk'), primary_key=True, autoincrement=False)
     interacting_proteins = Column(Text)  # JSON serialized list of strongly associated proteins
+    packed_interactors = Column(LargeBinary)  # Alternative packed format, see etl/interactors.py
+
+# Proteins whose semantic-layer rows are out of date, filled by the change
+# tracking triggers below and consumed by the incremental semantic build
+class DirtyProtein(Base):
+    __tablename__ = 'dirty_proteins'
+    
+    protein_sk = Column(Integer, primary_key=True, autoincrement=False)
+
+# Pipeline bookkeeping
+class RunManifest(Base):
+    __tablename__ = 'run_manifest'
+    
+    source = Column(String(20), primary_key=True)  # 'uniprot', 'string' or 'opentargets'
+    files = Column(Text)  # JSON list of {path, size, mtime, hash} at the last extract
+    settings = Column(Text)  # JSON of the options that shaped the staged rows
+    fingerprint = Column(String(64))  # Digest of files and settings
+    extract_rows = Column(Text)  # JSON of staging table row counts
+    extract_seconds = Column(Float)
+    extracted_at = Column(String(19))
+    transform_fingerprint = Column(String(64))  # Inputs the clean tables were built from
+    transform_rows = Column(Text)  # JSON of clean table row counts
+    transform_seconds = Column(Float)
+    transformed_at = Column(String(19))
+
+# Views over the surrogate keys, created and dropped with the tables
+VIEWS = {
+    # Both directions of every interaction, for neighbor lookups
+    'protein_neighbor_keys': """
+        SELECT protein1_sk AS protein_sk, protein2_sk AS neighbor_sk, combined_score
+        FROM protein_interactions
+        UNION ALL
+        SELECT protein2_sk, protein1_sk, combined_score
+        FROM protein_interactions WHERE protein2_sk <> protein1_sk
+    """,
+    'protein_neighbors': """
+        SELECT p.accession, q.accession AS neighbor, n.combined_score
+        FROM protein_neighbor_keys n
+        JOIN proteins p ON p.protein_sk = n.protein_sk
+        JOIN proteins q ON q.protein_sk = n.neighbor_sk
+    """,
+    'v_protein_interactions': """
+        SELECT i.id, p1.accession AS protein1, p2.accession AS protein2, i.combined_score
+        FROM protein_interactions i
+        JOIN proteins p1 ON p1.protein_sk = i.protein1_sk
+        JOIN proteins p2 ON p2.protein_sk = i.protein2_sk
+    """,
+    'v_targets': """
+        SELECT t.id, t.approved_symbol, t.biotype, p.accession AS uniprot_accession
+        FROM targets t
+        LEFT JOIN proteins p ON p.protein_sk = t.protein_sk
+    """,
+    'v_target_disease_associations': """
+        SELECT a.id, t.id AS target_id, d.id AS disease_id, a.score, s.name AS datasource
+        FROM target_disease_associations a
+        JOIN targets t ON t.target_sk = a.target_sk
+        JOIN diseases d ON d.disease_sk = a.disease_sk
+        LEFT JOIN datasources s ON s.datasource_sk = a.datasource_sk
+    """,
+    'v_target_disease_scores': """
+        SELECT t.id AS target_id, d.id AS disease_id, s.score, s.datasource_scores
+        FROM target_disease_scores s
+        JOIN targets t ON t.target_sk = s.target_sk
+        JOIN diseases d ON d.disease_sk = s.disease_sk
+    """,
+    'v_protein_disease_network': """
+        SELECT n.id, p.accession, p.protein_name, p.gene_name, p.species,
+               p.sequence_length, p.sequence_mass, d.id AS disease_id, d.name AS disease_name,
+               n.association_score, n.datasource_scores, i.interacting_proteins, i.packed_interactors
+        FROM protein_disease_network n
+        JOIN proteins p ON p.protein_sk = n.protein_sk
+        LEFT JOIN diseases d ON d.disease_sk = n.disease_sk
+        LEFT JOIN protein_interactors i ON i.protein_sk = n.protein_sk
+    """,
+}
+
+def _track(table, keys):
+    """Triggers adding the protein keys selected by `keys` to dirty_proteins on any change to a table"""
+    triggers = {}
+    for action, rows in (('insert', ['NEW']), ('update', ['OLD', 'NEW']), ('delete', ['OLD'])):
+        selected = ' UNION '.join(keys.format(row=row) for row in rows)
+        triggers[f'track_{table}_{action}'] = f"""
+            AFTER {action.upper()} ON {table} BEGIN
+                INSERT OR IGNORE INTO dirty_proteins (protein_sk)
+                SELECT protein_sk FROM ({selected}) WHERE protein_sk IS NOT NULL;
+            END
+        """
+    return triggers
+
+# Change tracking on the clean layer: a protein is dirty when its own row,
+# its interactions, its target link or its target's disease scores change.
+# etl.changes suspends these around bulk loads into empty tables.
+TRIGGERS = {
+    **_track('proteins', "SELECT {row}.protein_sk AS protein_sk"),
+    **_track('protein_interactions', "SELECT {row}.protein1_sk AS protein_sk UNION SELECT {row}.protein2_sk"),
+    **_track('targets', "SELECT {row}.protein_sk AS protein_sk"),
+    **_track('target_disease_scores', "SELECT protein_sk FROM targets WHERE target_sk = {row}.target_sk"),
+}
+
+for name, query in VIEWS.items():
+    event.listen(Base.metadata, 'after_create', DDL(f"CREATE VIEW IF NOT EXISTS {name} AS {query}"))
+for name in reversed(VIEWS):
+    event.listen(Base.metadata, 'before_drop', DDL(f"DROP VIEW IF EXISTS {name}"))
+for name, body in TRIGGERS.items():
+    event.listen(Base.metadata, 'after_create', DDL(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
 
 def init_db(db_uri):
     """Initialize the database with the schema"""
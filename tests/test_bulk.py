@@ -0,0 +1,71 @@
+# tests/test_bulk.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import Base, StagingString, StagingUniProt
+from etl.bulk import BulkInserter, fast_load
+
+@pytest.fixture
+def db_session(tmp_path):
+    # File-backed so journal_mode and synchronous behave as in production
+    engine = create_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    
+    yield session
+    
+    session.close()
+    engine.dispose()
+
+def _pragma(session, name):
+    return session.execute(text(f"PRAGMA {name}")).scalar()
+
+def test_fast_load_restores_settings(db_session):
+    before = {name: _pragma(db_session, name) for name in ('journal_mode', 'synchronous', 'cache_size', 'temp_store')}
+    
+    with fast_load(db_session):
+        assert _pragma(db_session, 'journal_mode') == 'memory'
+        assert _pragma(db_session, 'synchronous') == 0
+    
+    assert {name: _pragma(db_session, name) for name in before} == before
+
+def test_bulk_inserter_commits_in_large_transactions(db_session):
+    rows = [(f"9606.ENSP{i:011d}", "9606.ENSP00000000001", i) for i in range(2500)]
+    
+    with BulkInserter(db_session, StagingString, ('protein1', 'protein2', 'combined_score'),
+                      commit_rows=1000) as inserter:
+        inserter.insert_many(rows[:1500])
+        inserter.insert_many(rows[1500:])
+    
+    assert inserter.count == 2500
+    assert db_session.query(StagingString).count() == 2500
+    assert db_session.query(StagingString).filter(StagingString.combined_score == 2499).one().protein1 == rows[-1][0]
+
+def test_bulk_inserter_conflicts_and_rollback(db_session):
+    columns = ('accession', 'protein_name')
+    
+    with BulkInserter(db_session, StagingUniProt, columns) as inserter:
+        inserter.insert_many([('P12345', 'Old name')])
+    
+    with BulkInserter(db_session, StagingUniProt, columns, on_conflict='REPLACE') as inserter:
+        inserter.insert_many([('P12345', 'New name'), ('P67890', 'Other')])
+    
+    assert db_session.get(StagingUniProt, 'P12345').protein_name == 'New name'
+    
+    with BulkInserter(db_session, StagingUniProt, columns, on_conflict='IGNORE') as inserter:
+        inserter.insert_many([('P12345', 'Ignored'), ('P67890', 'Ignored')])
+    
+    assert inserter.count == 0
+    db_session.expire_all()
+    assert db_session.get(StagingUniProt, 'P12345').protein_name == 'New name'
+    
+    # A failed insert discards only the uncommitted rows
+    with pytest.raises(Exception):
+        with BulkInserter(db_session, StagingUniProt, columns) as inserter:
+            inserter.insert_many([('Q11111', 'Pending')])
+            inserter.insert_many([('P12345', 'Duplicate')])
+    
+    assert inserter.count == 0
+    assert db_session.query(StagingUniProt).count() == 2
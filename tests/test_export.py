@@ -0,0 +1,104 @@
+# tests/test_export.py
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import (
+    Base, Protein, ProteinInteraction, Target, Disease, TargetDiseaseScore
+)
+from etl.export import export_table, export_layers, partition_dir, EXPORTS
+from etl.load import build_semantic_layer
+
+@pytest.fixture
+def db_session():
+    # Create in-memory database
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    
+    # Human proteins inserted out of accession order, and a mouse protein
+    proteins = [
+        Protein(protein_sk=1, accession='P3', protein_name='Protein 3', species='Homo sapiens',
+                opentargets_id='ENSG3', sequence_length=300),
+        Protein(protein_sk=2, accession='P1', protein_name='Protein 1', species='Homo sapiens',
+                opentargets_id='ENSG1', sequence_length=100),
+        Protein(protein_sk=3, accession='P2', protein_name='Protein 2', species='Homo sapiens',
+                opentargets_id='ENSG2', sequence_length=200),
+        Protein(protein_sk=4, accession='Q1', protein_name='Mouse Protein', species='Mus musculus',
+                opentargets_id='ENSMUSG1'),
+    ]
+    session.add_all(proteins + [
+        ProteinInteraction(protein1_sk=1, protein2_sk=2, combined_score=900),
+        ProteinInteraction(protein1_sk=2, protein2_sk=4, combined_score=400),
+        Target(target_sk=1, id='ENSG1', protein_sk=2),
+        Target(target_sk=2, id='ENSG9'),
+        Disease(disease_sk=1, id='EFO:1', name='Disease 1'),
+        Disease(disease_sk=2, id='EFO:2', name='Disease 2'),
+        TargetDiseaseScore(target_sk=1, disease_sk=2, score=0.4, datasource_scores='{}'),
+        TargetDiseaseScore(target_sk=1, disease_sk=1, score=0.6, datasource_scores='{}'),
+        TargetDiseaseScore(target_sk=2, disease_sk=1, score=0.2, datasource_scores='{}'),
+    ])
+    session.commit()
+    
+    yield session
+    
+    # Clean up
+    session.close()
+    Base.metadata.drop_all(engine)
+
+def test_export_layers(db_session, tmp_path):
+    build_semantic_layer(db_session)
+    
+    counts = export_layers(db_session, output_dir=tmp_path)
+    assert counts == {
+        'protein_disease_network': 5,
+        'proteins': 4,
+        'protein_interactions': 4,
+        'target_disease_scores': 3,
+    }
+    
+    for name in EXPORTS:
+        assert (tmp_path / name).is_dir()
+        assert not (tmp_path / f'{name}.partial').exists()
+    
+    network = ds.dataset(tmp_path / 'protein_disease_network', partitioning='hive').to_table().to_pylist()
+    assert {row['species'] for row in network} == {'Homo sapiens', 'Mus musculus'}
+    human = [row for row in network if row['species'] == 'Homo sapiens']
+    assert [(row['accession'], row['disease_id']) for row in human] == [
+        ('P1', 'EFO:1'), ('P1', 'EFO:2'), ('P2', None), ('P3', None)
+    ]
+    assert 'Q1' in human[0]['interacting_proteins']
+    
+    # The unlinked target lands in the null partition
+    scores = ds.dataset(tmp_path / 'target_disease_scores', partitioning='hive')
+    unlinked = scores.to_table(filter=ds.field('species').is_null()).to_pylist()
+    assert [row['target_id'] for row in unlinked] == ['ENSG9']
+
+def test_export_table_row_groups(db_session, tmp_path):
+    # One row per fetched chunk and two rows per row group
+    assert export_table(db_session, 'proteins', tmp_path, chunk_rows=1, row_group_rows=2) == 4
+    
+    path = tmp_path / 'proteins' / partition_dir('Homo sapiens') / 'part-0.parquet'
+    metadata = pq.ParquetFile(path).metadata
+    assert metadata.num_row_groups == 2
+    
+    # Row groups are sorted by accession, with statistics and dictionary-encoded strings
+    accession = metadata.schema.names.index('accession')
+    bounds = [(metadata.row_group(i).column(accession).statistics.min,
+               metadata.row_group(i).column(accession).statistics.max) for i in range(2)]
+    assert bounds == [('P1', 'P2'), ('P3', 'P3')]
+    assert any('DICTIONARY' in encoding for encoding in metadata.row_group(0).column(accession).encodings)
+    
+    # Readers can filter on both the partition and the sorted column
+    dataset = ds.dataset(tmp_path / 'proteins', partitioning='hive')
+    table = dataset.to_table(filter=(ds.field('species') == 'Homo sapiens') & (ds.field('accession') > 'P2'))
+    assert table.column('accession').to_pylist() == ['P3']
+    
+    # A second export replaces the first
+    db_session.query(Protein).filter_by(accession='Q1').delete()
+    db_session.commit()
+    assert export_table(db_session, 'proteins', tmp_path) == 3
+    assert not (tmp_path / 'proteins' / partition_dir('Mus musculus')).exists()
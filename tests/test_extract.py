@@ -1,13 +1,23 @@
 # tests/test_extract.py
+import gzip
 import os
+import pandas as pd
 import pytest
 import tempfile
 from lxml import etree
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from models.schema import Base, StagingUniProt, StagingString, StagingOpenTargetsTarget
-from etl.extract import extract_uniprot_data, extract_string_data
+from models.schema import (
+    Base, StagingUniProt, UniProtEntryIndex, StagingString, StagingOpenTargetsTarget,
+    StagingOpenTargetsDisease, StagingOpenTargetsAssociation
+)
+from etl.extract import (
+    extract_uniprot_data, extract_string_data, decode_uniprot_entry, find_uniprot_entry_ranges,
+    build_uniprot_index, fetch_uniprot_entries, extract_uniprot_subset, refresh_uniprot_data,
+    extract_opentargets_data, _stage_parquet_sources, ParquetSource, UNIPROT_FIELDS
+)
+from etl.sequence_store import SequenceStore
 
 SAMPLE_UNIPROT_XML = """<?xml version="1.0" encoding="UTF-8"?>
 <uniprot xmlns="https://uniprot.org/uniprot" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://uniprot.org/uniprot http://www.uniprot.org/docs/uniprot.xsd">
@@ -81,7 +91,11 @@ def db_session():
     session.close()
     Base.metadata.drop_all(engine)
 
-def test_extract_uniprot_data(db_session):
+@pytest.fixture
+def sequence_dir(tmp_path):
+    return tmp_path / 'sequences'
+
+def test_extract_uniprot_data(db_session, sequence_dir):
     # Create temporary file with sample data
     with tempfile.NamedTemporaryFile(mode='w+', delete=False) as f:
         f.write(SAMPLE_UNIPROT_XML)
@@ -89,7 +103,7 @@ def test_extract_uniprot_data(db_session):
     
     try:
         # Extract data
-        extract_uniprot_data(db_session, temp_file)
+        extract_uniprot_data(db_session, temp_file, sequence_store_dir=sequence_dir)
         
         # Verify results
         results = db_session.query(StagingUniProt).all()
@@ -105,6 +119,12 @@ def test_extract_uniprot_data(db_session):
         assert protein.opentargets_id == 'ENSG00000123456'
         assert protein.sequence_length == 100
         assert protein.sequence_mass == 12345
+        assert protein.sequence_checksum == 'ABCDEF1234567890'
+        
+        # The sequence itself lives in the sequence store
+        with SequenceStore(sequence_dir) as store:
+            assert store.get('P12345') == 'ABCDEFGHIJ' * 10
+            assert store.get_ref(protein.sequence_ref) == 'ABCDEFGHIJ' * 10
     
     finally:
         # Clean up
@@ -117,8 +137,8 @@ def test_extract_string_data(db_session):
         temp_file = f.name
     
     try:
-        # Extract data
-        extract_string_data(db_session, temp_file)
+        # Extract data, keeping rows below the score threshold
+        extract_string_data(db_session, temp_file, keep_all=True)
         
         # Verify results
         results = db_session.query(StagingString).all()
@@ -135,4 +155,317 @@ def test_extract_string_data(db_session):
     
     finally:
         # Clean up
-        os.unlink(temp_file)
\ No newline at end of file
+        os.unlink(temp_file)
+
+def test_decode_uniprot_entry_fallbacks():
+    entry = etree.fromstring("""
+    <entry xmlns="https://uniprot.org/uniprot">
+      <accession>Q99999</accession>
+      <accession>Q88888</accession>
+      <gene>
+        <name type="synonym">SYN1</name>
+        <name type="ordered locus">LOC1</name>
+      </gene>
+      <organism>
+        <name type="scientific">Mus musculus</name>
+      </organism>
+      <sequence length="3" mass="300">MKV</sequence>
+    </entry>
+    """)
+    
+    row = dict(zip(UNIPROT_FIELDS, decode_uniprot_entry(entry)))
+    
+    assert row['accession'] == 'Q99999'
+    assert row['protein_name'] is None
+    assert row['gene_name'] == 'LOC1'
+    assert row['species'] == 'Mus musculus'
+    assert row['string_id'] is None
+    assert row['sequence_length'] == 3
+    assert row['sequence_mass'] == 300
+    assert row['sequence'] == 'MKV'
+
+def test_decode_uniprot_entry_requires_accession():
+    entry = etree.fromstring('<entry xmlns="https://uniprot.org/uniprot"><name>X</name></entry>')
+    
+    with pytest.raises(ValueError):
+        decode_uniprot_entry(entry)
+
+def _uniprot_xml(accessions, changed=()):
+    # Repeat the sample entry under the given accessions; changed ones get a new version and name
+    head, rest = SAMPLE_UNIPROT_XML.split('  <entry', 1)
+    entry, tail = rest.split('</entry>\n', 1)
+    entries = []
+    for accession in accessions:
+        text = '  <entry' + entry.replace('P12345', accession) + '</entry>\n'
+        if accession in changed:
+            text = text.replace('version="1">', 'version="2">', 1).replace('Test Protein', 'Test Protein v2')
+        entries.append(text)
+    return head + ''.join(entries) + tail
+
+def _multi_entry_xml(n):
+    return _uniprot_xml([f'P{i:05d}' for i in range(n)])
+
+def _staged_rows(session):
+    columns = StagingUniProt.__table__.columns.keys()
+    return [
+        tuple(getattr(r, column) for column in columns)
+        for r in session.query(StagingUniProt).order_by(StagingUniProt.accession)
+    ]
+
+def test_extract_uniprot_data_parallel_matches_serial(db_session, tmp_path, sequence_dir):
+    xml_file = tmp_path / 'uniprot.xml'
+    xml_file.write_text(_multi_entry_xml(25))
+    
+    extract_uniprot_data(db_session, xml_file, sequence_store_dir=sequence_dir)
+    serial = _staged_rows(db_session)
+    
+    # Small chunks force several ranges per worker
+    extract_uniprot_data(db_session, xml_file, workers=2, chunk_bytes=4096, sequence_store_dir=sequence_dir)
+    
+    assert len(serial) == 25
+    assert _staged_rows(db_session) == serial
+
+def test_extract_uniprot_data_parallel_gzip(db_session, tmp_path, sequence_dir, monkeypatch):
+    monkeypatch.setattr('etl.extract.TEMP_DIR', tmp_path)
+    gz_file = tmp_path / 'uniprot.xml.gz'
+    with gzip.open(gz_file, 'wt') as f:
+        f.write(_multi_entry_xml(5))
+    
+    extract_uniprot_data(db_session, gz_file, workers=2, chunk_bytes=1024, sequence_store_dir=sequence_dir)
+    
+    assert [row[0] for row in _staged_rows(db_session)] == [f'P{i:05d}' for i in range(5)]
+    assert (tmp_path / 'uniprot.xml').exists()
+
+def test_find_uniprot_entry_ranges_cover_whole_entries(tmp_path):
+    xml_file = tmp_path / 'uniprot.xml'
+    xml_file.write_text(_multi_entry_xml(10))
+    data = xml_file.read_bytes()
+    
+    header, footer, ranges = find_uniprot_entry_ranges(xml_file, chunk_bytes=2048)
+    
+    assert len(ranges) > 1
+    assert header + b''.join(data[start:end] for start, end in ranges) + footer == data
+    assert all(data[start:start + 6] == b'<entry' for start, _ in ranges)
+    assert all(data[:end].rstrip().endswith(b'</entry>') for _, end in ranges)
+
+def test_build_uniprot_index_and_fetch(db_session, tmp_path):
+    xml_file = tmp_path / 'uniprot.xml'
+    xml_file.write_text(_multi_entry_xml(10))
+    data = xml_file.read_bytes()
+    
+    assert build_uniprot_index(db_session, xml_file) == 10
+    
+    entry = db_session.query(UniProtEntryIndex).filter(UniProtEntryIndex.accession == 'P00003').one()
+    fragment = data[entry.offset:entry.offset + entry.length]
+    assert fragment.startswith(b'<entry') and fragment.endswith(b'</entry>')
+    assert b'<accession>P00003</accession>' in fragment
+    
+    rows = fetch_uniprot_entries(db_session, ['P00007', 'P00003', 'MISSING'], xml_file)
+    
+    assert [row[0] for row in rows] == ['P00003', 'P00007']
+    assert rows[0][UNIPROT_FIELDS.index('protein_name')] == 'Test Protein'
+
+def test_extract_uniprot_subset_refreshes_staged_rows(db_session, tmp_path, sequence_dir):
+    xml_file = tmp_path / 'uniprot.xml'
+    xml_file.write_text(_multi_entry_xml(10))
+    extract_uniprot_data(db_session, xml_file, sequence_store_dir=sequence_dir)
+    
+    stale = db_session.get(StagingUniProt, 'P00004')
+    stale.protein_name = 'Outdated'
+    db_session.commit()
+    
+    assert extract_uniprot_subset(db_session, ['P00004'], xml_file, sequence_store_dir=sequence_dir) == 1
+    assert db_session.get(StagingUniProt, 'P00004').protein_name == 'Test Protein'
+    
+    # Entries that moved since the index was built trigger a rebuild
+    xml_file.write_text(_multi_entry_xml(12).replace('<name>TEST_HUMAN', '<name>TEST_HUMAN_V2'))
+    assert extract_uniprot_subset(db_session, ['P00004'], xml_file, sequence_store_dir=sequence_dir) == 1
+    assert db_session.query(UniProtEntryIndex).count() == 12
+
+def test_extract_uniprot_subset_skips_corrupt_entries(db_session, tmp_path, sequence_dir, caplog):
+    xml_file = tmp_path / 'uniprot.xml'
+    xml = _multi_entry_xml(6)
+    # P00002 is well-formed but undecodable; P00004 is not well-formed XML
+    xml = xml.replace('<accession>P00002</accession>', '<accession>P00002</accession><sequence length="x"/>')
+    xml = xml.replace('<accession>P00004</accession>', '<accession>P00004</accession><name>')
+    xml_file.write_text(xml)
+    build_uniprot_index(db_session, xml_file)
+    
+    with caplog.at_level('WARNING', logger='etl.extract'):
+        staged = extract_uniprot_subset(db_session, ['P00001', 'P00002', 'P00004', 'P00005'], xml_file,
+                                        sequence_store_dir=sequence_dir)
+    
+    assert staged == 2
+    assert [row[0] for row in _staged_rows(db_session)] == ['P00001', 'P00005']
+    assert 'Could not decode 2 UniProt entries: P00002, P00004' in caplog.text
+    assert 'rebuilding' not in caplog.text
+
+def test_refresh_uniprot_data_touches_only_changed_entries(db_session, tmp_path, sequence_dir):
+    xml_file = tmp_path / 'uniprot.xml'
+    xml_file.write_text(_multi_entry_xml(10))
+    extract_uniprot_data(db_session, xml_file, sequence_store_dir=sequence_dir)
+    unchanged_ref = db_session.get(StagingUniProt, 'P00001').sequence_ref
+    
+    # Next release: P00002 revised, P00009 withdrawn, P00010 added
+    release = [f'P{i:05d}' for i in range(9)] + ['P00010']
+    xml_file.write_text(_uniprot_xml(release, changed={'P00002'}))
+    
+    counts = refresh_uniprot_data(db_session, xml_file, sequence_store_dir=sequence_dir)
+    
+    assert counts == {'inserted': 1, 'updated': 1, 'deleted': 1, 'unchanged': 8}
+    assert sorted(r.accession for r in db_session.query(StagingUniProt)) == sorted(release)
+    
+    revised = db_session.get(StagingUniProt, 'P00002')
+    assert revised.protein_name == 'Test Protein v2'
+    assert revised.entry_version == 2
+    assert db_session.get(StagingUniProt, 'P00001').sequence_ref == unchanged_ref
+    
+    with SequenceStore(sequence_dir) as store:
+        assert store.get('P00010') == 'ABCDEFGHIJ' * 10
+    
+    # A second pass over the same release is a no-op
+    counts = refresh_uniprot_data(db_session, xml_file, sequence_store_dir=sequence_dir)
+    assert counts == {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 10}
+
+def test_extract_string_data_filters_on_threshold(db_session, tmp_path):
+    gz_file = tmp_path / 'links.txt.gz'
+    with gzip.open(gz_file, 'wt') as f:
+        f.write(SAMPLE_STRING_DATA + "9606.ENSP00000999999 malformed\n")
+    
+    extract_string_data(db_session, gz_file)
+    
+    # The 150 score row is dropped while reading and the malformed line skipped
+    results = db_session.query(StagingString).all()
+    assert [(r.protein2, r.combined_score) for r in results] == [('9606.ENSP00000789012', 900)]
+
+def test_extract_string_data_stores_each_pair_once(db_session, tmp_path):
+    links = tmp_path / 'links.txt'
+    links.write_text(
+        "protein1 protein2 combined_score\n"
+        "9606.ENSP00000789012 9606.ENSP00000123456 900\n"
+        "9606.ENSP00000123456 9606.ENSP00000789012 900\n"
+        "9606.ENSP00000345678 9606.ENSP00000123456 400\n"
+    )
+    
+    extract_string_data(db_session, links)
+    
+    results = db_session.query(StagingString).order_by(StagingString.combined_score).all()
+    assert [(r.protein1, r.protein2, r.combined_score) for r in results] == [
+        ('9606.ENSP00000123456', '9606.ENSP00000345678', 400),
+        ('9606.ENSP00000123456', '9606.ENSP00000789012', 900),
+    ]
+
+def test_extract_string_data_replaces_previous_extract(db_session, tmp_path):
+    links = tmp_path / 'links.txt'
+    links.write_text("protein1 protein2 combined_score\n9606.ENSP00000123456 9606.ENSP00000789012 900\n")
+    extract_string_data(db_session, links)
+    
+    links.write_text("protein1 protein2 combined_score\n9606.ENSP00000123456 9606.ENSP00000789012 300\n")
+    extract_string_data(db_session, links)
+    
+    assert [r.combined_score for r in db_session.query(StagingString)] == [300]
+
+def test_extract_opentargets_data(db_session, tmp_path):
+    for name in ('target', 'disease', 'association'):
+        (tmp_path / name).mkdir()
+    
+    pd.DataFrame({
+        'id': ['ENSG00000123456', 'ENSG00000789012'],
+        'approvedSymbol': ['TEST1', 'TEST2'],
+        'biotype': ['protein_coding', None],
+        'unused': [1, 2]
+    }).to_parquet(tmp_path / 'target' / 'part-0.parquet')
+    pd.DataFrame({'id': ['EFO:0000001'], 'name': ['Test Disease 1']}).to_parquet(
+        tmp_path / 'disease' / 'part-0.parquet'
+    )
+    pd.DataFrame({
+        'targetId': ['ENSG00000123456', 'ENSG00000789012'],
+        'diseaseId': ['EFO:0000001', 'EFO:0000001'],
+        'score': [0.8, float('nan')],
+        'datasourceId': ['chembl', 'europepmc'],
+        'evidenceCount': [3, 1]
+    }).to_parquet(tmp_path / 'association' / 'part-0.parquet')
+    
+    extract_opentargets_data(db_session, tmp_path / 'target', tmp_path / 'disease', tmp_path / 'association')
+    
+    targets = {t.id: t for t in db_session.query(StagingOpenTargetsTarget)}
+    assert targets['ENSG00000123456'].approved_symbol == 'TEST1'
+    assert targets['ENSG00000789012'].biotype is None
+    assert db_session.query(StagingOpenTargetsDisease).one().name == 'Test Disease 1'
+    
+    associations = {a.target_id: a for a in db_session.query(StagingOpenTargetsAssociation)}
+    assert associations['ENSG00000123456'].score == 0.8
+    assert associations['ENSG00000123456'].datasource == 'chembl'
+    assert associations['ENSG00000789012'].score is None
+
+TARGET_COLUMNS = {'id': 'id', 'approvedSymbol': 'approved_symbol', 'biotype': 'biotype'}
+
+def test_stage_parquet_sources_streams_batches(db_session, tmp_path):
+    # No biotype column, and more rows than one batch
+    pd.DataFrame({
+        'id': [f'ENSG{i:011d}' for i in range(10)],
+        'approvedSymbol': [f'GENE{i}' for i in range(10)]
+    }).to_parquet(tmp_path / 'part-0.parquet')
+    
+    _stage_parquet_sources(
+        db_session, [ParquetSource(tmp_path, StagingOpenTargetsTarget, TARGET_COLUMNS, 'targets', None)],
+        batch_rows=3
+    )
+    
+    targets = db_session.query(StagingOpenTargetsTarget).order_by(StagingOpenTargetsTarget.id).all()
+    assert [t.approved_symbol for t in targets] == [f'GENE{i}' for i in range(10)]
+    assert all(t.biotype is None for t in targets)
+
+def test_extract_opentargets_data_pushdown_filters(db_session, tmp_path):
+    (tmp_path / 'association').mkdir()
+    pd.DataFrame({
+        'targetId': ['ENSG00000123456', 'ENSG00000123456', 'ENSG00000123456', 'ENSG00000999999'],
+        'diseaseId': ['EFO:0000001', 'EFO:0000002', 'EFO:0000003', 'EFO:0000001'],
+        'score': [0.8, 0.05, 0.6, 0.9],
+        'datasourceId': ['chembl', 'chembl', 'europepmc', 'chembl']
+    }).to_parquet(tmp_path / 'association' / 'part-0.parquet')
+    db_session.add(StagingUniProt(accession='P12345', opentargets_id='ENSG00000123456'))
+    db_session.commit()
+    
+    extract_opentargets_data(
+        db_session, tmp_path / 'target', tmp_path / 'disease', tmp_path / 'association',
+        min_score=0.1, datasources=['chembl'], uniprot_targets_only=True
+    )
+    
+    associations = db_session.query(StagingOpenTargetsAssociation).all()
+    assert [(a.target_id, a.disease_id) for a in associations] == [('ENSG00000123456', 'EFO:0000001')]
+
+def test_stage_parquet_sources_concurrent_readers(db_session, tmp_path):
+    for part in range(6):
+        pd.DataFrame({
+            'id': [f'EFO:{part}{i:06d}' for i in range(5)],
+            'name': [f'Disease {part}-{i}' for i in range(5)]
+        }).to_parquet(tmp_path / f'part-{part}.parquet')
+    (tmp_path / 'part-9.parquet').write_bytes(b'not parquet')
+    
+    _stage_parquet_sources(
+        db_session,
+        [ParquetSource(tmp_path, StagingOpenTargetsDisease, {'id': 'id', 'name': 'name'}, 'diseases', None)],
+        readers=3, batch_rows=2, queue_batches=1
+    )
+    
+    # The unreadable file is skipped and every other file is staged
+    assert db_session.query(StagingOpenTargetsDisease).count() == 30
+
+def test_stage_parquet_sources_failed_file_single_reader(db_session, tmp_path):
+    # The second file repeats an id of the first and fails mid-file; its
+    # reader must not keep the only pool slot from the third file
+    for part, ids in enumerate([range(0, 6), range(5, 11), range(20, 26)]):
+        pd.DataFrame({
+            'id': [f'ENSG{i:011d}' for i in ids],
+            'approvedSymbol': [f'GENE{i}' for i in ids]
+        }).to_parquet(tmp_path / f'part-{part}.parquet')
+    
+    _stage_parquet_sources(
+        db_session, [ParquetSource(tmp_path, StagingOpenTargetsTarget, TARGET_COLUMNS, 'targets', None)],
+        readers=1, batch_rows=2, queue_batches=2
+    )
+    
+    # The failed file is rolled back, the files around it are staged
+    ids = sorted(int(t.id[4:]) for t in db_session.query(StagingOpenTargetsTarget))
+    assert ids == list(range(0, 6)) + list(range(20, 26))
@@ -0,0 +1,79 @@
+# tests/test_graph.py
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import Base, Protein, ProteinInteraction
+from etl.graph import InteractionGraph, build_interaction_graph
+
+EDGES = [
+    ('P00001', 'P00002', 900),
+    ('P00001', 'P00003', 400),
+    ('P00001', 'P00004', 700),
+    ('P00002', 'P00003', 250),
+    ('P00003', 'P00003', 500),
+]
+
+@pytest.fixture
+def graph_dir(tmp_path):
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    
+    # Keys in the reverse order of the accessions
+    proteins = {f'P0000{i}': Protein(protein_sk=10 - i, accession=f'P0000{i}') for i in range(1, 6)}
+    session.add_all(proteins.values())
+    session.add_all(ProteinInteraction(protein1_sk=proteins[p1].protein_sk,
+                                       protein2_sk=proteins[p2].protein_sk, combined_score=score)
+                    for p1, p2, score in EDGES)
+    session.commit()
+    
+    assert build_interaction_graph(session, tmp_path / 'graph') == (5, 9)
+    session.close()
+    return tmp_path / 'graph'
+
+def test_graph_neighbors_sorted_by_score(graph_dir):
+    graph = InteractionGraph(graph_dir)
+    
+    assert len(graph) == 5
+    assert graph.neighbors('P00001') == [('P00002', 900), ('P00004', 700), ('P00003', 400)]
+    assert graph.neighbors('P00003') == [('P00003', 500), ('P00001', 400), ('P00002', 250)]
+    assert graph.neighbors('P00005') == []
+
+def test_graph_threshold_degree_and_top_k(graph_dir):
+    graph = InteractionGraph(graph_dir)
+    
+    assert graph.degree('P00001') == 3
+    assert graph.degree('P00001', threshold=400) == 2
+    assert graph.degree('P00001', threshold=900) == 0
+    assert graph.neighbors('P00002', threshold=200) == [('P00001', 900), ('P00003', 250)]
+    assert graph.top_k('P00001', 2) == [('P00002', 900), ('P00004', 700)]
+    assert graph.top_k('P00004', 5) == [('P00001', 700)]
+    
+    assert graph.accession(graph.node_id('P00004')) == 'P00004'
+    assert 'Q99999' not in graph
+    with pytest.raises(KeyError):
+        graph.degree('Q99999')
+
+def test_graph_skips_dangling_keys(tmp_path, caplog):
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    
+    # Key 3 was withdrawn, as was key 20, the highest one
+    session.add_all([Protein(protein_sk=5, accession='P00001'), Protein(protein_sk=7, accession='P00002')])
+    session.add_all([
+        ProteinInteraction(protein1_sk=5, protein2_sk=7, combined_score=900),
+        ProteinInteraction(protein1_sk=3, protein2_sk=5, combined_score=800),
+        ProteinInteraction(protein1_sk=7, protein2_sk=20, combined_score=700),
+    ])
+    session.commit()
+    
+    with caplog.at_level('WARNING', logger='etl.graph'):
+        assert build_interaction_graph(session, tmp_path / 'graph') == (2, 2)
+    assert 'Skipped 2 interactions' in caplog.text
+    session.close()
+    
+    graph = InteractionGraph(tmp_path / 'graph')
+    assert graph.neighbors('P00001') == [('P00002', 900)]
+    assert graph.neighbors('P00002') == [('P00001', 900)]
@@ -0,0 +1,125 @@
+# tests/test_indexes.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import Base, Protein, ProteinInteraction
+from etl.indexes import deferred_indexes, drop_indexes
+from etl.transform import STRING_INTERACTIONS_QUERY, TARGET_PROTEIN_MAP_QUERY, LINK_TARGETS_QUERY
+from etl.load import (
+    INTERACTORS_QUERY, INTERACTOR_HALVES, DISEASES_QUERY, NETWORK_QUERY, PROTEIN_INTERACTORS_QUERY,
+    create_semantic_temp_tables
+)
+
+@pytest.fixture
+def db_session():
+    # Create in-memory database
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    
+    yield session
+    
+    # Clean up
+    session.close()
+    Base.metadata.drop_all(engine)
+
+def _index_names(session, table):
+    return {row[0] for row in session.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+        {'table': table}
+    )}
+
+def _create_string_interactions(session):
+    session.execute(text(
+        "CREATE TEMP TABLE string_interactions (protein1_sk INTEGER, protein2_sk INTEGER, combined_score INTEGER)"
+    ))
+
+def _plan(session, query, params=None):
+    rows = session.execute(text(f"EXPLAIN QUERY PLAN {query}"), params or {}).fetchall()
+    return '\n'.join(row[3] for row in rows)
+
+def test_deferred_indexes(db_session):
+    declared = {'ix_proteins_string_id', 'ix_proteins_opentargets_id'}
+    assert _index_names(db_session, 'proteins') == declared
+    
+    with deferred_indexes(db_session, Protein):
+        # Dropped for the duration of the load
+        assert _index_names(db_session, 'proteins') == set()
+        db_session.add_all(Protein(accession=f'P{i:05d}', string_id=f'9606.ENSP{i:011d}') for i in range(10))
+        db_session.commit()
+    
+    # Rebuilt and analyzed afterwards
+    assert _index_names(db_session, 'proteins') == declared
+    stats = db_session.execute(text("SELECT idx FROM sqlite_stat1 WHERE tbl = 'proteins'")).scalars().all()
+    assert declared <= set(stats)
+
+def test_deferred_indexes_rebuilds_after_error(db_session):
+    with pytest.raises(RuntimeError):
+        with deferred_indexes(db_session, ProteinInteraction):
+            raise RuntimeError('load failed')
+    
+    assert _index_names(db_session, 'protein_interactions') == {'ix_protein_interactions_protein2_sk'}
+
+def test_deferred_indexes_rolls_back_failed_load(db_session):
+    db_session.add(Protein(accession='P1'))
+    db_session.commit()
+    
+    with pytest.raises(IntegrityError):
+        with deferred_indexes(db_session, Protein):
+            db_session.execute(text("INSERT INTO proteins (accession) VALUES ('P2')"))
+            db_session.execute(text("INSERT INTO proteins (accession) VALUES ('P1')"))
+    
+    # Nothing of the failed load was committed
+    assert [p.accession for p in db_session.query(Protein)] == ['P1']
+    assert _index_names(db_session, 'proteins') == {'ix_proteins_string_id', 'ix_proteins_opentargets_id'}
+
+def test_hot_queries_use_indexes(db_session):
+    _create_string_interactions(db_session)
+    plan = _plan(db_session, STRING_INTERACTIONS_QUERY, {'threshold': 200})
+    assert 'SEARCH p1 USING COVERING INDEX ix_proteins_string_id' in plan
+    assert 'SEARCH p2 USING COVERING INDEX ix_proteins_string_id' in plan
+    
+    # The gene-to-protein map is read off the index; the link scans the
+    # analyzed map and probes targets by ID
+    db_session.execute(text(
+        "CREATE TEMP TABLE target_protein_map (opentargets_id TEXT PRIMARY KEY, protein_sk INTEGER, "
+        "accession TEXT, candidates INTEGER)"
+    ))
+    assert 'ix_proteins_opentargets_id' in _plan(db_session, TARGET_PROTEIN_MAP_QUERY)
+    assert 'SCAN proteins' not in _plan(db_session, TARGET_PROTEIN_MAP_QUERY)
+    db_session.execute(text("INSERT INTO temp.target_protein_map VALUES ('ENSG1', 1, 'P1', 1)"))
+    db_session.execute(text("ANALYZE temp.target_protein_map"))
+    plan = _plan(db_session, LINK_TARGETS_QUERY)
+    assert 'SCAN m' in plan
+    assert 'SEARCH targets USING INDEX sqlite_autoindex_targets_1 (id=?)' in plan
+    assert 'SCAN targets' not in plan
+    assert 'SUBQUERY' not in plan
+    
+    # The semantic build scans only its batch of protein keys
+    create_semantic_temp_tables(db_session)
+    plan = _plan(db_session, DISEASES_QUERY)
+    assert 'ix_targets_protein_sk' in plan
+    assert 'SCAN k' in plan
+    assert 'SCAN t' not in plan and 'SCAN s' not in plan
+    
+    # Both directions of the neighbor lookup are index searches
+    first, second = (_plan(db_session, INTERACTORS_QUERY.format(**half), {'threshold': 200})
+                     for half in INTERACTOR_HALVES)
+    assert 'sqlite_autoindex_protein_interactions_1 (protein1_sk=?)' in first
+    assert 'ix_protein_interactions_protein2_sk (protein2_sk=?)' in second
+    for plan in (first, second):
+        assert 'SCAN i' not in plan and 'SCAN p' not in plan
+        assert 'TEMP B-TREE' not in plan
+    
+    for query in (NETWORK_QUERY, PROTEIN_INTERACTORS_QUERY):
+        assert _plan(db_session, query).count('SCAN') == 1
+
+def test_hot_queries_scan_without_indexes(db_session):
+    drop_indexes(db_session, Protein)
+    _create_string_interactions(db_session)
+    
+    plan = _plan(db_session, STRING_INTERACTIONS_QUERY, {'threshold': 200})
+    assert 'ix_proteins_string_id' not in plan
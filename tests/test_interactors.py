@@ -0,0 +1,53 @@
+# tests/test_interactors.py
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import Base, Protein
+from etl.interactors import (
+    encode_interactors, decode_interactors, count_interactors, resolve_interactors, INTERACTOR_DTYPE
+)
+
+@pytest.fixture
+def db_session():
+    # Create in-memory database
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    
+    session.add_all([
+        Protein(protein_sk=1, accession='P12345', protein_name='Test Protein 1', gene_name='TEST1'),
+        Protein(protein_sk=2, accession='P67890', protein_name='Test Protein 2', gene_name='TEST2'),
+        Protein(protein_sk=70000, accession='Q11111', protein_name='Test Protein 3'),
+    ])
+    session.commit()
+    
+    yield session
+    
+    # Clean up
+    session.close()
+    Base.metadata.drop_all(engine)
+
+def test_encode_decode_interactors():
+    blob = encode_interactors([2, 70000, 1], [400, 999, 400])
+    
+    # Six bytes per interactor, strongest first and ties by key
+    assert len(blob) == 3 * INTERACTOR_DTYPE.itemsize == 18
+    records = decode_interactors(blob)
+    assert records['protein_sk'].tolist() == [70000, 1, 2]
+    assert records['combined_score'].tolist() == [999, 400, 400]
+    assert count_interactors(blob) == 3
+    
+    assert encode_interactors([], []) == b''
+    assert len(decode_interactors(None)) == 0
+    assert count_interactors(None) == 0
+
+def test_resolve_interactors(db_session):
+    blob = encode_interactors([1, 70000], [300, 800])
+    
+    assert resolve_interactors(db_session, blob) == [
+        {'accession': 'Q11111', 'protein_name': 'Test Protein 3', 'gene_name': None, 'combined_score': 800},
+        {'accession': 'P12345', 'protein_name': 'Test Protein 1', 'gene_name': 'TEST1', 'combined_score': 300},
+    ]
+    assert resolve_interactors(db_session, b'') == []
@@ -1,14 +1,18 @@
 # tests/test_load.py
 import json
+import sqlite3
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
+from tqdm import tqdm
 
 from models.schema import (
-    Base, Protein, ProteinInteraction, Target, Disease, TargetDiseaseAssociation,
-    ProteinDiseaseNetwork
+    Base, Protein, ProteinInteraction, Target, Disease, Datasource, TargetDiseaseAssociation,
+    TargetDiseaseScore, ProteinDiseaseNetwork, ProteinInteractorList, DirtyProtein
 )
 from etl.load import build_semantic_layer
+from etl.interactors import resolve_interactors
+from etl.transform import score_target_disease_associations, HARMONIC_SUM_MAX
 
 @pytest.fixture
 def db_session():
@@ -21,6 +25,7 @@ def db_session():
     # Add test data
     # Proteins
     protein1 = Protein(
+        protein_sk=1,
         accession='P12345',
         protein_name='Test Protein 1',
         gene_name='TEST1',
@@ -32,6 +37,7 @@ def db_session():
     )
     
     protein2 = Protein(
+        protein_sk=2,
         accession='P67890',
         protein_name='Test Protein 2',
         gene_name='TEST2',
@@ -44,54 +50,72 @@ def db_session():
     
     # Interactions
     interaction = ProteinInteraction(
-        protein1='P12345',
-        protein2='P67890',
+        protein1_sk=1,
+        protein2_sk=2,
         combined_score=900
     )
     
     # Targets
     target1 = Target(
+        target_sk=1,
         id='ENSG00000123456',
         approved_symbol='TEST1',
         biotype='protein_coding',
-        uniprot_accession='P12345'
+        protein_sk=1
     )
     
     target2 = Target(
+        target_sk=2,
         id='ENSG00000789012',
         approved_symbol='TEST2',
         biotype='protein_coding',
-        uniprot_accession='P67890'
+        protein_sk=2
     )
     
     # Diseases
     disease1 = Disease(
+        disease_sk=1,
         id='EFO:0000001',
         name='Test Disease 1'
     )
     
     disease2 = Disease(
+        disease_sk=2,
         id='EFO:0000002',
         name='Test Disease 2'
     )
     
+    # Datasources
+    datasource1 = Datasource(datasource_sk=1, name='genetic_association')
+    datasource2 = Datasource(datasource_sk=2, name='chembl')
+    
     # Associations
     association1 = TargetDiseaseAssociation(
-        target_id='ENSG00000123456',
-        disease_id='EFO:0000001',
+        target_sk=1,
+        disease_sk=1,
         score=0.8,
-        datasource='genetic_association'
+        datasource_sk=1
     )
     
     association2 = TargetDiseaseAssociation(
-        target_id='ENSG00000789012',
-        disease_id='EFO:0000002',
+        target_sk=2,
+        disease_sk=2,
         score=0.7,
-        datasource='genetic_association'
+        datasource_sk=1
+    )
+    
+    # A second datasource for the first pair
+    association3 = TargetDiseaseAssociation(
+        target_sk=1,
+        disease_sk=1,
+        score=0.5,
+        datasource_sk=2
     )
     
-    session.add_all([protein1, protein2, interaction, target1, target2, disease1, disease2, association1, association2])
+    session.add_all([protein1, protein2, interaction, target1, target2, disease1, disease2,
+                     datasource1, datasource2, association1, association2, association3])
     session.commit()
+    score_target_disease_associations(session)
     
     yield session
     
@@ -99,6 +123,13 @@ def db_session():
     session.close()
     Base.metadata.drop_all(engine)
 
+def _network_entry(session, accession):
+    """Read a semantic layer row with its identifiers through the view"""
+    return session.execute(
+        text("SELECT * FROM v_protein_disease_network WHERE accession = :accession"),
+        {'accession': accession}
+    ).one()
+
 def test_build_semantic_layer(db_session):
     # Build semantic layer
     build_semantic_layer(db_session)
@@ -109,15 +140,15 @@ def test_build_semantic_layer(db_session):
     assert len(results) == 2
     
     # Check first entry
-    entry1 = db_session.query(ProteinDiseaseNetwork).filter(
-        ProteinDiseaseNetwork.accession == 'P12345'
-    ).first()
+    entry1 = _network_entry(db_session, 'P12345')
     
     assert entry1.protein_name == 'Test Protein 1'
     assert entry1.gene_name == 'TEST1'
     assert entry1.disease_id == 'EFO:0000001'
     assert entry1.disease_name == 'Test Disease 1'
-    assert entry1.association_score == 0.8
+    # Harmonic sum: 0.8 + 0.5 / 2^2, scaled by pi^2 / 6
+    assert entry1.association_score == pytest.approx((0.8 + 0.5 / 4) / HARMONIC_SUM_MAX)
+    assert json.loads(entry1.datasource_scores) == {'genetic_association': 0.8, 'chembl': 0.5}
     
     # Check interacting proteins in JSON
     interacting_proteins = json.loads(entry1.interacting_proteins)
@@ -126,18 +157,168 @@ def test_build_semantic_layer(db_session):
     assert interacting_proteins[0]['protein_name'] == 'Test Protein 2'
     
     # Check second entry
-    entry2 = db_session.query(ProteinDiseaseNetwork).filter(
-        ProteinDiseaseNetwork.accession == 'P67890'
-    ).first()
+    entry2 = _network_entry(db_session, 'P67890')
     
     assert entry2.protein_name == 'Test Protein 2'
     assert entry2.gene_name == 'TEST2'
     assert entry2.disease_id == 'EFO:0000002'
     assert entry2.disease_name == 'Test Disease 2'
-    assert entry2.association_score == 0.7
+    assert entry2.association_score == pytest.approx(0.7 / HARMONIC_SUM_MAX)
     
     # Check interacting proteins in JSON
     interacting_proteins = json.loads(entry2.interacting_proteins)
     assert len(interacting_proteins) == 1
     assert interacting_proteins[0]['accession'] == 'P12345'
-    assert interacting_proteins[0]['protein_name'] == 'Test Protein 1'
\ No newline at end of file
+    assert interacting_proteins[0]['protein_name'] == 'Test Protein 1'
+
+def test_build_semantic_layer_stores_interactors_once(db_session):
+    # A second disease for the first protein
+    db_session.add(TargetDiseaseScore(target_sk=1, disease_sk=2, score=0.3, datasource_scores='{}'))
+    db_session.commit()
+    build_semantic_layer(db_session)
+    
+    assert db_session.query(ProteinDiseaseNetwork).filter_by(protein_sk=1).count() == 2
+    assert db_session.query(ProteinInteractorList).count() == 2
+    rows = db_session.execute(
+        text("SELECT interacting_proteins FROM v_protein_disease_network WHERE accession = 'P12345'")
+    ).fetchall()
+    assert len(rows) == 2
+    assert all(json.loads(r.interacting_proteins)[0]['accession'] == 'P67890' for r in rows)
+
+def test_build_semantic_layer_packed(db_session):
+    db_session.add(ProteinInteraction(protein1_sk=1, protein2_sk=1, combined_score=500))
+    db_session.commit()
+    build_semantic_layer(db_session, interactors_format='packed')
+    
+    entry1 = _network_entry(db_session, 'P12345')
+    assert entry1.interacting_proteins is None
+    # Strongest interaction first, self-interaction listed once
+    partners = resolve_interactors(db_session, entry1.packed_interactors)
+    assert [(p['accession'], p['combined_score']) for p in partners] == [('P67890', 900), ('P12345', 500)]
+    partners = resolve_interactors(db_session, _network_entry(db_session, 'P67890').packed_interactors)
+    assert partners[0]['protein_name'] == 'Test Protein 1'
+    
+    # An incremental build in the other format rebuilds every list
+    db_session.get(Protein, 2).protein_name = 'Renamed Protein 2'
+    db_session.commit()
+    build_semantic_layer(db_session, incremental=True)
+    assert db_session.query(ProteinInteractorList).filter(ProteinInteractorList.packed_interactors.isnot(None)).count() == 0
+    assert len(json.loads(_network_entry(db_session, 'P67890').interacting_proteins)) == 1
+
+def test_build_semantic_layer_incremental(db_session):
+    # A protein with no interactions or disease associations
+    db_session.add(Protein(protein_sk=3, accession='Q11111', protein_name='Test Protein 3',
+                           opentargets_id='ENSG00000111111'))
+    db_session.commit()
+    build_semantic_layer(db_session)
+    assert db_session.query(DirtyProtein).count() == 0
+    
+    # Tag the unrelated protein's row to tell whether it gets rebuilt
+    untouched = db_session.query(ProteinDiseaseNetwork).filter_by(protein_sk=3).one()
+    untouched.datasource_scores = '{"tag": 1}'
+    
+    # Renaming a protein changes its own row and its neighbor's interactor list
+    db_session.get(Protein, 2).protein_name = 'Renamed Protein 2'
+    db_session.commit()
+    assert [d.protein_sk for d in db_session.query(DirtyProtein)] == [2]
+    
+    build_semantic_layer(db_session, incremental=True)
+    
+    assert db_session.query(DirtyProtein).count() == 0
+    assert db_session.query(ProteinDiseaseNetwork).count() == 3
+    entry1 = _network_entry(db_session, 'P12345')
+    assert json.loads(entry1.interacting_proteins)[0]['protein_name'] == 'Renamed Protein 2'
+    assert _network_entry(db_session, 'P67890').protein_name == 'Renamed Protein 2'
+    assert _network_entry(db_session, 'Q11111').datasource_scores == '{"tag": 1}'
+
+def test_build_semantic_layer_incremental_falls_back(db_session):
+    # Nothing built yet: the incremental build does a full one
+    build_semantic_layer(db_session, incremental=True)
+    assert db_session.query(ProteinDiseaseNetwork).count() == 2
+    
+    # Removing a disease score and an interaction marks both proteins dirty,
+    # more than half of the linked proteins
+    db_session.execute(text("DELETE FROM target_disease_scores WHERE target_sk = 2"))
+    db_session.query(ProteinInteraction).delete()
+    db_session.commit()
+    assert sorted(d.protein_sk for d in db_session.query(DirtyProtein)) == [1, 2]
+    
+    build_semantic_layer(db_session, incremental=True)
+    entry2 = _network_entry(db_session, 'P67890')
+    assert entry2.disease_id is None
+    assert json.loads(entry2.interacting_proteins) == []
+
+def test_build_semantic_layer_batches(db_session, monkeypatch):
+    # A self-interaction is listed once; a protein without partners gets an empty list
+    db_session.add(ProteinInteraction(protein1_sk=1, protein2_sk=1, combined_score=500))
+    db_session.add(Protein(protein_sk=3, accession='Q11111', opentargets_id='ENSG00000111111'))
+    db_session.commit()
+    
+    monkeypatch.setattr('etl.load.SEMANTIC_BATCH_PROTEINS', 1)
+    build_semantic_layer(db_session)
+    
+    assert db_session.query(ProteinDiseaseNetwork).count() == 3
+    partners = json.loads(_network_entry(db_session, 'P12345').interacting_proteins)
+    assert sorted(p['accession'] for p in partners) == ['P12345', 'P67890']
+    assert json.loads(_network_entry(db_session, 'Q11111').interacting_proteins) == []
+
+def test_build_semantic_layer_interrupted_full_build(db_session, monkeypatch):
+    db_session.add_all(Protein(protein_sk=i, accession=f'Q0000{i}', opentargets_id=f'ENSG0000000000{i}')
+                       for i in range(3, 7))
+    db_session.commit()
+    monkeypatch.setattr('etl.load.SEMANTIC_BATCH_PROTEINS', 2)
+    build_semantic_layer(db_session)
+    assert db_session.query(DirtyProtein).count() == 0
+    
+    # Rebuild in full, dying once the first batch is committed
+    class Interrupted(Exception):
+        pass
+    
+    class interrupting_tqdm(tqdm):
+        def update(self, n=1):
+            raise Interrupted
+    
+    monkeypatch.setattr('etl.load.tqdm', interrupting_tqdm)
+    with pytest.raises(Interrupted):
+        build_semantic_layer(db_session)
+    assert db_session.query(ProteinDiseaseNetwork).count() == 2
+    assert db_session.query(DirtyProtein).count() == 6
+    
+    # The next incremental run finishes the job
+    monkeypatch.setattr('etl.load.tqdm', tqdm)
+    build_semantic_layer(db_session, incremental=True)
+    assert db_session.query(ProteinDiseaseNetwork).count() == 6
+    assert db_session.query(DirtyProtein).count() == 0
+
+def _file_copy(session, path):
+    """A session on a file copy of the in-memory test database"""
+    session.commit()
+    with sqlite3.connect(path) as target:
+        session.connection().connection.backup(target)
+    return sessionmaker(bind=create_engine(f'sqlite:///{path}'))()
+
+def _network_rows(session):
+    return session.execute(text("""
+        SELECT accession, disease_id, association_score, datasource_scores, interacting_proteins
+        FROM v_protein_disease_network ORDER BY accession, disease_id
+    """)).fetchall()
+
+def test_build_semantic_layer_sharded(db_session, tmp_path):
+    db_session.add(ProteinInteraction(protein1_sk=1, protein2_sk=1, combined_score=500))
+    db_session.add(Protein(protein_sk=3, accession='Q11111', opentargets_id='ENSG00000111111'))
+    serial = _file_copy(db_session, tmp_path / 'serial.db')
+    sharded = _file_copy(db_session, tmp_path / 'sharded.db')
+    
+    build_semantic_layer(serial)
+    build_semantic_layer(sharded, workers=3)
+    assert len(_network_rows(sharded)) == 3
+    assert _network_rows(sharded) == _network_rows(serial)
+    
+    # An incremental sharded build only replaces the dirty proteins' rows
+    for session, workers in ((serial, 1), (sharded, 3)):
+        session.get(Protein, 2).protein_name = 'Renamed Protein 2'
+        session.commit()
+        build_semantic_layer(session, incremental=True, workers=workers)
+    assert _network_rows(sharded) == _network_rows(serial)
+    assert sharded.query(DirtyProtein).count() == 0
+    assert 'Renamed Protein 2' in _network_rows(sharded)[0].interacting_proteins
@@ -0,0 +1,118 @@
+# tests/test_manifest.py
+import json
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.schema import Base, RunManifest, StagingString, ProteinInteraction
+from etl.manifest import fingerprint_files, extract_source, transform_source, manifest_status
+
+@pytest.fixture
+def db_session():
+    # Create in-memory database
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    
+    yield session
+    
+    # Clean up
+    session.close()
+    Base.metadata.drop_all(engine)
+
+@pytest.fixture
+def links_file(tmp_path):
+    path = tmp_path / 'links.txt'
+    path.write_bytes(b'protein1 protein2 combined_score\n' * 100)
+    return path
+
+def _stage(session, calls):
+    def extract():
+        calls.append('extract')
+        session.query(StagingString).delete()
+        session.add(StagingString(protein1='A', protein2='B', combined_score=900))
+        session.commit()
+    return extract
+
+def test_fingerprint_files(tmp_path, links_file):
+    entry, = fingerprint_files([links_file], sample_bytes=16)
+    assert entry['size'] == links_file.stat().st_size
+    
+    # A change in the middle of a large file alters the sampled hash
+    data = bytearray(links_file.read_bytes())
+    data[len(data) // 2] ^= 1
+    links_file.write_bytes(bytes(data))
+    assert fingerprint_files([links_file], sample_bytes=16)[0]['hash'] != entry['hash']
+    
+    # Directories contribute all their files; missing paths give no fingerprint
+    (tmp_path / 'parts').mkdir()
+    (tmp_path / 'parts' / 'b.parquet').write_bytes(b'b')
+    (tmp_path / 'parts' / 'a.parquet').write_bytes(b'a')
+    assert [f['path'] for f in fingerprint_files([tmp_path / 'parts'])] == [
+        str(tmp_path / 'parts' / 'a.parquet'), str(tmp_path / 'parts' / 'b.parquet')
+    ]
+    assert fingerprint_files([tmp_path / 'missing.txt']) is None
+
+def test_extract_source_skips_unchanged(db_session, links_file):
+    calls = []
+    extract = _stage(db_session, calls)
+    
+    assert extract_source(db_session, 'string', [links_file], extract, settings={'keep_all': False})
+    assert not extract_source(db_session, 'string', [links_file], extract, settings={'keep_all': False})
+    assert calls == ['extract']
+    
+    entry = db_session.get(RunManifest, 'string')
+    assert json.loads(entry.extract_rows) == {'staging_string': 1}
+    assert json.loads(entry.files)[0]['path'] == str(links_file)
+    
+    # Forced, with different settings, or with changed files, it runs again
+    assert extract_source(db_session, 'string', [links_file], extract, settings={'keep_all': False}, force=True)
+    assert extract_source(db_session, 'string', [links_file], extract, settings={'keep_all': True})
+    links_file.write_bytes(b'changed')
+    assert extract_source(db_session, 'string', [links_file], extract, settings={'keep_all': True})
+    assert len(calls) == 4
+
+def test_interrupted_extract_is_not_skipped(db_session, links_file):
+    calls = []
+    extract_source(db_session, 'string', [links_file], _stage(db_session, calls))
+    
+    def failing():
+        raise RuntimeError('disk full')
+    
+    with pytest.raises(RuntimeError):
+        extract_source(db_session, 'string', [links_file], failing, force=True)
+    
+    assert db_session.get(RunManifest, 'string').fingerprint is None
+    assert extract_source(db_session, 'string', [links_file], _stage(db_session, calls))
+
+def test_transform_source(db_session, links_file):
+    calls = []
+    def transform(name):
+        return lambda: calls.append(name)
+    
+    extract_source(db_session, 'uniprot', [links_file], lambda: None)
+    extract_source(db_session, 'string', [links_file], _stage(db_session, []))
+    
+    assert transform_source(db_session, 'uniprot', transform('uniprot'))
+    assert transform_source(db_session, 'string', transform('string'))
+    assert not transform_source(db_session, 'uniprot', transform('uniprot'))
+    assert not transform_source(db_session, 'string', transform('string'))
+    assert calls == ['uniprot', 'string']
+    
+    # Rebuilding the proteins makes the interactions keyed on them stale
+    assert transform_source(db_session, 'uniprot', transform('uniprot'), force=True)
+    assert transform_source(db_session, 'string', transform('string'))
+    
+    # A re-extract makes the source's own clean tables stale
+    extract_source(db_session, 'string', [links_file], _stage(db_session, []), force=True)
+    assert transform_source(db_session, 'string', transform('string'))
+    assert calls == ['uniprot', 'string', 'uniprot', 'string', 'string']
+    
+    entry = db_session.get(RunManifest, 'string')
+    assert json.loads(entry.transform_rows) == {ProteinInteraction.__tablename__: 0}
+    assert entry.transform_seconds >= 0
+    
+    status = manifest_status(db_session)
+    assert 'string' in status and 'uniprot' in status
+    assert str(links_file) in status
@@ -0,0 +1,51 @@
+# tests/test_sequence_store.py
+import numpy as np
+import pytest
+
+from etl.sequence_store import SequenceStore, SequenceStoreWriter
+
+SEQUENCES = {
+    'P12345': 'MKVLAAGIV' * 20,
+    'Q99999': 'ACDEFGHIKLMNPQRSTVWY' * 7,
+    'A0A000': 'M',
+    'P67890': 'GGSGGS' * 50,
+}
+
+@pytest.fixture
+def store_dir(tmp_path):
+    # A tiny chunk size spreads the sequences over several chunks
+    with SequenceStoreWriter(tmp_path / 'sequences', chunk_bytes=128) as writer:
+        refs = {acc: writer.add(acc, seq) for acc, seq in SEQUENCES.items()}
+    
+    assert list(refs.values()) == list(range(len(SEQUENCES)))
+    return tmp_path / 'sequences'
+
+def test_sequence_store_round_trip(store_dir):
+    with SequenceStore(store_dir) as store:
+        assert len(store) == len(SEQUENCES)
+        
+        for ref, (accession, sequence) in enumerate(SEQUENCES.items()):
+            assert store.get(accession) == sequence
+            assert store.get_ref(ref) == sequence
+        
+        assert 'P12345' in store
+        assert store.get('NOTHERE') is None
+    
+    # The sequences were spread over several compressed chunks
+    assert len(np.load(store_dir / 'chunks.npy')) > 2
+    assert (store_dir / 'sequences.bin').stat().st_size < sum(map(len, SEQUENCES.values()))
+
+def test_sequence_store_append_replaces_accession(store_dir):
+    with SequenceStoreWriter(store_dir, append=True, chunk_bytes=128) as writer:
+        ref = writer.add('P12345', 'MNEW')
+        writer.add('B1B1B1', 'WWW')
+    
+    assert ref == len(SEQUENCES)
+    
+    with SequenceStore(store_dir) as store:
+        assert len(store) == len(SEQUENCES) + 1
+        assert store.get('P12345') == 'MNEW'
+        assert store.get('B1B1B1') == 'WWW'
+        assert store.get('Q99999') == SEQUENCES['Q99999']
+        # The superseded copy is still reachable through its old reference
+        assert store.get_ref(0) == SEQUENCES['P12345']
@@ -1,14 +1,18 @@
 # tests/test_transform.py
 import json
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
 from models.schema import (
     Base, StagingUniProt, StagingString, StagingOpenTargetsTarget, StagingOpenTargetsDisease,
-    StagingOpenTargetsAssociation, Protein, ProteinInteraction, Target, Disease, TargetDiseaseAssociation
+    StagingOpenTargetsAssociation, Protein, ProteinInteraction, Target, Disease, Datasource,
+    TargetDiseaseAssociation, TargetDiseaseScore, DirtyProtein
+)
+from etl.transform import (
+    transform_uniprot_to_proteins, transform_string_to_interactions, transform_opentargets_data,
+    score_target_disease_associations, HARMONIC_SUM_MAX
 )
-from etl.transform import transform_uniprot_to_proteins, transform_string_to_interactions, transform_opentargets_data
 
 @pytest.fixture
 def db_session():
@@ -130,30 +134,82 @@ def test_transform_uniprot_to_proteins(db_session):
     assert protein2.sequence_length == 200
     assert protein2.sequence_mass == 23456
 
+def test_transform_uniprot_to_proteins_incremental(db_session):
+    transform_uniprot_to_proteins(db_session)
+    
+    # Revise one staged protein, withdraw another and add a third
+    db_session.get(StagingUniProt, 'P12345').gene_name = 'TEST1A'
+    db_session.delete(db_session.get(StagingUniProt, 'P67890'))
+    db_session.add(StagingUniProt(accession='Q11111', protein_name='Test Protein 3', species='Human'))
+    db_session.commit()
+    
+    counts = transform_uniprot_to_proteins(db_session, incremental=True)
+    
+    assert counts == {'inserted': 1, 'updated': 1, 'deleted': 1}
+    assert sorted(p.accession for p in db_session.query(Protein)) == ['P12345', 'Q11111']
+    assert db_session.query(Protein).filter_by(accession='P12345').one().gene_name == 'TEST1A'
+    
+    # Nothing left to apply
+    assert transform_uniprot_to_proteins(db_session, incremental=True) == {'inserted': 0, 'updated': 0, 'deleted': 0}
+
 def test_transform_string_to_interactions(db_session):
     # First transform UniProt data to populate Protein table
     transform_uniprot_to_proteins(db_session)
     
+    # An edge above the threshold whose partner has no UniProt entry
+    db_session.add(StagingString(
+        protein1='9606.ENSP00000789012',
+        protein2='9606.ENSP00000999999',
+        combined_score=500
+    ))
+    db_session.commit()
+    
     # Transform STRING data
-    transform_string_to_interactions(db_session)
+    counts = transform_string_to_interactions(db_session)
+    assert counts == {'mapped': 1, 'unmapped': 1}
     
     # Verify results
-    results = db_session.query(ProteinInteraction).all()
+    assert db_session.query(ProteinInteraction).count() == 1
     
     # Only one interaction should be above threshold (900 > 200)
+    results = db_session.execute(text("SELECT * FROM v_protein_interactions")).fetchall()
     assert len(results) == 1
     
     interaction = results[0]
     assert interaction.protein1 == 'P12345'
     assert interaction.protein2 == 'P67890'
     assert interaction.combined_score == 900
+    
+    # The neighbor view gives both directions of the stored pair
+    neighbors = db_session.execute(text(
+        "SELECT accession, neighbor FROM protein_neighbors ORDER BY accession"
+    )).fetchall()
+    assert [tuple(n) for n in neighbors] == [('P12345', 'P67890'), ('P67890', 'P12345')]
+
+def test_transform_string_to_interactions_tracks_changes(db_session):
+    transform_uniprot_to_proteins(db_session)
+    db_session.add(StagingUniProt(accession='Q11111', species='Human', string_id='9606.ENSP00000345678'))
+    db_session.commit()
+    transform_uniprot_to_proteins(db_session, incremental=True)
+    transform_string_to_interactions(db_session)
+    db_session.query(DirtyProtein).delete()
+    db_session.commit()
+    
+    # Raise the weak edge above the threshold; the other edge is unchanged
+    db_session.query(StagingString).filter_by(protein2='9606.ENSP00000345678').one().combined_score = 400
+    db_session.commit()
+    transform_string_to_interactions(db_session)
+    
+    assert db_session.query(ProteinInteraction).count() == 2
+    dirty = {db_session.get(Protein, d.protein_sk).accession for d in db_session.query(DirtyProtein)}
+    assert dirty == {'P12345', 'Q11111'}
 
 def test_transform_opentargets_data(db_session):
     # First transform UniProt data to populate Protein table
     transform_uniprot_to_proteins(db_session)
     
     # Transform OpenTargets data
-    transform_opentargets_data(db_session)
+    assert transform_opentargets_data(db_session) == {'linked': 2, 'ambiguous': 0}
     
     # Verify results
     targets = db_session.query(Target).all()
@@ -165,23 +221,88 @@ def test_transform_opentargets_data(db_session):
     assert len(associations) == 2
     
     # Check target-UniProt links
-    target1 = db_session.query(Target).filter(Target.id == 'ENSG00000123456').first()
-    assert target1.approved_symbol == 'TEST1'
-    assert target1.uniprot_accession == 'P12345'
-    
-    target2 = db_session.query(Target).filter(Target.id == 'ENSG00000789012').first()
-    assert target2.approved_symbol == 'TEST2'
-    assert target2.uniprot_accession == 'P67890'
-    
-    # Check associations
-    assoc1 = db_session.query(TargetDiseaseAssociation).filter(
-        TargetDiseaseAssociation.target_id == 'ENSG00000123456'
-    ).first()
-    assert assoc1.disease_id == 'EFO:0000001'
-    assert assoc1.score == 0.8
-    
-    assoc2 = db_session.query(TargetDiseaseAssociation).filter(
-        TargetDiseaseAssociation.target_id == 'ENSG00000789012'
-    ).first()
-    assert assoc2.disease_id == 'EFO:0000002'
-    assert assoc2.score == 0.7
\ No newline at end of file
+    targets = {t.id: t for t in db_session.execute(text("SELECT * FROM v_targets"))}
+    assert targets['ENSG00000123456'].approved_symbol == 'TEST1'
+    assert targets['ENSG00000123456'].uniprot_accession == 'P12345'
+    assert targets['ENSG00000789012'].approved_symbol == 'TEST2'
+    assert targets['ENSG00000789012'].uniprot_accession == 'P67890'
+    
+    # Check associations, which store only integer keys
+    assoc_rows = db_session.execute(text("SELECT * FROM v_target_disease_associations"))
+    assocs = {a.target_id: a for a in assoc_rows}
+    assert assocs['ENSG00000123456'].disease_id == 'EFO:0000001'
+    assert assocs['ENSG00000123456'].score == 0.8
+    assert assocs['ENSG00000789012'].disease_id == 'EFO:0000002'
+    assert assocs['ENSG00000789012'].score == 0.7
+
+def test_transform_opentargets_data_ambiguous_link(db_session, caplog):
+    # A second, lower accession for the first gene
+    db_session.add(StagingUniProt(accession='A00001', species='Human', opentargets_id='ENSG00000123456'))
+    db_session.commit()
+    transform_uniprot_to_proteins(db_session)
+    
+    with caplog.at_level('WARNING', logger='etl.transform'):
+        assert transform_opentargets_data(db_session) == {'linked': 2, 'ambiguous': 1}
+    
+    targets = {t.id: t for t in db_session.execute(text("SELECT * FROM v_targets"))}
+    assert targets['ENSG00000123456'].uniprot_accession == 'A00001'
+    assert targets['ENSG00000789012'].uniprot_accession == 'P67890'
+    assert 'ENSG00000123456 -> A00001' in caplog.text
+    assert 'P12345' in caplog.text
+
+def test_full_reload_keeps_keys(db_session):
+    def load():
+        transform_uniprot_to_proteins(db_session)
+        transform_string_to_interactions(db_session)
+        return transform_opentargets_data(db_session)
+    
+    def keys():
+        return (
+            {p.accession: p.protein_sk for p in db_session.query(Protein)},
+            {t.id: (t.target_sk, t.protein_sk) for t in db_session.query(Target)},
+            {d.id: d.disease_sk for d in db_session.query(Disease)},
+        )
+    
+    load()
+    before = keys()
+    db_session.query(DirtyProtein).delete()
+    db_session.commit()
+    
+    # Reloading unchanged staging data keeps every key and changes nothing
+    assert load() == {'linked': 2, 'ambiguous': 0}
+    assert keys() == before
+    assert len(db_session.execute(text("SELECT * FROM v_protein_interactions")).fetchall()) == 1
+    assert db_session.query(TargetDiseaseScore).count() == 2
+    assert db_session.query(DirtyProtein).count() == 0
+    
+    # Withdraw the second target; only its protein is marked dirty
+    db_session.query(StagingOpenTargetsAssociation).filter_by(target_id='ENSG00000789012').delete()
+    db_session.query(StagingOpenTargetsTarget).filter_by(id='ENSG00000789012').delete()
+    db_session.commit()
+    load()
+    
+    proteins, targets, diseases = keys()
+    assert proteins == before[0] and diseases == before[2]
+    assert targets == {'ENSG00000123456': before[1]['ENSG00000123456']}
+    assert db_session.query(TargetDiseaseScore).count() == 1
+    dirty = {db_session.get(Protein, d.protein_sk).accession for d in db_session.query(DirtyProtein)}
+    assert dirty == {'P67890'}
+
+def test_score_target_disease_associations(db_session):
+    db_session.add_all([
+        Datasource(datasource_sk=1, name='europepmc'),
+        Datasource(datasource_sk=2, name='chembl'),
+        TargetDiseaseAssociation(target_sk=1, disease_sk=1, score=1.0, datasource_sk=1),
+        TargetDiseaseAssociation(target_sk=1, disease_sk=1, score=0.5, datasource_sk=2),
+        TargetDiseaseAssociation(target_sk=1, disease_sk=2, score=0.9, datasource_sk=2),
+        TargetDiseaseAssociation(target_sk=2, disease_sk=1, score=None, datasource_sk=2),
+    ])
+    db_session.commit()
+    
+    assert score_target_disease_associations(db_session, weights={'europepmc': 0.2}) == 2
+    
+    scores = {(s.target_sk, s.disease_sk): s for s in db_session.query(TargetDiseaseScore)}
+    # chembl (0.5) outranks the down-weighted europepmc (1.0 * 0.2)
+    assert scores[(1, 1)].score == pytest.approx((0.5 + 0.2 / 4) / HARMONIC_SUM_MAX)
+    assert list(json.loads(scores[(1, 1)].datasource_scores)) == ['chembl', 'europepmc']
+    assert scores[(1, 2)].score == pytest.approx(0.9 / HARMONIC_SUM_MAX)
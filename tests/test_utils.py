@@ -0,0 +1,35 @@
+# tests/test_utils.py
+import gzip
+from tqdm import tqdm
+
+from etl.utils import open_with_progress
+
+LINES = ''.join(f"9606.ENSP{i:011d} 9606.ENSP{i + 1:011d} {i % 1000}\n" for i in range(5000))
+
+class RecordingTqdm(tqdm):
+    bars = []
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        RecordingTqdm.bars.append(self)
+
+def test_open_with_progress_gzip_reports_compressed_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr('etl.utils.tqdm', RecordingTqdm)
+    gz_file = tmp_path / 'links.txt.gz'
+    with gzip.open(gz_file, 'wt') as f:
+        f.write(LINES)
+    
+    with open_with_progress(gz_file, 'test', mode='rt') as f:
+        assert f.read() == LINES
+    
+    # Progress covers exactly the compressed bytes on disk, read once
+    progress = RecordingTqdm.bars[-1]
+    assert progress.total == gz_file.stat().st_size
+    assert progress.n == progress.total
+
+def test_open_with_progress_plain_binary(tmp_path):
+    plain_file = tmp_path / 'links.txt'
+    plain_file.write_text(LINES)
+    
+    with open_with_progress(plain_file, 'test') as f:
+        assert f.read() == LINES.encode()